@@ -194,6 +194,7 @@ class Action:
             "run_id",
             "terraform",
             "tofu",
+            "version_cache_key",
             "Provider Versions",
             "json_output_path",
             "$ProductName Outputs",
@@ -13,6 +13,7 @@ from inputs.workspace import workspace
 from outputs.provider_versions import provider_versions
 from outputs.terraform import terraform
 from outputs.tofu import tofu
+from outputs.version_cache_key import version_cache_key
 
 backend_reason = '''
 This will be used to fetch the $ProductName version set in the cloud workspace if using the `remote` backend.
@@ -86,6 +87,7 @@ version = Action(
     outputs=[
         terraform,
         tofu,
+        version_cache_key,
         provider_versions
     ],
     environment_variables=[
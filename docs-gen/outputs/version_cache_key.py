@@ -0,0 +1,17 @@
+from action import Output
+
+version_cache_key = Output(
+    name='version_cache_key',
+    type='string',
+    description='''
+    A key for the $ProductName version decided by this action.
+    
+    Later steps in the same job use the decided version without having to find it again.
+    Set the `TERRAFORM_VERSION_CACHE_KEY` environment variable of a later step to this key to use the decided version without reading the $ProductName configuration at all.
+    The key changes when anything that the decision depends on changes.
+    
+    If the version was found from the remote workspace or a state file, the decision is not cached.
+    To discard every cached decision set the `TERRAFORM_VERSION_CACHE_GENERATION` environment variable to a new value,
+    or set `TERRAFORM_VERSION_CACHE` to `false` to not cache decisions at all.
+    '''
+)
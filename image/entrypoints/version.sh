@@ -9,3 +9,7 @@ init
 
 debug_cmd $TOOL_COMMAND_NAME version -json
 (cd "$INPUT_PATH" && $TOOL_COMMAND_NAME version -json | convert_version)
+
+if [[ -f "$STEP_TMP_DIR/version_cache_key" ]]; then
+    set_output version_cache_key "$(<"$STEP_TMP_DIR/version_cache_key")"
+fi
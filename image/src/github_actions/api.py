@@ -1,7 +1,10 @@
 import datetime
 import re
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import NewType, Iterable, Any, Optional
+from urllib.parse import parse_qs, urlencode, urlparse
 
 import requests
 from requests import Response
@@ -34,11 +37,14 @@ class GithubApi:
         else:
             self._session = requests.Session()
 
-        if token is not None:
-            self._session.headers['authorization'] = f'token {token}'
+        self._configure(self._session)
 
-        self._session.headers['user-agent'] = 'terraform-github-actions'
-        self._session.headers['accept'] = 'application/vnd.github.v3+json'
+    def _configure(self, session: requests.Session) -> None:
+        if self._token is not None:
+            session.headers['authorization'] = f'token {self._token}'
+
+        session.headers['user-agent'] = 'terraform-github-actions'
+        session.headers['accept'] = 'application/vnd.github.v3+json'
 
     def _url(self, path_or_url: str) -> str:
         """Normalize a path or full GitHub API URL to a full URL on this host.
@@ -55,8 +61,8 @@ class GithubApi:
             return path_or_url
         raise RuntimeError(f'URL does not belong to the expected GitHub API ({self._host}): {path_or_url}')
 
-    def _api_request(self, method: str, url: str, **kwargs) -> requests.Response:
-        response = self._session.request(method, url, **kwargs)
+    def _api_request(self, method: str, url: str, session: Optional[requests.Session] = None, **kwargs) -> requests.Response:
+        response = (session or self._session).request(method, url, **kwargs)
         debug(f'{response.request.method} {response.request.url} -> {response.status_code}')
 
         if 400 <= response.status_code < 500:
@@ -119,3 +125,67 @@ class GithubApi:
                 self._url(url)  # validate it belongs to this host
             else:
                 return
+
+    def parallel_paged_get(self, path_or_url: str, workers: int = 4, **kwargs) -> list[dict[str, Any]]:
+        """
+        Get every item of a paginated list, fetching the pages concurrently.
+
+        The first page is fetched to find the number of pages from its 'last' link, then the rest are fetched
+        by up to `workers` concurrent requests. If the number of pages isn't known the pages are followed one at a time,
+        the same as paged_get.
+
+        requests doesn't guarantee a Session is thread safe, so each worker thread makes its requests with its own
+        session. Those requests aren't cached.
+
+        :return: The items of every page, in order
+        """
+
+        response = self._api_request('GET', self._url(path_or_url), **kwargs)
+        response.raise_for_status()
+
+        items = response.json()
+
+        # Relevant params are already in the link URLs
+        kwargs.pop('params', None)
+
+        last_page = None
+        if last_url := response.links.get('last', {}).get('url'):
+            self._url(last_url)  # validate it belongs to this host
+            last = urlparse(last_url)
+            query = parse_qs(last.query)
+
+            try:
+                last_page = int(query['page'][0])
+            except (KeyError, ValueError):
+                debug(f'Unable to find the number of pages from {last_url}')
+
+        if last_page is None:
+            if 'next' in response.links:
+                items.extend(self.paged_get(response.links['next']['url'], **kwargs))
+            return items
+
+        local = threading.local()
+        sessions: list[requests.Session] = []
+
+        def thread_session() -> requests.Session:
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+                self._configure(local.session)
+                sessions.append(local.session)
+            return local.session
+
+        def get_page(page: int) -> list[dict[str, Any]]:
+            url = last._replace(query=urlencode(query | {'page': [str(page)]}, doseq=True)).geturl()
+            page_response = self._api_request('GET', url, session=thread_session(), **kwargs)
+            page_response.raise_for_status()
+            return page_response.json()
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for page_items in executor.map(get_page, range(2, last_page + 1)):
+                    items.extend(page_items)
+        finally:
+            for session in sessions:
+                session.close()
+
+        return items
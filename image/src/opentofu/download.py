@@ -1,5 +1,10 @@
 """
 Module for downloading opentofu executables.
+
+Files can be downloaded from mirrors of the OpenTofu GitHub releases, by setting OPENTOFU_DOWNLOAD_MIRRORS to their
+base urls, separated by spaces or commas. A mirror has the same layout as
+https://github.com/opentofu/opentofu/releases/download, e.g. {mirror}/v1.6.0/tofu_1.6.0_SHA256SUMS.
+See :mod:`terraform.download` for how mirrors are used.
 """
 
 from __future__ import annotations
@@ -7,17 +12,19 @@ from __future__ import annotations
 import os.path
 import subprocess
 from pathlib import Path
-from typing import TYPE_CHECKING, Tuple
-from urllib.request import urlretrieve
-from urllib.error import HTTPError
-from zipfile import ZipFile
+from typing import TYPE_CHECKING, Optional, Tuple
 
-from github_actions.debug import debug
+import requests
 
 if TYPE_CHECKING:
     from terraform.versions import Version
 
-from terraform.download import DownloadError, get_platform, get_arch
+from terraform.download import DownloadError, download_file, file_sha256, get_platform, get_arch, is_not_found, mirror_urls, read_checksum, VersionNotFound
+from terraform.bin_cache import record_use
+from terraform.executable_cache import CachedExecutable, find_executable
+from terraform.signature_ledger import verify_signature
+
+OPENTOFU_RELEASES_URL = 'https://github.com/opentofu/opentofu/releases/download'
 
 
 def get_checksums(version: Version, checksum_dir: Path) -> Path:
@@ -33,75 +40,64 @@ def get_checksums(version: Version, checksum_dir: Path) -> Path:
     os.makedirs(checksum_dir, exist_ok=True)
 
     if not signature_path.exists():
-        signature_url = f'https://github.com/opentofu/opentofu/releases/download/v{version}/tofu_{version}_SHA256SUMS.gpgsig'
-        debug(f'Downloading signature from {signature_url}')
+        signature_url = mirror_urls('OPENTOFU_DOWNLOAD_MIRRORS', OPENTOFU_RELEASES_URL, f'v{version}/tofu_{version}_SHA256SUMS.gpgsig')
 
         try:
-            urlretrieve(
-                signature_url,
-                signature_path
-            )
-        except HTTPError as http_error:
-            if http_error.code == 404:
+            download_file(signature_url, signature_path)
+        except requests.HTTPError as http_error:
+            if is_not_found(http_error):
                 if not version.pre_release:
-                    raise DownloadError(f'Could not download signature file for {version} - does this version exist?')
+                    raise VersionNotFound(f'Could not download signature file for {version} - does this version exist?')
             else:
                 raise
 
     if not checksums_path.exists():
-        checksum_url = f'https://github.com/opentofu/opentofu/releases/download/v{version}/tofu_{version}_SHA256SUMS'
-        debug(f'Downloading checksums from {checksum_url}')
+        checksum_url = mirror_urls('OPENTOFU_DOWNLOAD_MIRRORS', OPENTOFU_RELEASES_URL, f'v{version}/tofu_{version}_SHA256SUMS')
 
         try:
-            urlretrieve(
-                checksum_url,
-                checksums_path
-            )
-        except HTTPError as http_error:
-            if http_error.code == 404:
-                raise DownloadError(f'Could not download checksums for {version} - does this version exist?')
+            download_file(checksum_url, checksums_path)
+        except requests.HTTPError as http_error:
+            if is_not_found(http_error):
+                raise VersionNotFound(f'Could not download checksums for {version} - does this version exist?')
             raise
 
     if signature_path.exists():
         try:
-            subprocess.run(
-                ['gpg', '--assert-signer', 'E3E6E43D84CB852EADB0051D0C0AF313E5FD9F80', '--verify', signature_path, checksums_path],
-                check=True,
-                env={'GNUPGHOME': '/root/.gnupg'} | os.environ
-            )
+            verify_signature(signature_path, checksums_path, 'E3E6E43D84CB852EADB0051D0C0AF313E5FD9F80')
         except subprocess.CalledProcessError:
+            # Don't keep files that can't be trusted, so they are downloaded again next time
+            signature_path.unlink(missing_ok=True)
+            checksums_path.unlink(missing_ok=True)
             raise DownloadError(f'Could not verify checksums signature for {version}')
 
     return checksums_path
 
 
-def download_archive(version: Version, cache_dir: Path) -> Tuple[Path, str]:
+def download_archive(version: Version, cache_dir: Path, sha256: Optional[str] = None) -> Tuple[Path, str]:
     """
     Download the zip file for the given version of opentofu.
 
-    The return value is the path to the zip file
+    :param sha256: The expected sha256 digest of the archive. If the download doesn't match it is discarded.
+    :return: The directory the archive is in, and the name of the archive
     """
 
-    archive_path = Path(cache_dir, f'tofu_{version}_{get_platform()}_{get_arch()}.zip')
+    archive_name = f'tofu_{version}_{get_platform()}_{get_arch()}.zip'
 
-    if os.path.exists(archive_path):
-        return cache_dir, f'tofu_{version}_{get_platform()}_{get_arch()}.zip'
+    if Path(cache_dir, archive_name).exists():
+        return cache_dir, archive_name
 
-    archive_url = f'https://github.com/opentofu/opentofu/releases/download/v{version}/tofu_{version}_{get_platform()}_{get_arch()}.zip'
-    debug(f'Downloading archive from {archive_url}')
-    os.makedirs(cache_dir, exist_ok=True)
+    archive_url = mirror_urls('OPENTOFU_DOWNLOAD_MIRRORS', OPENTOFU_RELEASES_URL, f'v{version}/{archive_name}')
 
     try:
-        urlretrieve(
-            archive_url,
-            archive_path
-        )
-    except HTTPError as http_error:
-        if http_error.code == 404:
+        download_file(archive_url, Path(cache_dir, archive_name), sha256)
+    except requests.HTTPError as http_error:
+        if is_not_found(http_error):
             raise DownloadError(f'Could not download archive for {version} - does this version exist for this platform ({get_platform()}_{get_arch()})?')
         raise
+    except DownloadError:
+        raise DownloadError(f'Could not verify integrity of opentofu executable for {version}')
 
-    return cache_dir, f'tofu_{version}_{get_platform()}_{get_arch()}.zip'
+    return cache_dir, archive_name
 
 
 def verify_archive(version: Version, cache_dir: Path, archive_name: str, checksum_dir: Path) -> None:
@@ -114,73 +110,66 @@ def verify_archive(version: Version, cache_dir: Path, archive_name: str, checksu
     :param checksum_dir: The directory the checksum file can be found in
     """
 
-    def get_checksum():
-        """
-        Get the checksum for specified archive from the checksums file
-        """
-        for line in Path(checksum_dir, f'tofu_{version}_SHA256SUMS').read_bytes().splitlines():
-            if archive_name.encode() in line:
-                return line + b'\n'
-        raise RuntimeError('Checksum not found')
+    expected = read_checksum(Path(checksum_dir, f'tofu_{version}_SHA256SUMS'), archive_name)
 
-    try:
-        subprocess.run(
-            ['shasum', '--algorithm', '256', '--check', '--strict'],
-            check=True,
-            cwd=cache_dir,
-            input=get_checksum()
-        )
-    except subprocess.CalledProcessError:
+    if file_sha256(Path(cache_dir, archive_name)) != expected:
         raise DownloadError(f'Could not verify integrity of opentofu executable for {version}')
 
-def get_archive(version: Version, cache_dirs: list[Path]) -> Tuple[Path, str]:
+
+def get_archive(version: Version, cache_dirs: list[Path], checksum_dir: Path) -> Tuple[Path, str]:
     """
-    Get the zip archive path for a opentofu version
+    Get the verified zip archive path for a opentofu version
+
+    An archive found in a cache dir is verified against the checksums. If there isn't one, it is downloaded to the
+    last cache dir and verified as it downloads.
     """
 
     assert len(cache_dirs) > 0
 
-    for cache_dir in cache_dirs:
+    archive_name = f'tofu_{version}_{get_platform()}_{get_arch()}.zip'
 
-        archive_path = Path(cache_dir, f'tofu_{version}_{get_platform()}_{get_arch()}.zip')
-        if archive_path.is_file():
-            return cache_dir, f'tofu_{version}_{get_platform()}_{get_arch()}.zip'
+    for cache_dir in cache_dirs:
+        if Path(cache_dir, archive_name).is_file():
+            verify_archive(version, cache_dir, archive_name, checksum_dir)
+            return cache_dir, archive_name
 
-    return download_archive(version, cache_dir)
+    return download_archive(version, cache_dirs[-1], read_checksum(Path(checksum_dir, f'tofu_{version}_SHA256SUMS'), archive_name))
 
 
 def get_executable(version: Version) -> Path:
     """
     Get the path to the specified opentofu executable.
 
-    The directories in TERRAFORM_BIN_CACHE_DIR will be searched for the executable as a zip file.
+    The directories in TERRAFORM_BIN_CACHE_DIR will be searched for the extracted executable, then as a zip file.
     If the executable doesn't exist it will be downloaded to the last directory in TERRAFORM_BIN_CACHE_DIR.
     Cache dirs are specified in the TERRAFORM_BIN_CACHE_DIR env var as ':' separated paths.
-    These directories are untrusted and anything found there will be verified.
+    These directories are untrusted. A zip file found there is verified against the checksums, and an extracted
+    executable is only used if it is unchanged since it was extracted from a verified zip file.
 
     The TERRAFORM_BIN_CHECKSUM_DIR will be searched for checksum and signature files.
     If they are not found they will be downloaded to TERRAFORM_BIN_CHECKSUM_DIR.
 
     The default for both TERRAFORM_BIN_CACHE_DIR and TERRAFORM_BIN_CHECKSUM_DIR is .terraform-bin-dir in the current directory.
 
+    An executable extracted from a zip file is cached in the last directory in TERRAFORM_BIN_CACHE_DIR,
+    see :mod:`terraform.executable_cache`. The size of that directory can be limited, see :mod:`terraform.bin_cache`.
+
     The return value is the path to the executable
     """
 
     cache_dirs = [Path(p) for p in os.environ.get('TERRAFORM_BIN_CACHE_DIR', '.terraform-bin-dir').split(':')]
     checksum_dir = Path(os.environ.get('TERRAFORM_BIN_CHECKSUM_DIR', '.terraform-bin-dir'))
 
-    get_checksums(version, checksum_dir)
-    cache_dir, archive_name = get_archive(version, cache_dirs)
-    verify_archive(version, cache_dir, archive_name, checksum_dir)
-
-    executable_dir = Path(os.environ.get('STEP_TMP_DIR', '/tmp'), f'tofu_{version}')
-
-    Path(executable_dir, 'tofu').unlink(missing_ok=True)
-    with ZipFile(Path(cache_dir, archive_name)) as f:
-        f.extract('tofu', executable_dir)
+    checksums_path = get_checksums(version, checksum_dir)
+    archive_name = f'tofu_{version}_{get_platform()}_{get_arch()}.zip'
+    archive_sha256 = read_checksum(checksums_path, archive_name)
 
-    executable_path = Path(executable_dir, 'tofu')
+    if (path := find_executable(cache_dirs, 'tofu', version, f'{get_platform()}_{get_arch()}', archive_sha256)) is not None:
+        record_use(version, cache_dirs[-1], hit=True)
+        return path
 
-    os.chmod(executable_path, 0o755)
+    cache_dir, archive_name = get_archive(version, cache_dirs, checksum_dir)
 
-    return executable_path
+    path = CachedExecutable(cache_dirs[-1], 'tofu', version, f'{get_platform()}_{get_arch()}', archive_sha256).extract(Path(cache_dir, archive_name))
+    record_use(version, cache_dirs[-1], hit=False)
+    return path
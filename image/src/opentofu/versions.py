@@ -1,13 +1,50 @@
-from typing import Iterable
+import json
+from typing import Any, Iterable
 
+import requests
+
+from terraform.release_index import ReleaseIndex, Session, cache_dir as release_index_dir
 from terraform.versions import Version
 
 from opentofu.github import github
 
+# The most releases GitHub will return in one page
+RELEASES_PER_PAGE = 100
+
+RELEASES_URL = f'https://api.github.com/repos/opentofu/opentofu/releases?per_page={RELEASES_PER_PAGE}'
+
+
+def _release_versions(releases: list[dict[str, Any]]) -> list[str]:
+    return [release['tag_name'].lstrip('v') for release in releases]
+
+
+def _parse_opentofu_releases(content: bytes) -> list[str]:
+    return _release_versions(json.loads(content))
+
+
+class GithubReleaseIndex(ReleaseIndex):
+    """
+    The cached list of releases of a GitHub repository.
+
+    The first page of releases is revalidated, which GitHub doesn't count against the rate limit. If it has changed,
+    every page is fetched.
+    """
+
+    def _versions(self, session: Session, response: requests.Response, timeout: float) -> list[str]:
+        if 'next' not in response.links:
+            return self._parse(response.content)
+
+        return _release_versions(github.parallel_paged_get(self.url, timeout=timeout))
+
+
 def get_opentofu_versions() -> Iterable[Version]:
-    """Return the currently available opentofu versions."""
+    """
+    Return the currently available opentofu versions.
+
+    The list of releases is cached, see :mod:`terraform.release_index`.
+    """
 
-    response = github.paged_get('/repos/opentofu/opentofu/releases')
+    index = GithubReleaseIndex('opentofu', RELEASES_URL, _parse_opentofu_releases, release_index_dir())
 
-    for release in response:
-        yield Version(release['tag_name'].lstrip('v'), 'OpenTofu')
+    for version in index.versions(github):
+        yield Version(version, 'OpenTofu')
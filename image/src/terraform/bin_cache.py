@@ -0,0 +1,298 @@
+"""
+A size limit for the bin cache
+
+Without a limit, the bin cache dir keeps every archive and executable ever used.
+If TERRAFORM_BIN_CACHE_MAX_SIZE is set to a number of bytes (optionally with a K, M or G suffix), the least recently
+used versions are evicted from the last directory in TERRAFORM_BIN_CACHE_DIR until it fits in the limit.
+
+Only the last directory in TERRAFORM_BIN_CACHE_DIR is managed. The other directories, and TERRAFORM_BIN_CHECKSUM_DIR,
+may be baked into the image and are never changed. Checksum files are only evicted if they are kept in the bin
+cache dir.
+
+The last use of each version, and counts of cache hits, misses and evictions, are kept in an index in the bin cache
+dir. The index is only changed while holding a lock, so the cache can be shared by concurrent jobs.
+
+Some versions are never evicted:
+- Versions matching a line of the pin file, which is TERRAFORM_BIN_CACHE_PIN_FILE or 'pinned-versions' in the
+  bin cache dir. Each line is a version or version constraints, as accepted by `terraform-version --prewarm`.
+- Versions used in the last TERRAFORM_BIN_CACHE_MIN_AGE seconds (default 6 hours), which may still be in use by
+  another job.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, NamedTuple, TextIO
+
+from github_actions.debug import debug
+from terraform.constraint_set import ConstraintSet
+from terraform.executable_cache import Manifest
+from terraform.versions import Version, parse_version_spec
+
+INDEX_FILENAME = 'cache-index.json'
+LOCK_FILENAME = '.cache-index.lock'
+PIN_FILENAME = 'pinned-versions'
+
+DEFAULT_MIN_AGE = 6 * 60 * 60
+
+_SIZE = re.compile(r'(\d+)\s*([KMG]?)i?B?', re.IGNORECASE)
+_SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+# The product and version a cached file or directory is for
+_RELEASE_NAME = re.compile(r'(terraform|tofu)_([^_]+)_')
+_PRODUCT_NAMES = {'terraform': 'Terraform', 'tofu': 'OpenTofu'}
+
+
+def max_size() -> int | None:
+    """The size limit in bytes from TERRAFORM_BIN_CACHE_MAX_SIZE, or None if there is no limit."""
+
+    if not (value := os.environ.get('TERRAFORM_BIN_CACHE_MAX_SIZE', '').strip()):
+        return None
+
+    if match := _SIZE.fullmatch(value):
+        return int(match.group(1)) * _SIZE_UNITS[match.group(2).upper()]
+
+    debug('TERRAFORM_BIN_CACHE_MAX_SIZE should be a number of bytes')
+    return None
+
+
+def min_age() -> int:
+    """The number of seconds since a version was used before it can be evicted."""
+
+    try:
+        return int(os.environ.get('TERRAFORM_BIN_CACHE_MIN_AGE', DEFAULT_MIN_AGE))
+    except ValueError:
+        debug('TERRAFORM_BIN_CACHE_MIN_AGE should be a number')
+        return DEFAULT_MIN_AGE
+
+
+def read_pins(path: Path) -> list[tuple[str, ConstraintSet]]:
+    """The versions in a pin file, by product."""
+
+    try:
+        lines = path.read_text().splitlines()
+    except OSError:
+        return []
+
+    pins = []
+    for line in lines:
+        if not (line := line.split('#', 1)[0].strip()):
+            continue
+
+        try:
+            pins.append(parse_version_spec(line))
+        except ValueError as e:
+            debug(f'Ignoring {line!r} in {path}: {e}')
+
+    return pins
+
+
+def release_key(version: Version) -> str:
+    """The key for a version in the index, e.g. 'OpenTofu 1.6.0'."""
+    return f'{version.product} {version}'
+
+
+def _size(path: Path) -> int:
+    if path.is_symlink() or not path.is_dir():
+        return path.lstat().st_size
+
+    return sum(
+        os.lstat(os.path.join(dirpath, name)).st_size
+        for dirpath, _, filenames in os.walk(path)
+        for name in filenames
+    )
+
+
+class CacheItem(NamedTuple):
+    path: Path
+    size: int
+    mtime: float
+
+
+class BinCache:
+    """
+    The contents of a bin cache dir, limited to a size.
+
+    :param cache_dir: The bin cache dir that executables are extracted into
+    :param max_size: The most bytes to keep in the dir
+    :param pin_path: The pin file
+    """
+
+    def __init__(self, cache_dir: Path, max_size: int, pin_path: Path | None = None):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.pin_path = pin_path or Path(cache_dir, PIN_FILENAME)
+        self.index_path = Path(cache_dir, INDEX_FILENAME)
+
+    @classmethod
+    def from_env(cls, cache_dir: Path) -> BinCache | None:
+        """The cache with the limit in TERRAFORM_BIN_CACHE_MAX_SIZE, or None if there is no limit."""
+
+        if (size := max_size()) is None:
+            return None
+
+        pin_path = os.environ.get('TERRAFORM_BIN_CACHE_PIN_FILE')
+        return cls(cache_dir, size, Path(pin_path) if pin_path else None)
+
+    def _lock(self) -> TextIO:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        lock = open(Path(self.cache_dir, LOCK_FILENAME), 'w')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def _read_index(self) -> dict[str, Any]:
+        try:
+            index = json.loads(self.index_path.read_text())
+            if isinstance(index, dict) and isinstance(index.get('releases'), dict) and isinstance(index.get('stats'), dict):
+                return index
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            debug(f'Unable to read {self.index_path}: {e}')
+
+        return {'releases': {}, 'stats': {'hits': 0, 'misses': 0, 'evictions': 0, 'evicted_bytes': 0}}
+
+    def _write_index(self, index: dict[str, Any]) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=f'.{INDEX_FILENAME}.')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def _scan(self) -> Iterator[tuple[str, CacheItem]]:
+        """Each cached file or directory, with the release it is for."""
+
+        for directory in [self.cache_dir, Path(self.cache_dir, 'bin')]:
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+
+            for entry in entries:
+                if entry.name.startswith('.') or not (match := _RELEASE_NAME.match(entry.name)):
+                    continue
+
+                try:
+                    version = Version(match.group(2), _PRODUCT_NAMES[match.group(1)])
+                    path = Path(entry.path)
+                    yield release_key(version), CacheItem(path, _size(path), entry.stat(follow_symlinks=False).st_mtime)
+                except (OSError, ValueError):
+                    continue
+
+    def _is_pinned(self, key: str, pins: list[tuple[str, ConstraintSet]]) -> bool:
+        product, version = key.split(' ', 1)
+        return any(pin_product == product and constraints.is_allowed(Version(version, product)) for pin_product, constraints in pins)
+
+    def _remove(self, item: CacheItem) -> None:
+        if item.path.is_dir() and not item.path.is_symlink():
+            # Move it out of the way first, so nothing sees a partly removed executable
+            tmp_path = Path(item.path.parent, f'.{item.path.name}.evicted')
+            os.rename(item.path, tmp_path)
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            Manifest(self.cache_dir).remove(item.path.name)
+        else:
+            item.path.unlink()
+
+    def evict(self, index: dict[str, Any], keep: str) -> list[tuple[str, int]]:
+        """
+        Remove the least recently used releases until the cache fits in the size limit.
+
+        :param index: The cache index, which is updated
+        :param keep: A release that must not be evicted
+        :return: The evicted releases, with the number of bytes removed
+        """
+
+        releases: dict[str, list[CacheItem]] = {}
+        for key, item in self._scan():
+            releases.setdefault(key, []).append(item)
+
+        total = sum(item.size for items in releases.values() for item in items)
+        if total <= self.max_size:
+            return []
+
+        pins = read_pins(self.pin_path)
+        used_before = time.time() - min_age()
+
+        def last_used(key: str) -> float:
+            # A file may have just been added by a job that hasn't recorded using it yet
+            return max(index['releases'].get(key, 0), *(item.mtime for item in releases[key]))
+
+        candidates = sorted(
+            (
+                key for key in releases
+                if key != keep and last_used(key) < used_before and not self._is_pinned(key, pins)
+            ),
+            key=last_used
+        )
+
+        evicted = []
+        for key in candidates:
+            if total <= self.max_size:
+                break
+
+            removed = 0
+            for item in releases[key]:
+                try:
+                    self._remove(item)
+                    removed += item.size
+                except OSError as e:
+                    debug(f'Unable to evict {item.path}: {e}')
+
+            total -= removed
+            index['releases'].pop(key, None)
+            evicted.append((key, removed))
+
+        if total > self.max_size:
+            debug(f'Bin cache is {total} bytes after eviction, which is over the limit of {self.max_size} bytes')
+
+        return evicted
+
+    def record(self, version: Version, hit: bool) -> None:
+        """
+        Record the use of a version, and evict other versions if it was added to the cache.
+
+        :param version: The version that was used
+        :param hit: If the version was found in the cache
+        """
+
+        with self._lock():
+            index = self._read_index()
+            stats = index['stats']
+
+            index['releases'][release_key(version)] = time.time()
+            stats['hits' if hit else 'misses'] = stats.get('hits' if hit else 'misses', 0) + 1
+
+            if not hit:
+                if evicted := self.evict(index, keep=release_key(version)):
+                    removed = sum(size for _, size in evicted)
+                    stats['evictions'] = stats.get('evictions', 0) + len(evicted)
+                    stats['evicted_bytes'] = stats.get('evicted_bytes', 0) + removed
+                    sys.stdout.write(f'Evicted {", ".join(key for key, _ in evicted)} from the bin cache, freeing {removed // (1024 * 1024)} MiB\n')
+
+            self._write_index(index)
+
+        debug(f'Bin cache {"hit" if hit else "miss"} for {release_key(version)}: {stats.get("hits", 0)} hits, {stats.get("misses", 0)} misses, {stats.get("evictions", 0)} evictions')
+
+
+def record_use(version: Version, cache_dir: Path, hit: bool) -> None:
+    """
+    Record the use of a version in the bin cache, if it has a size limit.
+
+    Errors are not fatal, the cache is just not limited.
+    """
+
+    if (cache := BinCache.from_env(cache_dir)) is None:
+        return
+
+    try:
+        cache.record(version, hit)
+    except OSError as e:
+        debug(f'Unable to manage the bin cache: {e}')
@@ -0,0 +1,234 @@
+"""
+Version constraints compiled to intervals
+
+A Constraint allows the release versions in some ranges of (major, minor, patch) numbers, and allows pre-release
+versions only when they exactly match an '=' constraint. Compiling constraints to that form means a set of
+constraints can be intersected once, and applied to a sorted list of versions with a binary search instead of
+checking every constraint against every version.
+
+The result is always the same as Constraint.is_allowed, including its less obvious rules:
+- '~> x' has no upper bound
+- '>= x.y.z-pre' allows the same versions as '> x.y.z', and '< x.y.z-pre' the same as '<= x.y.z'
+- A set with no constraints allows every version, including pre-releases
+"""
+
+from __future__ import annotations
+
+import math
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Sequence
+from functools import cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from terraform.versions import Constraint, Version
+
+# (major, minor, patch)
+Release = tuple
+
+# A half open range of releases, [low, high)
+Interval = tuple[Release, Release]
+
+# (major, minor, patch, pre_release)
+PreRelease = tuple[int, int, int, str]
+
+# Bounds that are below and above every release
+_MIN: Release = ()
+_MAX: Release = (math.inf,)
+
+_EVERYTHING: list[Interval] = [(_MIN, _MAX)]
+
+
+def _release(version: Version) -> Release:
+    return version.major, version.minor, version.patch
+
+
+def _next(release: Release) -> Release:
+    """The smallest release greater than release"""
+    return release[0], release[1], release[2] + 1
+
+
+def _intersect(a: list[Interval], b: list[Interval]) -> list[Interval]:
+    """The intersection of two sorted lists of disjoint intervals"""
+
+    result = []
+    i = j = 0
+
+    while i < len(a) and j < len(b):
+        low = max(a[i][0], b[j][0])
+        high = min(a[i][1], b[j][1])
+
+        if low < high:
+            result.append((low, high))
+
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+
+    return result
+
+
+@cache
+def compile_constraint(constraint: Constraint) -> tuple[tuple[Interval, ...], frozenset[PreRelease]]:
+    """
+    The versions allowed by a constraint.
+
+    :return: The intervals of release versions allowed, and the pre-release versions allowed
+    """
+
+    point = (constraint.major, constraint.minor or 0, constraint.patch or 0)
+    pre_release = constraint.pre_release
+
+    intervals: list[Interval]
+    pre_releases: frozenset[PreRelease] = frozenset()
+
+    if constraint.operator == '=':
+        if pre_release:
+            intervals = []
+            pre_releases = frozenset({(*point, pre_release)})
+        else:
+            intervals = [(point, _next(point))]
+    elif constraint.operator == '!=':
+        intervals = [(_MIN, _MAX)] if pre_release else [(_MIN, point), (_next(point), _MAX)]
+    elif constraint.operator == '>':
+        intervals = [(_next(point), _MAX)]
+    elif constraint.operator == '>=':
+        intervals = [(_next(point) if pre_release else point, _MAX)]
+    elif constraint.operator == '<':
+        intervals = [(_MIN, _next(point) if pre_release else point)]
+    elif constraint.operator == '<=':
+        intervals = [(_MIN, _next(point))]
+    elif constraint.operator == '~>':
+        if constraint.minor is None:
+            intervals = [((constraint.major, 0, 0), _MAX)]
+        elif constraint.patch is None:
+            intervals = [((constraint.major, constraint.minor, 0), (constraint.major + 1, 0, 0))]
+        else:
+            intervals = [(point, (constraint.major, constraint.minor + 1, 0))]
+    else:
+        intervals = []
+
+    return tuple(interval for interval in intervals if interval[0] < interval[1]), pre_releases
+
+
+class ConstraintSet:
+    """
+    The versions allowed by all of a set of constraints.
+
+    :param constraints: The constraints a version must satisfy
+    """
+
+    def __init__(self, constraints: Iterable[Constraint] = ()):
+        self.constraints: tuple[Constraint, ...] = ()
+        self.releases: list[Interval] = list(_EVERYTHING)
+
+        # None means any pre-release is allowed
+        self.pre_releases: frozenset[PreRelease] | None = None
+
+        self._add(tuple(constraints))
+
+    def _add(self, constraints: tuple[Constraint, ...]) -> None:
+        for constraint in constraints:
+            intervals, pre_releases = compile_constraint(constraint)
+            self.releases = _intersect(self.releases, list(intervals))
+            self.pre_releases = pre_releases if self.pre_releases is None else self.pre_releases & pre_releases
+
+        self.constraints += constraints
+        self._lows = [low for low, _ in self.releases]
+
+    def __and__(self, other: ConstraintSet | Iterable[Constraint]) -> ConstraintSet:
+        """A ConstraintSet that only allows versions allowed by both."""
+
+        result = ConstraintSet()
+        result.constraints = self.constraints
+        result.releases = self.releases
+        result.pre_releases = self.pre_releases
+        result._add(other.constraints if isinstance(other, ConstraintSet) else tuple(other))
+        return result
+
+    def __repr__(self) -> str:
+        return f'ConstraintSet({list(self.constraints)!r})'
+
+    def __bool__(self) -> bool:
+        """True if any version could be allowed."""
+        return bool(self.releases) or self.pre_releases is None or bool(self.pre_releases)
+
+    def pinned(self) -> str | None:
+        """
+        The only version allowed, if exactly one version is allowed.
+
+        :return: The version string, e.g. '1.5.7', or None if any number of other versions are allowed.
+        """
+
+        if self.pre_releases is None:
+            return None
+
+        if not self.pre_releases and len(self.releases) == 1:
+            low, high = self.releases[0]
+            if len(low) == 3 and high == _next(low):
+                return '{}.{}.{}'.format(*low)
+
+        if not self.releases and len(self.pre_releases) == 1:
+            (major, minor, patch, pre_release), = self.pre_releases
+            return f'{major}.{minor}.{patch}-{pre_release}'
+
+        return None
+
+    def is_allowed(self, version: Version) -> bool:
+        """Is the given version allowed by every constraint."""
+
+        if version.pre_release:
+            return self.pre_releases is None or (version.major, version.minor, version.patch, version.pre_release) in self.pre_releases
+
+        release = _release(version)
+        i = bisect_right(self._lows, release) - 1
+        return i >= 0 and release < self.releases[i][1]
+
+    def apply(self, versions: Iterable[Version]) -> list[Version]:
+        """The allowed versions, in the order given."""
+
+        return [version for version in versions if self.is_allowed(version)]
+
+    def select(self, versions: Sequence[Version]) -> list[Version]:
+        """
+        The allowed versions from a sorted sequence of versions.
+
+        Only the ranges of versions that can be allowed are visited, found with a binary search.
+
+        :param versions: Versions sorted in ascending order
+        :return: The allowed versions, in ascending order
+        """
+
+        if self.pre_releases is None:
+            return list(versions)
+
+        selected = []
+
+        for low, high in self.releases:
+            start = bisect_left(versions, low, key=_release)
+            end = bisect_left(versions, high, lo=start, key=_release)
+            selected.extend(version for version in versions[start:end] if not version.pre_release)
+
+        if self.pre_releases:
+            for pre_release in self.pre_releases:
+                start = bisect_left(versions, pre_release[:3], key=_release)
+                end = bisect_right(versions, pre_release[:3], lo=start, key=_release)
+                selected.extend(version for version in versions[start:end] if version.pre_release == pre_release[3])
+
+            selected.sort()
+
+        return selected
+
+    def explain(self, version: Version) -> Constraint | None:
+        """
+        The first constraint that doesn't allow a version.
+
+        Returns None if the version is allowed.
+        """
+
+        for constraint in self.constraints:
+            if not ConstraintSet((constraint,)).is_allowed(version):
+                return constraint
+
+        return None
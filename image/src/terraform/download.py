@@ -1,27 +1,399 @@
 """
 Module for downloading terraform executables.
+
+Files are streamed over a pooled HTTP session and hashed as they arrive. They are written to a .part file
+in the destination directory and only moved into place once complete, so an interrupted download never leaves a
+partial file where a complete one is expected. Archives are checked against the signed SHA256SUMS as they download.
+
+An interrupted download is resumed with a Range request, both straight away and by the next step that needs the
+file. Large files can also be fetched as several ranges at once, by setting TERRAFORM_DOWNLOAD_CONNECTIONS to the
+number of connections to use for files of at least TERRAFORM_DOWNLOAD_PARALLEL_THRESHOLD bytes (default 16 MiB).
+
+Files can be downloaded from mirrors of releases.hashicorp.com/terraform, by setting TERRAFORM_DOWNLOAD_MIRRORS to
+their base urls, separated by spaces or commas. Mirrors are tried in order, then releases.hashicorp.com unless
+TERRAFORM_DOWNLOAD_MIRROR_FALLBACK is 'false'. A mirror that can't be reached or fails is given up on straight away,
+without waiting for retries. Files from a mirror are verified the same as files from releases.hashicorp.com.
 """
 
 from __future__ import annotations
 
+import fcntl
+import hashlib
 import os.path
 import platform
+import re
 import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import TYPE_CHECKING, Tuple
-from urllib.request import urlretrieve
-from urllib.error import HTTPError
-from zipfile import ZipFile
+from typing import TYPE_CHECKING, BinaryIO, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
 
 from github_actions.debug import debug
+from terraform.bin_cache import record_use
+from terraform.executable_cache import CachedExecutable, find_executable
+from terraform.signature_ledger import verify_signature
 
 if TYPE_CHECKING:
     from terraform.versions import Version
 
+# Bytes read from a file at a time
+CHUNK_SIZE = 1024 * 1024
+
+# Bytes read from a response at a time. A read that is interrupted is lost, so this is smaller.
+NETWORK_CHUNK_SIZE = 64 * 1024
+
+# Seconds to wait for a connection, and between bytes of a response
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+
+# Seconds to wait for a connection to a mirror, before trying the next one
+MIRROR_CONNECT_TIMEOUT = 2
+
+# The number of times an interrupted download is resumed before giving up
+RETRIES = 3
+
+DEFAULT_PARALLEL_THRESHOLD = 16 * 1024 * 1024
+
+# Errors that mean a download was interrupted, and can be resumed
+_INTERRUPTED = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+_CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+TERRAFORM_RELEASES_URL = 'https://releases.hashicorp.com/terraform'
+
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+
 class DownloadError(Exception):
     """Error downloading terraform"""
 
+
+class VersionNotFound(DownloadError):
+    """The release files for a version don't exist"""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        debug(f'{name} should be a number')
+        return default
+
+
+def file_sha256(path: Path) -> str:
+    """The sha256 digest of a file, as a hex string."""
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _backoff(attempt: int) -> None:
+    time.sleep(0.5 * 2 ** (attempt - 1))
+
+
+def _hash(part: BinaryIO) -> hashlib._Hash:
+    """Hash the contents of a part file, leaving it positioned at the end."""
+
+    digest = hashlib.sha256()
+    part.seek(0)
+    while chunk := part.read(CHUNK_SIZE):
+        digest.update(chunk)
+    return digest
+
+
+def _timeouts(fail_fast: bool) -> tuple[int, int]:
+    """The connect timeout and number of retries for a download."""
+
+    if fail_fast:
+        return MIRROR_CONNECT_TIMEOUT, 0
+
+    return CONNECT_TIMEOUT, RETRIES
+
+
+def _fetch(url: str, part: BinaryIO, fail_fast: bool = False) -> str:
+    """
+    Download a url into a part file, resuming from the end of what is already there.
+
+    :param fail_fast: Give up without retrying, because there is somewhere else to download from
+    :return: The sha256 digest of the complete file
+    """
+
+    connect_timeout, retries = _timeouts(fail_fast)
+    digest = _hash(part)
+    offset = part.tell()
+    attempt = 0
+
+    while True:
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=(connect_timeout, READ_TIMEOUT)) as response:
+                if offset and response.status_code == 416:
+                    # The part file may already be complete
+                    total = re.fullmatch(r'bytes \*/(\d+)', response.headers.get('Content-Range', ''))
+                    if total is not None and int(total.group(1)) == offset:
+                        return digest.hexdigest()
+
+                    debug(f'Unable to resume download of {url} from byte {offset}, starting again')
+                    part.seek(0)
+                    part.truncate()
+                    digest, offset = hashlib.sha256(), 0
+                    continue
+
+                response.raise_for_status()
+
+                if offset:
+                    content_range = _CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+                    if response.status_code == 206 and content_range is not None and int(content_range.group(1)) == offset:
+                        debug(f'Resuming download of {url} from byte {offset}')
+                    else:
+                        debug(f'Unable to resume download of {url} from byte {offset}, starting again')
+                        part.seek(0)
+                        part.truncate()
+                        digest, offset = hashlib.sha256(), 0
+
+                        if response.status_code == 206:
+                            continue
+
+                for chunk in response.iter_content(NETWORK_CHUNK_SIZE):
+                    digest.update(chunk)
+                    part.write(chunk)
+                    offset += len(chunk)
+
+                part.flush()
+                return digest.hexdigest()
+
+        except _INTERRUPTED as e:
+            part.flush()
+            attempt += 1
+            if attempt > retries:
+                raise
+
+            debug(f'Download of {url} interrupted after {offset} bytes: {e}')
+            _backoff(attempt)
+
+
+def _fetch_ranges(url: str, part: BinaryIO, size: int, connections: int, fail_fast: bool = False) -> None:
+    """
+    Download a url into an empty part file, as several ranges at once.
+
+    If any range fails, the part file is truncated to the bytes that were downloaded without a gap,
+    so the download can be resumed from there.
+    """
+
+    connect_timeout, retries = _timeouts(fail_fast)
+
+    segment_size = -(-size // connections)
+    segments = [(start, min(start + segment_size, size)) for start in range(0, size, segment_size)]
+
+    # The number of bytes written to each segment
+    progress = [0] * len(segments)
+
+    def fetch_segment(index: int) -> None:
+        start, end = segments[index]
+        attempt = 0
+
+        while start + progress[index] < end:
+            position = start + progress[index]
+            try:
+                with session.get(url, headers={'Range': f'bytes={position}-{end - 1}'}, stream=True, timeout=(connect_timeout, READ_TIMEOUT)) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise DownloadError(f'{url} does not support range requests')
+
+                    for chunk in response.iter_content(NETWORK_CHUNK_SIZE):
+                        chunk = chunk[:end - position]
+                        os.pwrite(part.fileno(), chunk, position)
+                        position += len(chunk)
+                        progress[index] += len(chunk)
+            except _INTERRUPTED:
+                attempt += 1
+                if attempt > retries:
+                    raise
+                _backoff(attempt)
+
+    debug(f'Downloading {url} as {len(segments)} ranges')
+    part.truncate(size)
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+            for future in [executor.submit(fetch_segment, index) for index in range(len(segments))]:
+                future.result()
+    except BaseException:
+        complete = 0
+        for (start, end), written in zip(segments, progress):
+            complete += written
+            if start + written < end:
+                break
+        part.truncate(complete)
+        raise
+
+
+def _parallel_size(url: str, fail_fast: bool = False) -> Optional[int]:
+    """The size of the file at url, if it should be downloaded as several ranges at once."""
+
+    if _env_int('TERRAFORM_DOWNLOAD_CONNECTIONS', 1) <= 1:
+        return None
+
+    try:
+        response = session.head(url, allow_redirects=True, timeout=_timeouts(fail_fast)[0])
+        response.raise_for_status()
+        size = int(response.headers.get('Content-Length', 0))
+    except (requests.RequestException, ValueError):
+        return None
+
+    if response.headers.get('Accept-Ranges') != 'bytes' or size < _env_int('TERRAFORM_DOWNLOAD_PARALLEL_THRESHOLD', DEFAULT_PARALLEL_THRESHOLD):
+        return None
+
+    return size
+
+
+def _open_part(part_path: Path) -> BinaryIO:
+    """
+    Open and lock a part file.
+
+    Only one process can download to a part file at a time. Another process waiting for it may find the
+    part file has been moved to its final path, in which case a new part file is opened.
+    """
+
+    while True:
+        part = os.fdopen(os.open(part_path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b')
+        fcntl.flock(part, fcntl.LOCK_EX)
+
+        try:
+            if os.stat(part_path).st_ino == os.fstat(part.fileno()).st_ino:
+                return part
+        except FileNotFoundError:
+            pass
+
+        part.close()
+
+
+def _download(url: str, part: BinaryIO, sha256: Optional[str], fail_fast: bool) -> str:
+    """
+    Download a url into a part file.
+
+    :return: The sha256 digest of the complete file
+    :raises DownloadError: If the file doesn't match the expected digest
+    """
+
+    debug(f'Downloading {url}')
+    digest = None
+
+    if part.seek(0, os.SEEK_END) == 0 and (size := _parallel_size(url, fail_fast)) is not None:
+        try:
+            _fetch_ranges(url, part, size, _env_int('TERRAFORM_DOWNLOAD_CONNECTIONS', 1), fail_fast)
+            digest = _hash(part).hexdigest()
+        except (requests.RequestException, DownloadError) as e:
+            debug(f'Unable to download {url} as ranges, continuing with one connection: {e}')
+
+    if digest is None:
+        digest = _fetch(url, part, fail_fast)
+
+    if sha256 is not None and digest != sha256.lower():
+        raise DownloadError(f'Downloaded file {url.rsplit("/", 1)[-1]} has sha256 digest {digest}, expected {sha256}')
+
+    return digest
+
+
+def download_file(url: str | list[str], path: Path, sha256: Optional[str] = None) -> str:
+    """
+    Download a url to a path.
+
+    The file is hashed as it is downloaded, and only appears at path once it is complete.
+    If the download is interrupted it is resumed, and what was downloaded so far is kept in a .part file
+    next to path for the next attempt to resume from. The .part file is removed if nothing was downloaded.
+    If sha256 is given and the downloaded file doesn't match, nothing is written to path.
+
+    If a list of urls is given they are tried in order. Each url except the last is given up on as soon as it fails,
+    and what was downloaded from it is discarded.
+
+    :param url: The url to download, or a list of urls of the same file
+    :param path: Where to save the file
+    :param sha256: The expected sha256 digest of the file, as a hex string
+    :return: The sha256 digest of the downloaded file
+    :raises requests.HTTPError: If the response is an error
+    :raises DownloadError: If the file doesn't match the expected digest
+    """
+
+    urls = [url] if isinstance(url, str) else url
+    assert len(urls) > 0
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    part_path = Path(path.parent, f'.{path.name}.part')
+
+    with _open_part(part_path) as part:
+        for mirror_url in urls[:-1]:
+            try:
+                digest = _download(mirror_url, part, sha256, fail_fast=True)
+                break
+            except (requests.RequestException, DownloadError) as e:
+                debug(f'Unable to download {mirror_url}, trying the next mirror: {e}')
+                part.seek(0)
+                part.truncate()
+        else:
+            try:
+                digest = _download(urls[-1], part, sha256, fail_fast=False)
+            except (requests.HTTPError, DownloadError):
+                part_path.unlink(missing_ok=True)
+                raise
+            except BaseException:
+                # Nothing was downloaded, so there is nothing to resume from
+                if os.fstat(part.fileno()).st_size == 0:
+                    part_path.unlink(missing_ok=True)
+                raise
+
+        os.replace(part_path, path)
+
+    return digest
+
+
+def mirror_urls(env_var: str, upstream: str, path: str) -> list[str]:
+    """
+    The urls to download a file from.
+
+    :param env_var: The environment variable with the base urls of mirrors
+    :param upstream: The base url of the original location
+    :param path: The path of the file relative to the base url
+    :return: The url of the file in each mirror, then the original location unless TERRAFORM_DOWNLOAD_MIRROR_FALLBACK is 'false'
+    """
+
+    bases = os.environ.get(env_var, '').replace(',', ' ').split()
+
+    if not bases or os.environ.get('TERRAFORM_DOWNLOAD_MIRROR_FALLBACK', 'true').lower() != 'false':
+        bases.append(upstream)
+
+    return [f'{base.rstrip("/")}/{path}' for base in bases]
+
+
+def read_checksum(checksums_path: Path, filename: str) -> str:
+    """
+    The sha256 digest of a file from a SHA256SUMS file.
+
+    :raises RuntimeError: If the file is not listed
+    """
+
+    for line in checksums_path.read_text().splitlines():
+        digest, _, name = line.strip().partition(' ')
+        if name.strip().lstrip('*') == filename:
+            return digest.lower()
+
+    raise RuntimeError('Checksum not found')
+
+
+def is_not_found(error: requests.HTTPError) -> bool:
+    """Is an HTTP error a 404"""
+    return error.response is not None and error.response.status_code == 404
+
 def get_platform() -> str:
     """Return terraform's idea of the current platform name."""
 
@@ -69,72 +441,61 @@ def get_checksums(version: Version, checksum_dir: Path) -> Path:
     os.makedirs(checksum_dir, exist_ok=True)
 
     if not signature_path.exists():
-        signature_url = f'https://releases.hashicorp.com/terraform/{version}/terraform_{version}_SHA256SUMS.72D7468F.sig'
-        debug(f'Downloading signature from {signature_url}')
+        signature_url = mirror_urls('TERRAFORM_DOWNLOAD_MIRRORS', TERRAFORM_RELEASES_URL, f'{version}/terraform_{version}_SHA256SUMS.72D7468F.sig')
 
         try:
-            urlretrieve(
-                signature_url,
-                signature_path
-            )
-        except HTTPError as http_error:
-            if http_error.code == 404:
-                raise DownloadError(f'Could not download signature file for {version} - does this version exist?')
+            download_file(signature_url, signature_path)
+        except requests.HTTPError as http_error:
+            if is_not_found(http_error):
+                raise VersionNotFound(f'Could not download signature file for {version} - does this version exist?')
             raise
 
     if not checksums_path.exists():
-        checksum_url = f'https://releases.hashicorp.com/terraform/{version}/terraform_{version}_SHA256SUMS'
-        debug(f'Downloading checksums from {checksum_url}')
+        checksum_url = mirror_urls('TERRAFORM_DOWNLOAD_MIRRORS', TERRAFORM_RELEASES_URL, f'{version}/terraform_{version}_SHA256SUMS')
 
         try:
-            urlretrieve(
-                checksum_url,
-                checksums_path
-            )
-        except HTTPError as http_error:
-            if http_error.code == 404:
-                raise DownloadError(f'Could not download checksums for {version} - does this version exist?')
+            download_file(checksum_url, checksums_path)
+        except requests.HTTPError as http_error:
+            if is_not_found(http_error):
+                raise VersionNotFound(f'Could not download checksums for {version} - does this version exist?')
             raise
 
     try:
-        subprocess.run(
-            ['gpg', '--assert-signer', 'C874011F0AB405110D02105534365D9472D7468F', '--verify', signature_path, checksums_path],
-            check=True,
-            env={'GNUPGHOME': '/root/.gnupg'} | os.environ
-        )
+        verify_signature(signature_path, checksums_path, 'C874011F0AB405110D02105534365D9472D7468F')
     except subprocess.CalledProcessError:
+        # Don't keep files that can't be trusted, so they are downloaded again next time
+        signature_path.unlink(missing_ok=True)
+        checksums_path.unlink(missing_ok=True)
         raise DownloadError(f'Could not verify checksums signature for {version}')
 
     return checksums_path
 
 
-def download_archive(version: Version, cache_dir: Path) -> Tuple[Path, str]:
+def download_archive(version: Version, cache_dir: Path, sha256: Optional[str] = None) -> Tuple[Path, str]:
     """
     Download the zip file for the given version of terraform.
 
-    The return value is the path to the zip file
+    :param sha256: The expected sha256 digest of the archive. If the download doesn't match it is discarded.
+    :return: The directory the archive is in, and the name of the archive
     """
 
-    archive_path = Path(cache_dir, f'terraform_{version}_{get_platform()}_{get_arch()}.zip')
+    archive_name = f'terraform_{version}_{get_platform()}_{get_arch()}.zip'
 
-    if os.path.exists(archive_path):
-        return cache_dir, f'terraform_{version}_{get_platform()}_{get_arch()}.zip'
+    if Path(cache_dir, archive_name).exists():
+        return cache_dir, archive_name
 
-    archive_url = f'https://releases.hashicorp.com/terraform/{version}/terraform_{version}_{get_platform()}_{get_arch()}.zip'
-    debug(f'Downloading archive from {archive_url}')
-    os.makedirs(cache_dir, exist_ok=True)
+    archive_url = mirror_urls('TERRAFORM_DOWNLOAD_MIRRORS', TERRAFORM_RELEASES_URL, f'{version}/{archive_name}')
 
     try:
-        urlretrieve(
-            archive_url,
-            archive_path
-        )
-    except HTTPError as http_error:
-        if http_error.code == 404:
+        download_file(archive_url, Path(cache_dir, archive_name), sha256)
+    except requests.HTTPError as http_error:
+        if is_not_found(http_error):
             raise DownloadError(f'Could not download archive for {version} - does this version exist for this platform ({get_platform()}_{get_arch()})?')
         raise
+    except DownloadError:
+        raise DownloadError(f'Could not verify integrity of terraform executable for {version}')
 
-    return cache_dir, f'terraform_{version}_{get_platform()}_{get_arch()}.zip'
+    return cache_dir, archive_name
 
 
 def verify_archive(version: Version, cache_dir: Path, archive_name: str, checksum_dir: Path) -> None:
@@ -147,73 +508,66 @@ def verify_archive(version: Version, cache_dir: Path, archive_name: str, checksu
     :param checksum_dir: The directory the checksum file can be found in
     """
 
-    def get_checksum():
-        """
-        Get the checksum for specified archive from the checksums file
-        """
-        for line in Path(checksum_dir, f'terraform_{version}_SHA256SUMS').read_bytes().splitlines():
-            if archive_name.encode() in line:
-                return line + b'\n'
-        raise RuntimeError('Checksum not found')
+    expected = read_checksum(Path(checksum_dir, f'terraform_{version}_SHA256SUMS'), archive_name)
 
-    try:
-        subprocess.run(
-            ['shasum', '--algorithm', '256', '--check', '--strict'],
-            check=True,
-            cwd=cache_dir,
-            input=get_checksum()
-        )
-    except subprocess.CalledProcessError:
+    if file_sha256(Path(cache_dir, archive_name)) != expected:
         raise DownloadError(f'Could not verify integrity of terraform executable for {version}')
 
-def get_archive(version: Version, cache_dirs: list[Path]) -> Tuple[Path, str]:
+
+def get_archive(version: Version, cache_dirs: list[Path], checksum_dir: Path) -> Tuple[Path, str]:
     """
-    Get the zip archive path for a terraform version
+    Get the verified zip archive path for a terraform version
+
+    An archive found in a cache dir is verified against the checksums. If there isn't one, it is downloaded to the
+    last cache dir and verified as it downloads.
     """
 
     assert len(cache_dirs) > 0
 
-    for cache_dir in cache_dirs:
+    archive_name = f'terraform_{version}_{get_platform()}_{get_arch()}.zip'
 
-        archive_path = Path(cache_dir, f'terraform_{version}_{get_platform()}_{get_arch()}.zip')
-        if archive_path.is_file():
-            return cache_dir, f'terraform_{version}_{get_platform()}_{get_arch()}.zip'
+    for cache_dir in cache_dirs:
+        if Path(cache_dir, archive_name).is_file():
+            verify_archive(version, cache_dir, archive_name, checksum_dir)
+            return cache_dir, archive_name
 
-    return download_archive(version, cache_dir)
+    return download_archive(version, cache_dirs[-1], read_checksum(Path(checksum_dir, f'terraform_{version}_SHA256SUMS'), archive_name))
 
 
 def get_executable(version: Version) -> Path:
     """
     Get the path to the specified terraform executable.
 
-    The directories in TERRAFORM_BIN_CACHE_DIR will be searched for the executable as a zip file.
+    The directories in TERRAFORM_BIN_CACHE_DIR will be searched for the extracted executable, then as a zip file.
     If the executable doesn't exist it will be downloaded to the last directory in TERRAFORM_BIN_CACHE_DIR.
     Cache dirs are specified in the TERRAFORM_BIN_CACHE_DIR env var as ':' separated paths.
-    These directories are untrusted and anything found there will be verified.
+    These directories are untrusted. A zip file found there is verified against the checksums, and an extracted
+    executable is only used if it is unchanged since it was extracted from a verified zip file.
 
     The TERRAFORM_BIN_CHECKSUM_DIR will be searched for checksum and signature files.
     If they are not found they will be downloaded to TERRAFORM_BIN_CHECKSUM_DIR.
 
     The default for both TERRAFORM_BIN_CACHE_DIR and TERRAFORM_BIN_CHECKSUM_DIR is .terraform-bin-dir in the current directory.
 
+    An executable extracted from a zip file is cached in the last directory in TERRAFORM_BIN_CACHE_DIR,
+    see :mod:`terraform.executable_cache`. The size of that directory can be limited, see :mod:`terraform.bin_cache`.
+
     The return value is the path to the executable
     """
 
     cache_dirs = [Path(p) for p in os.environ.get('TERRAFORM_BIN_CACHE_DIR', '.terraform-bin-dir').split(':')]
     checksum_dir = Path(os.environ.get('TERRAFORM_BIN_CHECKSUM_DIR', '.terraform-bin-dir'))
 
-    get_checksums(version, checksum_dir)
-    cache_dir, archive_name = get_archive(version, cache_dirs)
-    verify_archive(version, cache_dir, archive_name, checksum_dir)
-
-    executable_dir = Path(os.environ.get('STEP_TMP_DIR', '/tmp'), f'terraform_{version}')
-
-    Path(executable_dir, 'terraform').unlink(missing_ok=True)
-    with ZipFile(Path(cache_dir, archive_name)) as f:
-        f.extract('terraform', executable_dir)
+    checksums_path = get_checksums(version, checksum_dir)
+    archive_name = f'terraform_{version}_{get_platform()}_{get_arch()}.zip'
+    archive_sha256 = read_checksum(checksums_path, archive_name)
 
-    executable_path = Path(executable_dir, 'terraform')
+    if (path := find_executable(cache_dirs, 'terraform', version, f'{get_platform()}_{get_arch()}', archive_sha256)) is not None:
+        record_use(version, cache_dirs[-1], hit=True)
+        return path
 
-    os.chmod(executable_path, 0o755)
+    cache_dir, archive_name = get_archive(version, cache_dirs, checksum_dir)
 
-    return executable_path
+    path = CachedExecutable(cache_dirs[-1], 'terraform', version, f'{get_platform()}_{get_arch()}', archive_sha256).extract(Path(cache_dir, archive_name))
+    record_use(version, cache_dirs[-1], hit=False)
+    return path
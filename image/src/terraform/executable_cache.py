@@ -0,0 +1,287 @@
+"""
+A cache of extracted executables
+
+Extracting an executable from its archive means reading and verifying the archive, then unzipping a large binary.
+Extracted executables are kept in the 'bin' directory of a bin cache dir, keyed by product, version, platform and
+the sha256 digest of the archive they came from. The digest is taken from the signed SHA256SUMS file, so finding a
+cached executable doesn't need the archive at all.
+
+When an executable is extracted, a stamp is written next to it recording the sha256 digest of the executable and its
+inode, size, mtime and ctime. A cached executable is used if its stat matches the stamp, so a cache hit only costs
+reading the stamp and an fstat. Changing the file in any way changes its ctime.
+
+The bin cache dirs are untrusted, so the stamp is authenticated with an HMAC using the key of the signature ledger,
+see :mod:`terraform.signature_ledger`. A stamp can't be made for a planted executable without the key. An executable
+with a stamp that wasn't made with the current key, e.g. one extracted by another job, is extracted again from its
+verified archive.
+
+If the stat doesn't match, e.g. because the file was chowned or copied into a new image layer, the executable is
+hashed again. It is restamped if the digest matches, or discarded otherwise.
+
+Each cache dir has a manifest of the executables that have been extracted into it. Finding an executable is then a
+lookup in the manifest of each cache dir, and only a listed executable is opened and checked against its stamp.
+A cache dir without a manifest is probed directly.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+from zipfile import ZipFile
+
+from github_actions.debug import debug
+from terraform.signature_ledger import default_ledger
+
+if TYPE_CHECKING:
+    from terraform.versions import Version
+
+STAMP_FILENAME = 'stamp.json'
+MANIFEST_FILENAME = 'manifest.json'
+
+# Bytes read from a file at a time
+CHUNK_SIZE = 1024 * 1024
+
+
+def _stat_fields(stat: os.stat_result) -> dict[str, int]:
+    return {
+        'ino': stat.st_ino,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'ctime_ns': stat.st_ctime_ns,
+    }
+
+
+def _stamp_mac(stamp: dict[str, Any]) -> str:
+    fields = {field: stamp.get(field) for field in ('archive_sha256', 'sha256', 'ino', 'size', 'mtime_ns', 'ctime_ns')}
+    return default_ledger().mac(json.dumps(fields, sort_keys=True))
+
+
+def _make_stamp(archive_sha256: str, sha256: str, stat: os.stat_result) -> dict[str, Any]:
+    stamp = {'archive_sha256': archive_sha256, 'sha256': sha256} | _stat_fields(stat)
+    return stamp | {'mac': _stamp_mac(stamp)}
+
+
+def _sha256(fd: int) -> str:
+    digest = hashlib.sha256()
+    os.lseek(fd, 0, os.SEEK_SET)
+    while chunk := os.read(fd, CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CachedExecutable:
+    """
+    An executable extracted from a verified archive.
+
+    :param cache_dir: The bin cache dir the executable is kept in
+    :param name: The name of the executable, e.g. 'terraform'
+    :param version: The version of the product
+    :param platform: The platform and architecture of the archive, e.g. 'linux_amd64'
+    :param archive_sha256: The sha256 digest of the verified archive
+    """
+
+    def __init__(self, cache_dir: Path, name: str, version: Version, platform: str, archive_sha256: str):
+        self.cache_dir = cache_dir
+        self.name = name
+        self.version = version
+        self.platform = platform
+        self.archive_sha256 = archive_sha256
+        self.dir = Path(cache_dir, 'bin', f'{name}_{version}_{platform}_{archive_sha256[:16]}')
+        self.path = Path(self.dir, name)
+        self.stamp_path = Path(self.dir, STAMP_FILENAME)
+
+    def _read_stamp(self) -> dict[str, Any] | None:
+        try:
+            stamp = json.loads(self.stamp_path.read_text())
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(stamp, dict) or stamp.get('archive_sha256') != self.archive_sha256:
+            return None
+
+        if not hmac.compare_digest(str(stamp.get('mac', '')), _stamp_mac(stamp)):
+            debug(f'Stamp of cached executable {self.path} was not made with the signature ledger key')
+            return None
+
+        return stamp
+
+    def _write_stamp(self, fd: int, sha256: str) -> None:
+        stamp = _make_stamp(self.archive_sha256, sha256, os.fstat(fd))
+
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=self.dir, prefix=f'.{STAMP_FILENAME}.')
+        with os.fdopen(tmp_fd, 'w') as f:
+            json.dump(stamp, f)
+        os.replace(tmp_path, self.stamp_path)
+
+    def is_valid(self) -> bool:
+        """Is the cached executable present and unchanged since it was verified."""
+
+        if (stamp := self._read_stamp()) is None:
+            return False
+
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return False
+
+        try:
+            stat = os.fstat(fd)
+            if _stat_fields(stat) == {field: stamp.get(field) for field in ('ino', 'size', 'mtime_ns', 'ctime_ns')}:
+                return stat.st_mode & 0o111 != 0
+
+            # The file has been touched, check that its content hasn't changed
+            if stat.st_size != stamp.get('size') or _sha256(fd) != stamp.get('sha256'):
+                debug(f'Cached executable {self.path} has been modified')
+                return False
+
+            debug(f'Restamping cached executable {self.path}')
+            try:
+                os.chmod(self.path, 0o755)
+                self._write_stamp(fd, stamp['sha256'])
+            except OSError as e:
+                debug(f'Unable to restamp {self.path}: {e}')
+
+            return True
+        finally:
+            os.close(fd)
+
+    def extract(self, archive_path: Path) -> Path:
+        """
+        Extract the executable from a verified archive into the cache.
+
+        If the cache entry can't be written, the executable is extracted into STEP_TMP_DIR instead.
+
+        :param archive_path: The archive, which must have the digest this executable was created with
+        :return: The path to the executable
+        """
+
+        try:
+            self.dir.parent.mkdir(parents=True, exist_ok=True)
+            tmp_dir = Path(tempfile.mkdtemp(dir=self.dir.parent, prefix=f'.{self.dir.name}.'))
+        except OSError as e:
+            debug(f'Unable to cache executable: {e}')
+            tmp_dir = Path(tempfile.mkdtemp(dir=os.environ.get('STEP_TMP_DIR', '/tmp'), prefix=f'{self.name}_'))
+            with ZipFile(archive_path) as f:
+                f.extract(self.name, tmp_dir)
+            os.chmod(Path(tmp_dir, self.name), 0o755)
+            return Path(tmp_dir, self.name)
+
+        try:
+            with ZipFile(archive_path) as f:
+                f.extract(self.name, tmp_dir)
+
+            os.chmod(Path(tmp_dir, self.name), 0o755)
+
+            fd = os.open(Path(tmp_dir, self.name), os.O_RDONLY)
+            try:
+                stamp = _make_stamp(self.archive_sha256, _sha256(fd), os.fstat(fd))
+            finally:
+                os.close(fd)
+
+            Path(tmp_dir, STAMP_FILENAME).write_text(json.dumps(stamp))
+
+            if self.dir.exists():
+                # Replace an entry that failed validation
+                shutil.rmtree(self.dir, ignore_errors=True)
+
+            try:
+                os.rename(tmp_dir, self.dir)
+            except OSError:
+                # Another process cached the same executable first
+                if not self.is_valid():
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        try:
+            Manifest(self.cache_dir).add(self)
+        except OSError as e:
+            debug(f'Unable to add {self.path} to the manifest: {e}')
+
+        debug(f'Cached executable {self.path}')
+        return self.path
+
+
+class Manifest:
+    """
+    The executables that have been extracted into a cache dir.
+
+    Entries are keyed by the name of the executable's directory, which includes the archive digest.
+
+    :param cache_dir: The bin cache dir
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.path = Path(cache_dir, 'bin', MANIFEST_FILENAME)
+
+    def entries(self) -> dict[str, Any] | None:
+        """The entries in the manifest, or None if there is no manifest."""
+
+        try:
+            entries = json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            debug(f'Unable to read {self.path}: {e}')
+            return None
+
+        return entries if isinstance(entries, dict) else None
+
+    def _update(self, key: str, entry: dict[str, str] | None) -> None:
+        # Executables may be extracted into the same cache dir by other processes
+        with open(Path(self.path.parent, f'.{MANIFEST_FILENAME}.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            entries = self.entries() or {}
+            if entry is None:
+                entries.pop(key, None)
+            else:
+                entries[key] = entry
+
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f'.{MANIFEST_FILENAME}.')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entries, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def add(self, executable: CachedExecutable) -> None:
+        """Add an extracted executable to the manifest."""
+
+        self._update(executable.dir.name, {
+            'product': executable.version.product,
+            'version': str(executable.version),
+            'platform': executable.platform,
+            'archive_sha256': executable.archive_sha256,
+        })
+
+    def remove(self, key: str) -> None:
+        """Remove an executable from the manifest, by the name of its directory."""
+
+        self._update(key, None)
+
+
+def find_executable(cache_dirs: list[Path], name: str, version: Version, platform: str, archive_sha256: str) -> Path | None:
+    """
+    Find a valid cached executable in any of the cache dirs.
+
+    :return: The path to the executable, or None if none of the cache dirs have it
+    """
+
+    for cache_dir in cache_dirs:
+        executable = CachedExecutable(cache_dir, name, version, platform, archive_sha256)
+
+        entries = Manifest(cache_dir).entries()
+        if entries is not None and executable.dir.name not in entries:
+            continue
+
+        if executable.is_valid():
+            debug(f'Using cached executable {executable.path}')
+            return executable.path
+
+    return None
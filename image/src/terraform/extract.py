@@ -0,0 +1,130 @@
+"""
+Extract selected top level blocks from hcl source
+
+Most of a terraform module is resource, data and locals blocks that we don't need.
+Building a full syntax tree for them can be slow, so this tokenizes just enough of the source to find
+where each top level block starts and ends. Only the source of the wanted blocks is kept, which can then be parsed
+as normal.
+
+The tokenizer understands strings (including template interpolations), heredocs and comments, which are
+the places a brace might appear that doesn't open or close a block.
+"""
+
+from __future__ import annotations
+
+import re
+from collections.abc import Collection
+
+# Tokens that matter outside a string
+_CODE_TOKEN = re.compile(r'[{}"#]|//|/\*|<<-?')
+
+# Tokens that matter inside a quoted string
+_STRING_TOKEN = re.compile(r'\\.|"|\$\$\{|%%\{|\$\{|%\{', re.DOTALL)
+
+_HEREDOC_START = re.compile(r'<<-?([A-Za-z_][\w-]*)[ \t]*\r?\n')
+
+_BLOCK_HEADER = re.compile(r'\s*([A-Za-z_][\w-]*)(?:\s+(?:"(?:[^"\\\n]|\\.)*"|[A-Za-z_][\w-]*))*\s*')
+
+_STRING = 'string'
+_BRACE = 'brace'
+_INTERPOLATION = 'interpolation'
+
+
+def _skip_comment(text: str, token: str, pos: int) -> int:
+    """Return the position after the comment starting at pos."""
+
+    if token == '/*':
+        end = text.find('*/', pos + 2)
+        if end == -1:
+            raise ValueError('Unterminated comment')
+        return end + 2
+
+    end = text.find('\n', pos)
+    return len(text) if end == -1 else end + 1
+
+
+def _skip_heredoc(text: str, pos: int) -> int:
+    """Return the position after the heredoc starting at pos."""
+
+    if not (match := _HEREDOC_START.match(text, pos)):
+        raise ValueError('Invalid heredoc')
+
+    end_marker = re.compile(rf'^[ \t]*{re.escape(match.group(1))}[ \t]*\r?$', re.MULTILINE)
+    if not (end := end_marker.search(text, match.end())):
+        raise ValueError(f'Unterminated heredoc {match.group(1)}')
+
+    return end.end()
+
+
+def extract_blocks(text: str, block_types: Collection[str]) -> str:
+    """
+    Return the source of the top level blocks of the given types.
+
+    :param text: hcl source, e.g. the contents of a .tf file
+    :param block_types: The types of block to keep, e.g. 'terraform', 'variable'
+    :raises ValueError: If the source couldn't be tokenized.
+    """
+
+    blocks: list[str] = []
+
+    # What we are currently inside of
+    stack: list[str] = []
+
+    pos = 0
+    block_start = 0
+    block_type = ''
+
+    while True:
+        in_string = bool(stack) and stack[-1] == _STRING
+
+        match = (_STRING_TOKEN if in_string else _CODE_TOKEN).search(text, pos)
+        if match is None:
+            break
+
+        token = match.group()
+        pos = match.end()
+
+        if in_string:
+            if token == '"':
+                stack.pop()
+            elif token in ('${', '%{'):
+                stack.append(_INTERPOLATION)
+
+        elif token == '"':
+            stack.append(_STRING)
+
+        elif token in ('#', '//', '/*'):
+            pos = _skip_comment(text, token, match.start())
+            if not stack and text[block_start:match.start()].strip() == '':
+                block_start = pos
+
+        elif token.startswith('<<'):
+            pos = _skip_heredoc(text, match.start())
+
+        elif token == '{':
+            if not stack:
+                header = _BLOCK_HEADER.fullmatch(text, block_start, match.start())
+                if header is None:
+                    raise ValueError(f'Unexpected top level content {text[block_start:match.start()].strip()!r}')
+                block_type = header.group(1)
+
+            stack.append(_BRACE)
+
+        elif token == '}':
+            if not stack:
+                raise ValueError('Unbalanced }')
+
+            stack.pop()
+
+            if not stack:
+                if block_type in block_types:
+                    blocks.append(text[block_start:pos])
+                block_start = pos
+
+    if stack:
+        raise ValueError(f'Unexpected end of input inside {stack[-1]}')
+
+    if text[block_start:].strip():
+        raise ValueError(f'Unexpected top level content {text[block_start:].strip()!r}')
+
+    return '\n'.join(blocks) + '\n'
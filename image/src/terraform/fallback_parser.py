@@ -11,88 +11,240 @@ The easiest way to get this information is to parse the HCL files directly.
 This doesn't always work if our parser fails, or the files are malformed.
 
 This fallback 'parser' does the stupidest thing that might work to get the information we need.
-
-TODO: The backend configuration is not yet implemented.
+It reads the file one line at a time, keeping track of which block each line is in by counting braces.
+Only simple attributes are understood, and only in the blocks we are interested in. Attributes with a value that
+can't be represented, like a list spread over several lines, are left out.
 """
 
+from __future__ import annotations
+
 import re
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
 
 from github_actions.debug import debug
 
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"')
+_COMMENT = re.compile(r'\s*(?:#|//).*$')
+_BLOCK_START = re.compile(r'\s*(terraform|variable|backend|cloud|workspaces)(?:\s*"([^"]*)"|\s+([\w-]+))?\s*\{')
+_ATTRIBUTE = re.compile(r'\s*([\w-]+)\s*=\s*([^{}]*?)\s*(?=}|$)')
+_REQUIRED_VERSION = re.compile(r'required_version\s*=\s*"(.+)"')
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+_BRACE = re.compile(r'[{}]')
+_HEREDOC = re.compile(r'<<-?([\w-]+)\s*$')
+_LIST_ITEM = re.compile(r'("(?:[^"\\]|\\.)*"|[^,\s]+)\s*(?:,\s*|$)')
+
+# The value of an expression the fallback parser can't represent
+_UNKNOWN = object()
+
+# Blocks whose attributes we keep
+_CONFIG_BLOCKS = ('backend', 'cloud', 'workspaces')
+
+
+class _Block:
+    """A block we are currently inside of."""
+
+    def __init__(self, block_type: str, label: Optional[str], depth: int):
+        self.type = block_type
+        self.label = label
+        self.depth = depth
+        self.attributes: dict[str, Any] = {}
+
+
+def _literal(expression: str) -> Any:
+    """The value of a string, bool or number literal, or _UNKNOWN"""
+
+    if _STRING.fullmatch(expression):
+        return expression[1:-1]
+    if expression in ('true', 'false'):
+        return expression == 'true'
+    if _NUMBER.fullmatch(expression):
+        return float(expression) if '.' in expression else int(expression)
+
+    return _UNKNOWN
+
+
+def _list(expression: str) -> Any:
+    """The value of a list of literals, or _UNKNOWN"""
+
+    items = []
+    rest = expression[1:-1].strip()
+
+    while rest:
+        if (match := _LIST_ITEM.match(rest)) is None or (item := _literal(match.group(1))) is _UNKNOWN:
+            return _UNKNOWN
+
+        items.append(item)
+        rest = rest[match.end():]
+
+    return items
+
+
+def _value(expression: str) -> Any:
+    """The value of a simple expression in the form hcl2 would give it, or _UNKNOWN"""
+
+    if (value := _literal(expression)) is not _UNKNOWN:
+        return value
+
+    if expression.startswith('['):
+        return _list(expression) if expression.endswith(']') else _UNKNOWN
+
+    # Anything else that is complete on one line is a reference or function call, which hcl2 gives as an expression
+    code = _STRING.sub('', expression)
+    if code.count('(') != code.count(')') or code.count('[') != code.count(']'):
+        return _UNKNOWN
+
+    return f'${{{expression}}}'
+
+
+def _is_true(expression: str) -> bool:
+    return expression.lower() in ('true', '"true"')
+
 
-def get_required_version(body: str) -> Optional[str]:
-    """Get the required_version constraint string from a tf file"""
+def scan(body: str) -> dict:
+    """Find the information we need from the body of a tf file, in one pass over its lines."""
 
-    if version := re.search(r'required_version\s*=\s*"(.+)"', body):
-        return version.group(1)
+    required_version: Optional[str] = None
+    backends: list[dict] = []
+    clouds: list[dict] = []
+    sensitive_variables: list[str] = []
 
-def get_backend_type(body: str) -> Optional[str]:
-    """Get the backend type from a tf file"""
+    # The number of braces we are inside
+    depth = 0
 
-    if backend := re.search(r'backend\s*"(.+)"', body):
-        return backend.group(1)
+    # The blocks we are interested in that we are currently inside
+    blocks: list[_Block] = []
 
-    if backend := re.search(r'backend\s+(.*)\s*{', body):
-        return backend.group(1).strip()
+    def close_brace() -> None:
+        nonlocal depth
+        depth -= 1
+        while blocks and blocks[-1].depth > depth:
+            blocks.pop()
 
-    if re.search(r'cloud\s+\{', body):
-        return 'cloud'
+    # The line that ends the heredoc or comment we are in
+    skip_until: Optional[re.Pattern] = None
 
-def get_sensitive_variables(body: str) -> list[str]:
-    """Get the sensitive variable names from a tf file"""
+    for line in body.splitlines():
+        if skip_until is not None:
+            if skip_until.search(line):
+                skip_until = None
+            continue
 
-    variables = []
+        if '{' not in line and '}' not in line and '=' not in line:
+            continue
 
-    found = False
+        if '<<' in line and (match := _HEREDOC.search(line)):
+            skip_until = re.compile(rf'^\s*{re.escape(match.group(1))}\s*$')
+            continue
 
-    for line in reversed(body.splitlines()):
-        if re.search(r'sensitive\s*=\s*true', line, re.IGNORECASE) or re.search(r'sensitive\s*=\s*"true"', line, re.IGNORECASE):
-            found = True
+        if line.lstrip().startswith('/*') and '*/' not in line:
+            skip_until = re.compile(r'\*/')
             continue
 
-        if found and (variable := re.search(r'variable\s*"(.+)"', line)):
-            variables.append(variable.group(1))
-            found = False
+        if required_version is None and 'required_version' in line and (match := _REQUIRED_VERSION.search(line)):
+            required_version = match.group(1)
 
-        if found and (variable := re.search(r'variable\s+(.+)\{', line)):
-            variables.append(variable.group(1))
-            found = False
+        current = blocks[-1] if blocks and blocks[-1].depth == depth else None
+        block_start = _BLOCK_START.match(line)
 
-    return variables
+        if current is None and block_start is None:
+            # Nothing interesting on this line, just count the braces
+            code = _STRING.sub('', line) if '"' in line else line
+            if '#' in code or '//' in code:
+                code = _COMMENT.sub('', code)
 
-def parse(path: Path) -> dict:
-    debug(f'Attempting to parse {path} with fallback parser')
-    body = path.read_text()
+            if '}' not in code:
+                depth += code.count('{')
+                continue
+
+            for brace in _BRACE.findall(code):
+                if brace == '{':
+                    depth += 1
+                elif depth > 0:
+                    close_brace()
+
+            continue
+
+        # Strings may contain braces, so blank them out before counting braces
+        code = _STRING.sub(lambda m: '"' + ' ' * (len(m.group()) - 2) + '"', line) if '"' in line else line
+        code = _COMMENT.sub('', code)
+
+        pos = 0
+
+        while True:
+            current = blocks[-1] if blocks and blocks[-1].depth == depth else None
+
+            # Blocks can be opened anywhere on a line, e.g. terraform { backend "s3" {} }
+            if match := _BLOCK_START.match(code, pos):
+                block_type = match.group(1)
+                label = line[match.start(2):match.end(2)] if match.group(2) is not None else match.group(3)
+                depth += 1
+
+                if (
+                    (block_type == 'terraform' and depth == 1) or
+                    (block_type == 'variable' and depth == 1 and label) or
+                    (block_type in ('backend', 'cloud') and current is not None and current.type == 'terraform') or
+                    (block_type == 'workspaces' and current is not None and current.type in ('backend', 'cloud'))
+                ):
+                    block = _Block(block_type, label, depth)
 
-    module = {}
+                    if block_type == 'backend' and label:
+                        backends.append({label: block.attributes})
+                    elif block_type == 'cloud':
+                        clouds.append(block.attributes)
+                    elif block_type == 'workspaces':
+                        assert current is not None
+                        current.attributes.setdefault('workspaces', []).append(block.attributes)
 
-    if constraint := get_required_version(body):
-        module['terraform'] = [{
-            'required_version': constraint
-        }]
+                    blocks.append(block)
 
-    if backend_type := get_backend_type(body):
-        if 'terraform' not in module:
-            module['terraform'] = []
+                pos = match.end()
+                continue
 
-        if backend_type == 'cloud':
-            module['terraform'].append({'cloud': [{}]})
-        else:
-            module['terraform'].append({'backend': [{backend_type:{}}]})
+            if attribute := _ATTRIBUTE.match(code, pos):
+                name = attribute.group(1)
+                expression = line[attribute.start(2):attribute.end(2)]
 
-    if sensitive_variables := get_sensitive_variables(body):
-        module['variable'] = []
-        for variable in sensitive_variables:
-            module['variable'].append({
-                variable: {
-                    'sensitive': True
-                }
-            })
+                if current is not None:
+                    if current.type == 'variable' and name == 'sensitive' and _is_true(expression) and current.label not in sensitive_variables:
+                        sensitive_variables.append(current.label)  # type: ignore[arg-type]
+                    elif current.type in _CONFIG_BLOCKS and (value := _value(expression)) is not _UNKNOWN:
+                        current.attributes[name] = value
+
+                pos = attribute.end()
+                continue
+
+            if (brace := _BRACE.search(code, pos)) is None:
+                break
+
+            if brace.group() == '{':
+                depth += 1
+            elif depth > 0:
+                close_brace()
+
+            pos = brace.end()
+
+    module: dict[str, list] = {}
+
+    if required_version is not None:
+        module['terraform'] = [{'required_version': required_version}]
+
+    if backends:
+        module.setdefault('terraform', []).append({'backend': backends[:1]})
+    elif clouds:
+        module.setdefault('terraform', []).append({'cloud': clouds})
+
+    if sensitive_variables:
+        module['variable'] = [{variable: {'sensitive': True}} for variable in sensitive_variables]
 
     return module
 
+
+def parse(path: Path) -> dict:
+    debug(f'Attempting to parse {path} with fallback parser')
+    return scan(path.read_text())
+
+
 if __name__ == '__main__':
     from pprint import pprint
     pprint(parse(Path('tests/workflows/test-validate/hard-parse/main.tf')))
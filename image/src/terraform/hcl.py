@@ -1,72 +1,384 @@
 """
 Wraps python-hcl
+
+python-hcl2 can hang forever on some inputs, so hcl is parsed in a long-lived worker process.
+If the worker takes too long to parse something it is killed, and a new worker is started for the next request.
+hcl2 is never run in this process. If the worker dies, a file is loaded with the fallback parser instead.
 """
 
+from __future__ import annotations
+
 import hcl2  # type: ignore
-import sys
-import subprocess
-import tempfile
+import multiprocessing
+import multiprocessing.connection
+import threading
+import time
+from multiprocessing.connection import Connection
 from pathlib import Path
+from typing import Any, Collection, NamedTuple, Optional, cast
 
 from github_actions.debug import debug
+import terraform.extract
 import terraform.fallback_parser
 
+PARSE_TIMEOUT = 10
+
+
+class ParseTimeout(Exception):
+    """The hcl parser took too long."""
+
+
+class ParseError(Exception):
+    """The hcl parser failed in the worker process."""
+
+
+class ParseResult(NamedTuple):
+    """The outcome of loading an hcl file."""
+
+    path: Path
+
+    # The loaded file, or None if it couldn't be loaded
+    module: Optional[dict]
+
+    # The parser that loaded the file, 'hcl2' or 'fallback'
+    parser: Optional[str]
+
+    # How long loading the file took
+    seconds: float
+
+    # If hcl2 took too long and was abandoned
+    timed_out: bool = False
+
+    # Why the file couldn't be loaded
+    error: Optional[Exception] = None
+
+
+def _read(path: Path, block_types: Optional[Collection[str]]) -> str:
+    """Read an hcl file, keeping only the given top level block types if specified."""
+
+    with open(path) as f:
+        text = f.read()
+
+    if block_types is None:
+        return text
+
+    try:
+        return terraform.extract.extract_blocks(text, block_types)
+    except ValueError as e:
+        debug(f'Failed to extract blocks from {path}, loading the whole file')
+        debug(str(e))
+        return text
+
+
+def _try_load(path: Path, block_types: Optional[Collection[str]] = None) -> tuple[dict, str]:
+    """Load an hcl file, returning the loaded file and the name of the parser used."""
 
-def try_load(path: Path) -> dict:
     try:
-        with open(path) as f:
-            return hcl2.load(f)
+        return hcl2.loads(_read(path, block_types)), 'hcl2'
     except Exception as e:
         debug(f'Failed to load {path}')
         debug(str(e))
-        return terraform.fallback_parser.parse(Path(path))
+        return terraform.fallback_parser.parse(Path(path)), 'fallback'
 
 
-def is_loadable(path: Path) -> bool:
-    try:
-        subprocess.run(
-            [sys.executable, '-m', 'terraform.hcl', path],
-            timeout=10
-        )
-    except subprocess.TimeoutExpired:
+def try_load(path: Path, block_types: Optional[Collection[str]] = None) -> dict:
+    return _try_load(path, block_types)[0]
+
+
+def try_loads(hcl: str) -> dict:
+    return hcl2.loads(hcl)
+
+
+def _serve(conn: Connection) -> None:
+    """Worker process main loop: parse each request received and send back the result."""
+
+    while True:
+        try:
+            kind, args = conn.recv()
+        except EOFError:
+            return
+
+        try:
+            if kind == 'file':
+                conn.send((True, _try_load(*args)))
+            else:
+                conn.send((True, try_loads(*args)))
+        except Exception as e:
+            conn.send((False, str(e)))
+
+
+class ParseWorker:
+    """
+    A worker process for parsing hcl files.
+
+    The worker is forked from this process where available, so it starts with hcl2 already imported.
+    Forking while other threads are running can leave the child holding a lock that is never released, so if there
+    are other threads the worker is forked from a forkserver process instead, which has hcl2 preloaded.
+    It is reused for every file until a parse takes longer than the timeout.
+    """
+
+    def __init__(self) -> None:
+        self._process: Optional[multiprocessing.process.BaseProcess] = None
+        self._conn: Optional[Connection] = None
+
+    @staticmethod
+    def _context() -> Any:
+        start_methods = multiprocessing.get_all_start_methods()
+
+        if 'fork' in start_methods and threading.active_count() == 1:
+            return multiprocessing.get_context('fork')
+
+        if 'forkserver' in start_methods:
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['terraform.hcl'])
+            return context
+
+        return multiprocessing.get_context()
+
+    def _start(self) -> Connection:
+        if self._conn is not None and self._process is not None and self._process.is_alive():
+            return self._conn
+
+        self.stop()
+
+        parent_conn, child_conn = multiprocessing.Pipe()
+        self._process = self._context().Process(target=_serve, args=(child_conn,), daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+
+        return parent_conn
+
+    def stop(self) -> None:
+        """Stop the worker process, if it is running."""
+
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+        if self._process is not None:
+            if self._process.is_alive():
+                self._process.kill()
+            self._process.join()
+            self._process = None
+
+    def start(self) -> None:
+        """Start the worker process, if it isn't already running."""
+        self._start()
+
+    def submit(self, path: Path, block_types: Optional[Collection[str]] = None) -> Connection:
+        """
+        Send a file to the worker to parse.
+
+        :param path: The file to parse
+        :param block_types: If given, only these top level block types are parsed
+        :return: The connection the result will arrive on
+        """
+
+        conn = self._start()
+        conn.send(('file', (path, block_types)))
+        return conn
+
+    def submit_text(self, hcl: str) -> Connection:
+        """
+        Send hcl text to the worker to parse.
+
+        :return: The connection the result will arrive on
+        """
+
+        conn = self._start()
+        conn.send(('text', (hcl,)))
+        return conn
+
+    def receive(self) -> Any:
+        """
+        Receive the result of the last submitted request.
+
+        :raises ParseError: If parsing failed in the worker
+        """
+
+        assert self._conn is not None
+
+        try:
+            ok, result = self._conn.recv()
+        except EOFError:
+            self.stop()
+            raise
+
+        if not ok:
+            raise ParseError(result)
+
+        return result
+
+    def _wait(self, conn: Connection, timeout: float, description: str) -> Any:
+        if not conn.poll(timeout):
+            self.stop()
+            raise ParseTimeout(f'Timed out parsing {description}')
+
+        return self.receive()
+
+    def parse(self, path: Path, timeout: float = PARSE_TIMEOUT, block_types: Optional[Collection[str]] = None) -> tuple[dict, str]:
+        """
+        Parse an hcl file in the worker process.
+
+        :param path: The file to parse
+        :param timeout: The maximum number of seconds to wait for the worker
+        :param block_types: If given, only these top level block types are parsed
+        :return: The parsed file and the name of the parser used
+        :raises ParseTimeout: If the worker didn't finish in time. The worker is killed.
+        """
+
+        return self._wait(self.submit(path, block_types), timeout, str(path))
+
+    def parse_text(self, hcl: str, timeout: float = PARSE_TIMEOUT) -> dict:
+        """
+        Parse hcl text in the worker process.
+
+        :param hcl: The hcl to parse
+        :param timeout: The maximum number of seconds to wait for the worker
+        :raises ParseTimeout: If the worker didn't finish in time. The worker is killed.
+        :raises ParseError: If the hcl couldn't be parsed
+        """
+
+        return self._wait(self.submit_text(hcl), timeout, 'hcl')
+
+
+_worker = ParseWorker()
+
+
+def _recover(path: Path, error: Exception, block_types: Optional[Collection[str]]) -> tuple[dict, str]:
+    """Handle a failure to parse a file in a worker process."""
+
+    if isinstance(error, ParseTimeout):
         debug('TimeoutExpired')
         # We found a file that won't parse :(
-        return False
-    except Exception:
-        # If we get an exception, we can still try and load it.
-        return True
+        debug(f'Unable to load {path}')
+        raise ValueError(f'Unable to load {path}')
 
-    return True
+    # The worker died. hcl2 may have been the cause, so it isn't tried again here.
+    debug(str(error))
+    debug(f'Loading {path} with the fallback parser')
+    return terraform.fallback_parser.parse(Path(path)), 'fallback'
 
 
-def load(path: Path) -> dict:
-    if is_loadable(path):
-        return try_load(path)
+def _result(path: Path, start: float, block_types: Optional[Collection[str]], loaded: Optional[tuple[dict, str]] = None, error: Optional[Exception] = None) -> ParseResult:
+    """Make the ParseResult for a file that was loaded by a worker, or failed to be."""
 
-    debug(f'Unable to load {path}')
-    raise ValueError(f'Unable to load {path}')
+    if loaded is None:
+        assert error is not None
 
+        try:
+            loaded = _recover(path, error, block_types)
+        except Exception as e:
+            return ParseResult(path, None, None, time.monotonic() - start, isinstance(error, ParseTimeout), e)
+
+    return ParseResult(path, loaded[0], loaded[1], time.monotonic() - start)
 
-def loads(hcl: str) -> dict:
-    with tempfile.NamedTemporaryFile('w', suffix='.hcl', delete=False) as f:
-        f.write(hcl)
-        tmp_path = Path(f.name)
+
+def load_file(path: Path, block_types: Optional[Collection[str]] = None) -> ParseResult:
+    """
+    Load an hcl file, recording how it was loaded.
+
+    :param path: The file to load
+    :param block_types: If given, only these top level block types are loaded
+    """
+
+    start = time.monotonic()
 
     try:
-        loadable = is_loadable(tmp_path)
+        loaded = _worker.parse(path, block_types=block_types)
+    except Exception as e:
+        return _result(path, start, block_types, error=e)
+
+    return _result(path, start, block_types, loaded=loaded)
+
+
+def load(path: Path, block_types: Optional[Collection[str]] = None) -> dict:
+    """
+    Load an hcl file.
+
+    :param path: The file to load
+    :param block_types: If given, only these top level block types are loaded
+    """
+
+    result = load_file(path, block_types)
+
+    if result.module is None:
+        assert result.error is not None
+        raise result.error
+
+    return result.module
+
+
+def load_all(paths: list[Path], workers: int, block_types: Optional[Collection[str]] = None) -> list[ParseResult]:
+    """
+    Load several hcl files concurrently.
+
+    Each file is parsed by one of a pool of worker processes, and is subject to the same timeout as load().
+
+    :param paths: The files to load
+    :param workers: The maximum number of worker processes to use
+    :param block_types: If given, only these top level block types are loaded
+    :return: The result of loading each path, in the same order as paths
+    """
+
+    if not paths:
+        return []
+
+    results: list[Optional[ParseResult]] = [None] * len(paths)
+    pool = [ParseWorker() for _ in range(max(1, min(workers, len(paths))))]
+    for worker in pool:
+        worker.start()
+
+    pending = iter(enumerate(paths))
+    idle = list(pool)
+    busy: dict[Connection, tuple[ParseWorker, int, float]] = {}
+
+    try:
+        while True:
+            while idle:
+                if (job := next(pending, None)) is None:
+                    break
+                worker = idle.pop()
+                busy[worker.submit(job[1], block_types)] = worker, job[0], time.monotonic()
+
+            if not busy:
+                break
+
+            deadline = min(start for _, _, start in busy.values()) + PARSE_TIMEOUT
+            for conn in multiprocessing.connection.wait(list(busy), timeout=max(0.0, deadline - time.monotonic())):
+                worker, index, start = busy.pop(cast(Connection, conn))
+                idle.append(worker)
+                try:
+                    results[index] = _result(paths[index], start, block_types, loaded=worker.receive())
+                except Exception as e:
+                    results[index] = _result(paths[index], start, block_types, error=e)
+
+            now = time.monotonic()
+            for conn, (worker, index, start) in list(busy.items()):
+                if start + PARSE_TIMEOUT <= now:
+                    del busy[conn]
+                    worker.stop()
+                    idle.append(worker)
+                    results[index] = _result(paths[index], start, block_types, error=ParseTimeout(f'Timed out parsing {paths[index]}'))
     finally:
-        tmp_path.unlink(missing_ok=True)
+        for worker in pool:
+            worker.stop()
 
-    if loadable:
-        try:
-            return hcl2.loads(hcl)
-        except Exception as e:
-            debug('Failed to parse hcl')
-            debug(str(e))
+    return cast(list[ParseResult], results)
 
-    debug('Unable to load hcl')
-    raise ValueError('Unable to load hcl')
 
+def loads(hcl: str) -> dict:
+    try:
+        return _worker.parse_text(hcl)
+    except ParseTimeout:
+        debug('TimeoutExpired')
+    except ParseError as e:
+        debug('Failed to parse hcl')
+        debug(str(e))
+    except Exception as e:
+        # The worker died. hcl2 may have been the cause, so it isn't tried again here.
+        debug(str(e))
 
-if __name__ == '__main__':
-    try_load(Path(sys.argv[1]))
+    debug('Unable to load hcl')
+    raise ValueError('Unable to load hcl')
@@ -0,0 +1,164 @@
+"""
+Telemetry for loading terraform modules
+
+For each file in a module we record its size, how long it took to parse, which parser was used
+and whether the hcl2 parser timed out.
+
+When STEP_TMP_DIR is set the report for every module loaded in the step is written to module_load_report.json in that
+directory. If loading a module is slow, or a file timed out, a summary is added to the GitHub step summary.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from github_actions.debug import debug
+
+if TYPE_CHECKING:
+    from terraform.hcl import ParseResult
+
+REPORT_FILENAME = 'module_load_report.json'
+
+# Seconds a module can take to load before it is mentioned in the step summary
+DEFAULT_THRESHOLD = 5.0
+
+# The most files to list in the step summary
+SUMMARY_FILES = 10
+
+
+def summary_threshold() -> float:
+    """
+    The number of seconds loading a module can take before it is included in the step summary.
+
+    This is set by the TERRAFORM_PARSE_REPORT_THRESHOLD environment variable.
+    """
+
+    try:
+        return float(os.environ.get('TERRAFORM_PARSE_REPORT_THRESHOLD', DEFAULT_THRESHOLD))
+    except ValueError:
+        debug('TERRAFORM_PARSE_REPORT_THRESHOLD should be a number')
+        return DEFAULT_THRESHOLD
+
+
+def _size(path: Path) -> int | None:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return None
+
+
+def _human_size(size: int | None) -> str:
+    if size is None:
+        return '-'
+    if size < 1024:
+        return f'{size} B'
+    if size < 1024 * 1024:
+        return f'{size / 1024:.1f} KiB'
+    return f'{size / (1024 * 1024):.1f} MiB'
+
+
+class LoadReport:
+    """How the files of a module were loaded."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.files: list[dict[str, Any]] = []
+
+        # If the module was loaded from the module cache
+        self.cached = False
+
+        self._start = time.monotonic()
+        self.seconds = 0.0
+
+    def add(self, result: ParseResult) -> None:
+        """Record the result of loading a file."""
+
+        file: dict[str, Any] = {
+            'path': str(result.path),
+            'size': _size(Path(result.path)),
+            'seconds': round(result.seconds, 4),
+            'parser': result.parser,
+            'timed_out': result.timed_out,
+        }
+
+        if result.error is not None:
+            file['error'] = str(result.error)
+
+        self.files.append(file)
+
+    @property
+    def timed_out(self) -> list[dict[str, Any]]:
+        """The files that hcl2 couldn't parse in time."""
+        return [file for file in self.files if file['timed_out']]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'path': str(self.path),
+            'cached': self.cached,
+            'seconds': round(self.seconds, 4),
+            'files': self.files
+        }
+
+    def summary(self) -> str:
+        """A markdown summary of the slowest files."""
+
+        lines = [
+            f'### Loading the terraform module in `{self.path}` took {self.seconds:.1f}s',
+            '',
+            '| File | Size | Parse time | Parser | Timed out |',
+            '|------|------|------------|--------|-----------|',
+        ]
+
+        slowest = sorted(self.files, key=lambda file: (file['timed_out'], file['seconds']), reverse=True)[:SUMMARY_FILES]
+        for file in slowest:
+            lines.append(
+                f'| `{os.path.relpath(file["path"], self.path)}` | {_human_size(file["size"])} | {file["seconds"]:.2f}s | '
+                f'{file["parser"] or "failed"} | {"yes" if file["timed_out"] else "no"} |'
+            )
+
+        if len(self.files) > SUMMARY_FILES:
+            lines.append('')
+            lines.append(f'{len(self.files) - SUMMARY_FILES} other files not shown')
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self) -> None:
+        """
+        Finish the report and write it out.
+
+        The report is added to the step's JSON report if STEP_TMP_DIR is set,
+        and summarised in GITHUB_STEP_SUMMARY if loading was slow or any file timed out.
+        """
+
+        self.seconds = time.monotonic() - self._start
+
+        if self.timed_out or self.seconds >= summary_threshold():
+            debug(f'Loading {self.path} took {self.seconds:.1f}s, {len(self.timed_out)} files timed out')
+
+            if summary_path := os.environ.get('GITHUB_STEP_SUMMARY'):
+                try:
+                    with open(summary_path, 'a') as f:
+                        f.write(self.summary())
+                except OSError as e:
+                    debug(f'Unable to write step summary: {e}')
+
+        if not (step_tmp_dir := os.environ.get('STEP_TMP_DIR')):
+            return
+
+        report_path = Path(step_tmp_dir, REPORT_FILENAME)
+
+        try:
+            report = json.loads(report_path.read_text())
+        except (OSError, ValueError):
+            report = {'modules': []}
+
+        report['modules'].append(self.to_dict())
+
+        try:
+            report_path.write_text(json.dumps(report, indent=2))
+        except OSError as e:
+            debug(f'Unable to write module load report: {e}')
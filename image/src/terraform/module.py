@@ -6,8 +6,11 @@ import os
 from typing import Any, cast, NewType, Optional, TYPE_CHECKING, TypedDict, List, Iterable
 
 import terraform.hcl
+import terraform.module_cache
 
 from github_actions.debug import debug
+from terraform.hcl import ParseResult
+from terraform.load_report import LoadReport
 from terraform.versions import Constraint
 
 if TYPE_CHECKING:
@@ -15,6 +18,9 @@ if TYPE_CHECKING:
 
 TerraformModule = NewType('TerraformModule', dict[str, list[dict[str, Any]]])
 
+# The top level blocks we need from a module, anything else is skipped when loading it
+MODULE_BLOCK_TYPES = frozenset({'terraform', 'variable', 'module'})
+
 
 class BackendConfigWorkspaces(TypedDict):
     """A workspaces block from a terraform backend config."""
@@ -51,6 +57,128 @@ def merge(a: TerraformModule, b: TerraformModule) -> TerraformModule:
 
     return merged
 
+
+class ModuleIndex(dict):
+    """
+    A terraform module, indexed for the lookups we need to make on it.
+
+    This is the same dict of block lists as any other TerraformModule.
+    As blocks are added, the ones we are interested in are also recorded in lists that can be queried directly,
+    instead of scanning every terraform and variable block for each query.
+    """
+
+    def __init__(self, module: Optional[TerraformModule] = None):
+        super().__init__()
+
+        # Each backend block, as a {type: config} dict
+        self.backends: list[dict[str, Any]] = []
+
+        # Each cloud block
+        self.clouds: list[dict[str, Any]] = []
+
+        # If any terraform block has a cloud attribute
+        self.has_cloud = False
+
+        # Each required_version constraint string
+        self.required_versions: list[str] = []
+
+        # The names of variables that are sensitive
+        self.sensitive_variables: list[str] = []
+
+        # The name and source of each module call
+        self.module_sources: list[tuple[str, str]] = []
+
+        self._version_constraints: Optional[list[Constraint]] = None
+        self._version_constraints_indexed = False
+
+        if module:
+            self.add(module)
+
+    @classmethod
+    def of(cls, module: TerraformModule) -> ModuleIndex:
+        """Return an index for the module, which may already be one."""
+
+        if isinstance(module, ModuleIndex):
+            return module
+
+        return cls(module)
+
+    def add(self, module: TerraformModule) -> None:
+        """
+        Add the blocks from another module into this one.
+
+        This has the same result as :func:`merge`, but only the added blocks are copied.
+        """
+
+        for key, value in module.items():
+            if isinstance(value, list) and isinstance(self.get(key, []), list):
+                self.setdefault(key, []).extend(value)
+            else:
+                self[key] = value
+
+        for terraform_block in module.get('terraform', []):
+            if 'required_version' in terraform_block:
+                self.required_versions.append(str(terraform_block['required_version']))
+                self._version_constraints_indexed = False
+
+            self.backends.extend(terraform_block.get('backend', []))
+
+            if 'cloud' in terraform_block:
+                self.has_cloud = True
+                self.clouds.extend(terraform_block['cloud'])
+
+        for variable in module.get('variable', []):
+            for variable_name, attributes in variable.items():
+                if attributes.get('sensitive', False):
+                    self.sensitive_variables.append(variable_name)
+
+        for module_call in module.get('module', []):
+            for module_name, attributes in module_call.items():
+                if isinstance(attributes.get('source'), str):
+                    self.module_sources.append((module_name, attributes['source']))
+
+    @property
+    def backend(self) -> tuple[str, dict[str, Any]]:
+        """The type and config of the backend used by the module."""
+
+        for backend in self.backends:
+            for backend_type, config in backend.items():
+                return backend_type, config
+
+        return 'local', {}
+
+    @property
+    def backend_type(self) -> str:
+        """The type of the backend used by the module, which is 'cloud' for a cloud block."""
+
+        for backend in self.backends:
+            for backend_type in backend:
+                return str(backend_type)
+
+        if self.has_cloud:
+            return 'cloud'
+
+        return 'local'
+
+    @property
+    def version_constraints(self) -> Optional[list[Constraint]]:
+        """The first valid required_version constraints in the module."""
+
+        if not self._version_constraints_indexed:
+            self._version_constraints = None
+
+            for required_version in self.required_versions:
+                try:
+                    self._version_constraints = [Constraint(c) for c in required_version.split(',')]
+                    break
+                except Exception:
+                    debug(f'required_version constraint is malformed: {required_version}')
+
+            self._version_constraints_indexed = True
+
+        return self._version_constraints
+
+
 def files_in_module(path: Path) -> Iterable[Path]:
 
     if os.environ.get('OPENTOFU') == 'true':
@@ -72,27 +200,70 @@ def files_in_module(path: Path) -> Iterable[Path]:
                 yield filename
 
 
-def load_module(path: Path) -> TerraformModule:
+def parse_workers() -> int:
+    """
+    The number of processes to use when parsing the files in a module.
+
+    This is set by the TERRAFORM_PARSE_WORKERS environment variable, and defaults to parsing files one at a time.
+    """
+
+    try:
+        return max(1, int(os.environ.get('TERRAFORM_PARSE_WORKERS', '1')))
+    except ValueError:
+        debug('TERRAFORM_PARSE_WORKERS should be a number')
+        return 1
+
+
+def load_module(path: Path, workers: Optional[int] = None) -> TerraformModule:
     """
     Load the terraform module.
 
     Every .tf file in the given directory is read and merged into one terraform module.
+    Only the terraform, variable and module blocks are loaded.
     If any .tf file fails to parse, it is ignored.
+
+    When JOB_TMP_DIR is set the loaded module is cached there, and reused if none of the files have changed.
+    How each file was loaded is recorded in a :class:`terraform.load_report.LoadReport`.
+
+    :param path: The module directory
+    :param workers: The number of files to parse concurrently, defaults to :func:`parse_workers`
     """
 
-    module = cast(TerraformModule, {})
+    files = sorted(files_in_module(path))
+    report = LoadReport(path)
 
-    for file in files_in_module(path):
+    if (cached := terraform.module_cache.get(path, files)) is not None:
+        debug(f'Using cached module for {path}')
+        report.cached = True
+        report.write()
+        return cast(TerraformModule, ModuleIndex(cached))
 
-        try:
-            tf_file = cast(TerraformModule, terraform.hcl.load(file))
-            module = merge(module, tf_file)
-        except Exception as e:
+    snapshot = terraform.module_cache.snapshot(files)
+    module = ModuleIndex()
+
+    if workers is None:
+        workers = parse_workers()
+
+    results: Iterable[ParseResult]
+    if workers > 1 and len(files) > 1:
+        results = terraform.hcl.load_all(files, workers, MODULE_BLOCK_TYPES)
+    else:
+        results = (terraform.hcl.load_file(file, MODULE_BLOCK_TYPES) for file in files)
+
+    for result in results:
+        report.add(result)
+
+        if result.module is None:
             # ignore tf files that don't parse
-            debug(f'Failed to parse {file}')
-            debug(str(e))
+            debug(f'Failed to parse {result.path}')
+            debug(str(result.error))
+            continue
+
+        module.add(cast(TerraformModule, result.module))
 
-    return module
+    report.write()
+    terraform.module_cache.put(path, snapshot, cast(TerraformModule, module))
+    return cast(TerraformModule, module)
 
 
 def load_backend_config_file(path: Path) -> TerraformModule:
@@ -137,16 +308,7 @@ def get_cli_credentials(path: Path, hostname: str) -> Optional[str]:
 def get_version_constraints(module: TerraformModule) -> Optional[list[Constraint]]:
     """Get the Terraform version constraint from the given module."""
 
-    for block in module.get('terraform', []):
-        if 'required_version' not in block:
-            continue
-
-        try:
-            return [Constraint(c) for c in str(block['required_version']).split(',')]
-        except Exception:
-            debug(f'required_version constraint is malformed: {str(block["required_version"])}')
-
-    return None
+    return ModuleIndex.of(module).version_constraints
 
 
 def get_remote_backend_config(
@@ -170,20 +332,19 @@ def get_remote_backend_config(
         'workspaces': {}
     })
 
-    for terraform_block in module.get('terraform', []):
-        for backend in terraform_block.get('backend', []):
-            if 'remote' not in backend:
-                return None
+    for backend in ModuleIndex.of(module).backends:
+        if 'remote' not in backend:
+            return None
 
-            found = True
-            if 'hostname' in backend['remote']:
-                backend_config['hostname'] = str(backend['remote']['hostname'])
+        found = True
+        if 'hostname' in backend['remote']:
+            backend_config['hostname'] = str(backend['remote']['hostname'])
 
-            backend_config['organization'] = backend['remote'].get('organization')
-            backend_config['token'] = backend['remote'].get('token')
+        backend_config['organization'] = backend['remote'].get('organization')
+        backend_config['token'] = backend['remote'].get('token')
 
-            if backend['remote'].get('workspaces', []):
-                backend_config['workspaces'] = backend['remote']['workspaces'][0]
+        if backend['remote'].get('workspaces', []):
+            backend_config['workspaces'] = backend['remote']['workspaces'][0]
 
     if not found:
         return None
@@ -227,23 +388,22 @@ def get_cloud_config(module: TerraformModule, cli_config_path: Path) -> Optional
         'workspaces': {}
     })
 
-    for terraform_block in module.get('terraform', []):
-        for cloud in terraform_block.get('cloud', []):
+    for cloud in ModuleIndex.of(module).clouds:
 
-            found = True
+        found = True
 
-            if 'hostname' in cloud:
-                backend_config['hostname'] = cloud['hostname']
-            elif 'TF_CLOUD_HOSTNAME' in os.environ:
-                backend_config['hostname'] = os.environ['TF_CLOUD_HOSTNAME']
+        if 'hostname' in cloud:
+            backend_config['hostname'] = cloud['hostname']
+        elif 'TF_CLOUD_HOSTNAME' in os.environ:
+            backend_config['hostname'] = os.environ['TF_CLOUD_HOSTNAME']
 
-            backend_config['organization'] = cloud.get('organization', os.environ.get('TF_CLOUD_ORGANIZATION'))
-            backend_config['token'] = cloud.get('token')
+        backend_config['organization'] = cloud.get('organization', os.environ.get('TF_CLOUD_ORGANIZATION'))
+        backend_config['token'] = cloud.get('token')
 
-            if 'workspaces' in cloud:
-                backend_config['workspaces'] = cloud['workspaces'][0]
-            elif 'INPUT_WORKSPACE' in os.environ:
-                backend_config['workspaces'] = BackendConfigWorkspaces(name=os.environ['INPUT_WORKSPACE'])
+        if 'workspaces' in cloud:
+            backend_config['workspaces'] = cloud['workspaces'][0]
+        elif 'INPUT_WORKSPACE' in os.environ:
+            backend_config['workspaces'] = BackendConfigWorkspaces(name=os.environ['INPUT_WORKSPACE'])
 
     if not found:
         return None
@@ -263,23 +423,7 @@ def get_backend_type(module: TerraformModule) -> Optional[str]:
     :return: The name of the backend used by the module
     """
 
-    for terraform_block in module.get('terraform', []):
-        for backend in terraform_block.get('backend', []):
-            for backend_type in backend:
-                return str(backend_type)
-
-    for terraform_block in module.get('terraform', []):
-        if 'cloud' in terraform_block:
-            return 'cloud'
-
-    return 'local'
+    return ModuleIndex.of(module).backend_type
 
 def get_sensitive_variables(module: TerraformModule) -> List[str]:
-    sensitive_variables = []
-
-    for variable in module.get('variable', []):
-        for variable_name, attributes in variable.items():
-            if attributes.get('sensitive', False):
-                sensitive_variables.append(variable_name)
-
-    return sensitive_variables
+    return list(ModuleIndex.of(module).sensitive_variables)
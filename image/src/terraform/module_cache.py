@@ -0,0 +1,142 @@
+"""
+A cache of loaded terraform modules.
+
+Several tools load the same module during a job. The merged module is stored in JOB_TMP_DIR so that later tools
+only need to stat each file to know the cached module is still valid.
+
+A cache entry is keyed by the module directory and whether OpenTofu .tofu files are in use.
+Each file in the entry is recorded with its size, mtime and sha256 digest. If the size or mtime of a file has changed
+the digest is checked, so touching a file doesn't invalidate the entry.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from github_actions.cache import ActionsCache
+from github_actions.debug import debug
+
+if TYPE_CHECKING:
+    from terraform.module import TerraformModule
+
+# Bump this when the shape of the cached module changes
+CACHE_VERSION = 2
+
+# Files modified this recently may be modified again without the mtime changing
+RACY_SECONDS = 2
+
+
+def _cache() -> ActionsCache | None:
+    if 'JOB_TMP_DIR' not in os.environ:
+        return None
+
+    return ActionsCache(Path(os.environ['JOB_TMP_DIR']), 'module_cache')
+
+
+def _cache_key(path: Path) -> str:
+    mode = 'tofu' if os.environ.get('OPENTOFU') == 'true' else 'terraform'
+    digest = hashlib.sha256(f'{CACHE_VERSION}:{mode}:{os.path.abspath(path)}'.encode()).hexdigest()
+    return f'module-cache/{digest}.json'
+
+
+def _digest(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _file_record(path: Path) -> dict[str, Any]:
+    stat = os.stat(path)
+    record = {'sha256': _digest(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    if stat.st_mtime_ns > time.time_ns() - RACY_SECONDS * 1_000_000_000:
+        # Force the digest to be checked next time
+        record['mtime_ns'] = None
+
+    return record
+
+
+def _is_fresh(path: Path, record: dict[str, Any]) -> bool:
+    try:
+        stat = os.stat(path)
+        if stat.st_size == record['size'] and stat.st_mtime_ns == record['mtime_ns']:
+            return True
+
+        return _digest(path) == record['sha256']
+    except OSError:
+        return False
+
+
+def get(path: Path, files: list[Path]) -> TerraformModule | None:
+    """
+    Get the cached module for a directory, if it is still valid.
+
+    :param path: The module directory
+    :param files: The files that make up the module
+    """
+
+    cache = _cache()
+    if cache is None:
+        return None
+
+    key = _cache_key(path)
+    if key not in cache:
+        return None
+
+    try:
+        entry = json.loads(cache[key])
+    except (IndexError, OSError, ValueError) as e:
+        debug(f'Failed to read cached module for {path}')
+        debug(str(e))
+        return None
+
+    if set(entry['files']) != {str(file) for file in files}:
+        debug(f'Files in module {path} have changed')
+        return None
+
+    for file in files:
+        if not _is_fresh(file, entry['files'][str(file)]):
+            debug(f'{file} has changed')
+            return None
+
+    return entry['module']
+
+
+def snapshot(files: list[Path]) -> dict[str, Any] | None:
+    """
+    Record the current state of the files in a module.
+
+    This should be taken before the files are loaded.
+    """
+
+    if _cache() is None:
+        return None
+
+    try:
+        return {str(file): _file_record(file) for file in files}
+    except OSError as e:
+        debug(str(e))
+        return None
+
+
+def put(path: Path, files: dict[str, Any] | None, module: TerraformModule) -> None:
+    """
+    Store a loaded module in the cache.
+
+    :param path: The module directory
+    :param files: The snapshot of the module files taken before they were loaded
+    :param module: The loaded module
+    """
+
+    cache = _cache()
+    if cache is None or files is None:
+        return
+
+    try:
+        cache[_cache_key(path)] = json.dumps({'files': files, 'module': module})
+    except (OSError, TypeError, ValueError) as e:
+        debug(f'Failed to cache module {path}')
+        debug(str(e))
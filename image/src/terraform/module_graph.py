@@ -0,0 +1,114 @@
+"""
+Load a terraform module along with the local modules it calls.
+
+Modules called with a local path source (starting with ./ or ../) are followed, and their calls followed in turn.
+Each distinct module directory is only loaded once, no matter how many modules call it.
+"""
+
+from __future__ import annotations
+
+import os
+from collections.abc import Callable
+from pathlib import Path
+
+from github_actions.debug import debug
+from terraform.module import ModuleIndex, TerraformModule, load_module
+from terraform.versions import Constraint
+
+LOCAL_SOURCE_PREFIXES = ('./', '../', '.\\', '..\\')
+
+
+def is_local_source(source: str) -> bool:
+    """Is a module source a local path."""
+    return source.startswith(LOCAL_SOURCE_PREFIXES)
+
+
+class ModuleGraph:
+    """
+    A root module and all the local modules it calls, directly or indirectly.
+
+    Modules are identified by their resolved directory path.
+    """
+
+    def __init__(self, root: Path, loader: Callable[[Path], TerraformModule] = load_module):
+        self.root_path = root.resolve()
+
+        # Every module in the graph, in the order they were discovered
+        self.modules: dict[Path, ModuleIndex] = {}
+
+        # The modules called by each module
+        self.edges: dict[Path, list[Path]] = {}
+
+        # How many times a module was needed that had already been loaded
+        self.loads_saved = 0
+
+        self._loader = loader
+        self._load()
+
+    @property
+    def root(self) -> ModuleIndex:
+        """The root module."""
+        return self.modules[self.root_path]
+
+    def _load(self) -> None:
+        pending = [self.root_path]
+        seen = {self.root_path}
+
+        while pending:
+            path = pending.pop()
+
+            module = ModuleIndex.of(self._loader(path))
+            self.modules[path] = module
+            self.edges[path] = []
+
+            for name, source in module.module_sources:
+                if not is_local_source(source):
+                    continue
+
+                child = Path(os.path.normpath(Path(path, source.replace('\\', '/'))))
+                if not child.is_dir():
+                    debug(f'Module {name} in {path} has source {source}, which is not a directory')
+                    continue
+
+                child = child.resolve()
+                self.edges[path].append(child)
+
+                if child in seen:
+                    self.loads_saved += 1
+                else:
+                    seen.add(child)
+                    pending.append(child)
+
+    @property
+    def loads(self) -> int:
+        """The number of modules that were loaded."""
+        return len(self.modules)
+
+    def children(self, path: Path) -> list[Path]:
+        """The local modules called by the module at path."""
+        return self.edges[path.resolve()]
+
+    @property
+    def version_constraints(self) -> list[Constraint] | None:
+        """
+        The required_version constraints of every module in the graph.
+
+        Returns None if no module has a required_version constraint.
+        """
+
+        constraints: list[Constraint] | None = None
+
+        for path, module in self.modules.items():
+            if (module_constraints := module.version_constraints) is not None:
+                debug(f'{path} has required_version constraints {module_constraints}')
+                constraints = (constraints or []) + module_constraints
+
+        return constraints
+
+
+def load_module_graph(path: Path) -> ModuleGraph:
+    """Load the module at path, and all the local modules it uses."""
+
+    graph = ModuleGraph(path)
+    debug(f'Loaded {graph.loads} modules from {path}, {graph.loads_saved} repeat loads avoided')
+    return graph
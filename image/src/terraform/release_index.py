@@ -0,0 +1,170 @@
+"""
+A cache of the available releases of a product
+
+Fetching the list of releases is a network round trip in every step that needs to choose a version.
+The list is cached in the writable bin cache dir (the last directory in TERRAFORM_BIN_CACHE_DIR) so it can be shared
+by every step in a job, and by every job if the cache dir is.
+
+- A cached index younger than TERRAFORM_RELEASE_INDEX_TTL seconds (default 3600) is used without any request.
+- An older index is revalidated with If-None-Match/If-Modified-Since, so an unchanged list isn't downloaded again.
+- If the releases site is slow or unavailable, an index of any age is used instead.
+- When TERRAFORM_RELEASE_INDEX_OFFLINE is 'true' no request is made at all, and the cached index must exist.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, Protocol
+
+import requests
+
+from github_actions.debug import debug
+
+DEFAULT_TTL = 3600
+
+# Seconds to wait for the releases site before using the cached index
+DEFAULT_TIMEOUT = 10
+
+
+class Session(Protocol):
+    """Makes the requests for a release index, e.g. a requests.Session"""
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response: ...
+
+
+class ReleaseIndexUnavailable(Exception):
+    """The list of releases couldn't be fetched, and there is no cached copy"""
+
+
+def _env_seconds(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        debug(f'{name} should be a number')
+        return default
+
+
+def offline() -> bool:
+    """Should releases only be found from the cached index"""
+    return os.environ.get('TERRAFORM_RELEASE_INDEX_OFFLINE', 'false').lower() == 'true'
+
+
+def cache_dir() -> Path | None:
+    """The directory to keep release indexes in, or None if there is no bin cache dir."""
+
+    if cache_dirs := os.environ.get('TERRAFORM_BIN_CACHE_DIR'):
+        return Path(cache_dirs.split(':')[-1], 'release-index')
+
+    return None
+
+
+class ReleaseIndex:
+    """
+    The cached list of releases available at a url.
+
+    :param name: The name of the index, e.g. 'terraform'
+    :param url: The url of the release list
+    :param parse: Returns the version strings found in the response body
+    :param directory: Where the index is cached. If None the index is not cached.
+    """
+
+    def __init__(self, name: str, url: str, parse: Callable[[bytes], list[str]], directory: Path | None):
+        self.name = name
+        self.url = url
+        self._parse = parse
+        self.path = Path(directory, f'{name}.json') if directory is not None else None
+
+    def _read(self) -> dict[str, Any] | None:
+        if self.path is None:
+            return None
+
+        try:
+            index = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(index, dict) or index.get('url') != self.url or not isinstance(index.get('versions'), list):
+            return None
+
+        return index
+
+    def _write(self, index: dict[str, Any]) -> None:
+        if self.path is None:
+            return
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+            # Other jobs may be reading the index, so replace it in one step
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f'.{self.name}.')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            debug(f'Unable to write {self.name} release index: {e}')
+
+    def _versions(self, session: Session, response: requests.Response, timeout: float) -> list[str]:
+        """The versions in a successful response to the release list url"""
+        return self._parse(response.content)
+
+    def _fetch(self, session: Session, cached: dict[str, Any] | None, timeout: float) -> dict[str, Any]:
+        headers = {}
+        if cached is not None:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        response = session.get(self.url, headers=headers, timeout=timeout)
+
+        if response.status_code == 304 and cached is not None:
+            debug(f'{self.name} release index has not changed')
+            return dict(cached, fetched_at=time.time())
+
+        response.raise_for_status()
+
+        return {
+            'url': self.url,
+            'fetched_at': time.time(),
+            'etag': response.headers.get('etag'),
+            'last_modified': response.headers.get('last-modified'),
+            'versions': self._versions(session, response, timeout)
+        }
+
+    def versions(self, session: Session) -> list[str]:
+        """
+        The available release versions.
+
+        :raises ReleaseIndexUnavailable: If the releases couldn't be fetched and aren't cached
+        """
+
+        cached = self._read()
+
+        if offline():
+            if cached is None:
+                raise ReleaseIndexUnavailable(f'TERRAFORM_RELEASE_INDEX_OFFLINE is set, but there is no cached {self.name} release index')
+            debug(f'Using cached {self.name} release index, in offline mode')
+            return cached['versions']
+
+        if cached is not None:
+            age = time.time() - cached.get('fetched_at', 0)
+            if 0 <= age < _env_seconds('TERRAFORM_RELEASE_INDEX_TTL', DEFAULT_TTL):
+                debug(f'Using cached {self.name} release index from {int(age)}s ago')
+                return cached['versions']
+
+        try:
+            index = self._fetch(session, cached, _env_seconds('TERRAFORM_RELEASE_INDEX_TIMEOUT', DEFAULT_TIMEOUT))
+        except requests.RequestException as e:
+            if cached is None:
+                raise ReleaseIndexUnavailable(f'Unable to get the {self.name} release index: {e}') from e
+
+            debug(f'Unable to get the {self.name} release index, using the cached index: {e}')
+            return cached['versions']
+
+        self._write(index)
+        return index['versions']
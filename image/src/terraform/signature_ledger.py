@@ -0,0 +1,201 @@
+"""
+A record of checksum files whose signatures have been verified
+
+Verifying the signature of a SHA256SUMS file runs gpg, which is slow compared with everything else needed to
+find a cached executable. Once a signature has been verified, an entry is added to a ledger so later verifications
+of the same files are a set lookup.
+
+An entry is an HMAC of the sha256 digests of the signature file and the checksums file, and the fingerprint of
+the signer. If either file changes its digest changes, so there is no entry for it and gpg is run again. Entries
+can't be forged without the key, so the ledger can't be used to skip verification of a file that was never verified.
+
+The ledger is kept in TERRAFORM_SIGNATURE_LEDGER_DIR, or JOB_TMP_DIR if that isn't set. The key is created in the
+same directory, only readable by its owner, unless TERRAFORM_SIGNATURE_LEDGER_KEY is set to the path of a key file
+kept somewhere else. Without either directory the key is random for each process, and the ledger is only kept
+in memory.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import os
+import secrets
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+
+from github_actions.debug import debug
+
+KEY_FILENAME = 'signature-ledger.key'
+LEDGER_FILENAME = 'signature-ledger'
+
+KEY_SIZE = 32
+
+# The key used when there is nowhere to keep one
+_memory_key = secrets.token_bytes(KEY_SIZE)
+
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def ledger_dir() -> Path | None:
+    """The directory to keep the key and ledger in, or None if they are only kept in memory."""
+
+    if directory := os.environ.get('TERRAFORM_SIGNATURE_LEDGER_DIR', os.environ.get('JOB_TMP_DIR')):
+        return Path(directory)
+
+    return None
+
+
+def key_path(directory: Path) -> Path:
+    """The path of the key for the ledger in directory."""
+
+    if path := os.environ.get('TERRAFORM_SIGNATURE_LEDGER_KEY'):
+        return Path(path)
+
+    return Path(directory, KEY_FILENAME)
+
+
+def _load_key(path: Path) -> bytes:
+    """Read a key, creating it if it doesn't exist."""
+
+    try:
+        key = path.read_bytes()
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(secrets.token_bytes(KEY_SIZE))
+
+            # Fails if another process created the key first
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(tmp_path)
+
+        key = path.read_bytes()
+
+    if len(key) != KEY_SIZE:
+        raise ValueError(f'{path} is not a valid key')
+
+    return key
+
+
+class SignatureLedger:
+    """
+    Verified signatures of checksum files.
+
+    :param key: The HMAC key for ledger entries
+    :param path: The file the ledger is kept in. If None the ledger is only kept in memory.
+    """
+
+    def __init__(self, key: bytes, path: Path | None):
+        self._key = key
+        self.path = path
+        self._entries: set[str] | None = None
+
+    @classmethod
+    def from_env(cls) -> SignatureLedger:
+        """The ledger in TERRAFORM_SIGNATURE_LEDGER_DIR or JOB_TMP_DIR."""
+
+        if (directory := ledger_dir()) is not None:
+            try:
+                directory.mkdir(parents=True, exist_ok=True)
+                return cls(_load_key(key_path(directory)), Path(directory, LEDGER_FILENAME))
+            except (OSError, ValueError) as e:
+                debug(f'Unable to use signature ledger in {directory}: {e}')
+
+        return cls(_memory_key, None)
+
+    def mac(self, message: str) -> str:
+        """An HMAC of a message with the ledger key, which can't be made without the key."""
+        return hmac.new(self._key, message.encode(), hashlib.sha256).hexdigest()
+
+    def _entry(self, signature_sha256: str, checksums_sha256: str, signer: str) -> str:
+        return self.mac(f'{signature_sha256}:{checksums_sha256}:{signer}')
+
+    @property
+    def entries(self) -> set[str]:
+        if self._entries is None:
+            self._entries = set()
+
+            if self.path is not None:
+                try:
+                    self._entries.update(self.path.read_text().split())
+                except OSError:
+                    pass
+
+        return self._entries
+
+    def is_verified(self, signature_sha256: str, checksums_sha256: str, signer: str) -> bool:
+        """Has a signature of checksums by signer been verified."""
+
+        return self._entry(signature_sha256, checksums_sha256, signer) in self.entries
+
+    def record(self, signature_sha256: str, checksums_sha256: str, signer: str) -> None:
+        """Record that a signature of checksums by signer has been verified."""
+
+        entry = self._entry(signature_sha256, checksums_sha256, signer)
+        self.entries.add(entry)
+
+        if self.path is None:
+            return
+
+        try:
+            # Each entry is one short line, so concurrent appends don't interleave
+            with open(self.path, 'a') as f:
+                f.write(entry + '\n')
+        except OSError as e:
+            debug(f'Unable to write signature ledger: {e}')
+
+
+_ledgers: dict[Path | None, SignatureLedger] = {}
+_ledgers_lock = threading.Lock()
+
+
+def default_ledger() -> SignatureLedger:
+    """The ledger for the current environment, which is only loaded once."""
+
+    directory = ledger_dir()
+    with _ledgers_lock:
+        if directory not in _ledgers:
+            _ledgers[directory] = SignatureLedger.from_env()
+        return _ledgers[directory]
+
+
+def verify_signature(signature_path: Path, checksums_path: Path, signer: str, ledger: SignatureLedger | None = None) -> None:
+    """
+    Verify the signature of a checksums file, unless it has already been verified.
+
+    :param signature_path: The detached signature
+    :param checksums_path: The signed checksums file
+    :param signer: The fingerprint of the key that must have made the signature
+    :param ledger: The ledger of verified signatures. Defaults to :func:`default_ledger`.
+    :raises subprocess.CalledProcessError: If the signature is not valid
+    """
+
+    if ledger is None:
+        ledger = default_ledger()
+
+    signature_sha256 = _sha256(signature_path)
+    checksums_sha256 = _sha256(checksums_path)
+
+    if ledger.is_verified(signature_sha256, checksums_sha256, signer):
+        debug(f'Signature of {checksums_path.name} has already been verified')
+        return
+
+    subprocess.run(
+        ['gpg', '--assert-signer', signer, '--verify', signature_path, checksums_path],
+        check=True,
+        env={'GNUPGHOME': '/root/.gnupg'} | os.environ
+    )
+
+    # Don't record the files if they were changed while gpg was running
+    if _sha256(signature_path) == signature_sha256 and _sha256(checksums_path) == checksums_sha256:
+        ledger.record(signature_sha256, checksums_sha256, signer)
@@ -3,36 +3,72 @@
 from __future__ import annotations
 
 import re
+from collections.abc import Iterable, Iterator, Sequence
 from functools import total_ordering
-from typing import Any, cast, Iterable, Literal, Optional
+from operator import attrgetter
+from typing import Any, ClassVar, Literal, Self, cast, overload
 
 import requests
 
+from terraform.constraint_set import ConstraintSet
+from terraform.release_index import ReleaseIndex
+from terraform.release_index import cache_dir as release_index_dir
+
 session = requests.Session()
 
 ConstraintOperator = Literal['=', '!=', '>', '>=', '<', '<=', '~>']
 
 
-@total_ordering
+_VERSION = re.compile(r'(?P<major>\d+)\.(?P<minor>\d+)\.(?P<patch>\d+)(?:-(?P<pre_release>[\d\w-]+))?')
+_CONSTRAINT_OPERATOR = re.compile(r'([=!<>~]*)(.*)')
+_CONSTRAINT_VERSION = re.compile(r'v?(?P<major>\d+)(?:\.(?P<minor>\d+))?(?:\.(?P<patch>\d+))?(?:-(?P<pre_release>.*))?')
+
+
 class Version:
     """
     A Terraform version.
 
     Versions are made up of major, minor & patch numbers, plus an optional pre_release string.
+
+    Versions are immutable, and each distinct version string is only parsed once.
+    Creating a Version that has already been created returns the same object.
     """
 
-    def __init__(self, version: str, product: str = 'Terraform'):
-        self.product = product
+    __slots__ = ('_hash', '_key', 'major', 'minor', 'patch', 'pre_release', 'product')
+
+    _interned: ClassVar[dict[tuple[str, str], Version]] = {}
 
-        match = re.match(r'(?P<major>\d+)\.(?P<minor>\d+)\.(?P<patch>\d+)(?:-(?P<pre_release>[\d\w-]+))?', version)
+    product: str
+    major: int
+    minor: int
+    patch: int
+    pre_release: str
+
+    def __new__(cls, version: str, product: str = 'Terraform') -> Self:
+        if (interned := cls._interned.get((version, product))) is not None:
+            return interned
+
+        match = _VERSION.match(version)
         if not match:
             raise ValueError(f'Not a valid version {version}')
 
+        self = super().__new__(cls)
+        self.product = product
         self.major = int(match.group(1))
         self.minor = int(match.group(2))
         self.patch = int(match.group(3))
         self.pre_release = match.group(4) or ''
 
+        # A release sorts after all the pre-releases of the same version
+        self._key = (self.major, self.minor, self.patch, 0 if self.pre_release else 1, self.pre_release)
+        self._hash = hash(repr(self))
+
+        cls._interned[(version, product)] = self
+        return self
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return Version, (repr(self), self.product)
+
     def __repr__(self) -> str:
         s = f'{self.major}.{self.minor}.{self.patch}'
 
@@ -42,51 +78,84 @@ class Version:
         return s
 
     def __hash__(self) -> int:
-        return hash(self.__repr__())
+        return self._hash
 
     def __eq__(self, other: Any) -> bool:
         if not isinstance(other, Version):
             return NotImplemented
 
-        return self.major == other.major and self.minor == other.minor and self.patch == other.patch and self.pre_release == other.pre_release
+        return self._key == other._key
 
     def __lt__(self, other: Any) -> bool:
-        if not isinstance(other, Version):
+        try:
+            return self._key < other._key
+        except AttributeError:
             return NotImplemented
 
-        if self.major != other.major:
-            return self.major < other.major
-        if self.minor != other.minor:
-            return self.minor < other.minor
-        if self.patch != other.patch:
-            return self.patch < other.patch
-        if self.pre_release != other.pre_release:
-            if self.pre_release == '':
-                return False
-            if other.pre_release == '':
-                return True
-            return self.pre_release < other.pre_release
+    def __le__(self, other: Any) -> bool:
+        try:
+            return self._key <= other._key
+        except AttributeError:
+            return NotImplemented
 
-        return False
+    def __gt__(self, other: Any) -> bool:
+        try:
+            return self._key > other._key
+        except AttributeError:
+            return NotImplemented
+
+    def __ge__(self, other: Any) -> bool:
+        try:
+            return self._key >= other._key
+        except AttributeError:
+            return NotImplemented
 
 
+@total_ordering
 class Constraint:
-    """A Terraform version constraint."""
+    """
+    A Terraform version constraint.
+
+    Constraints are immutable, and each distinct constraint string is only parsed once.
+    """
+
+    __slots__ = ('_hash', 'major', 'minor', 'operator', 'patch', 'pre_release')
 
-    def __init__(self, constraint: str):
-        if match := re.match(r'([=!<>~]*)(.*)', constraint.replace(' ', '')):
+    _interned: ClassVar[dict[str, Constraint]] = {}
+
+    operator: ConstraintOperator
+    major: int
+    minor: int | None
+    patch: int | None
+    pre_release: str
+
+    def __new__(cls, constraint: str) -> Self:
+        if (interned := cls._interned.get(constraint)) is not None:
+            return interned
+
+        self = super().__new__(cls)
+
+        if match := _CONSTRAINT_OPERATOR.match(constraint.replace(' ', '')):
             self.operator = cast(ConstraintOperator, match.group(1) or '=')
-            constraint = match.group(2)
+            version = match.group(2)
         else:
             raise ValueError(f'Invalid version constraint {constraint}')
 
-        if match := re.match(r'v?(?P<major>\d+)(?:\.(?P<minor>\d+))?(?:\.(?P<patch>\d+))?(?:-(?P<pre_release>.*))?', constraint):
+        if match := _CONSTRAINT_VERSION.match(version):
             self.major = int(match.group('major'))
             self.minor = int(match.group('minor')) if match.group('minor') else None
             self.patch = int(match.group('patch')) if match.group('patch') else None
             self.pre_release = match.group('pre_release') or ''
         else:
-            raise ValueError(f'Invalid version constraint {constraint}')
+            raise ValueError(f'Invalid version constraint {version}')
+
+        self._hash = hash(repr(self))
+
+        cls._interned[constraint] = self
+        return self
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return Constraint, (repr(self),)
 
     def __repr__(self) -> str:
         s = f'{self.operator}{self.major}'
@@ -103,7 +172,7 @@ class Constraint:
         return s
 
     def __hash__(self) -> int:
-        return hash(self.__repr__())
+        return self._hash
 
     def __eq__(self, other: Any) -> bool:
         if not isinstance(other, Constraint):
@@ -184,41 +253,199 @@ class Constraint:
             # ~> x.x.x
             return version.major == self.major and version.minor == self.minor and version.patch >= self.patch
 
-def latest_non_prerelease_version(versions: Iterable[Version]) -> Optional[Version]:
+# Sort by this rather than comparing Versions, so the comparisons don't call back into python
+_sort_key = attrgetter('_key')
+
+
+PRODUCTS = {
+    'terraform': 'Terraform',
+    'opentofu': 'OpenTofu',
+    'tofu': 'OpenTofu',
+}
+
+
+def parse_version_spec(spec: str) -> tuple[str, ConstraintSet]:
+    """
+    Parse a set of versions of a product.
+
+    :param spec: A version or comma separated version constraints, optionally prefixed with the product,
+                 e.g. '1.5.7', '~>1.6.0' or 'opentofu:>=1.7.0,<1.8.0'
+    :return: The product and the versions it allows
+    :raises ValueError: If the spec is not valid
+    """
+
+    product = 'Terraform'
+
+    if ':' in spec:
+        prefix, spec = spec.split(':', 1)
+        if prefix.strip().lower() not in PRODUCTS:
+            raise ValueError(f'Unknown product {prefix}')
+        product = PRODUCTS[prefix.strip().lower()]
+
+    return product, ConstraintSet(Constraint(constraint) for constraint in spec.split(','))
+
+
+class VersionCatalog(Sequence[Version]):
+    """
+    The available versions, sorted once.
+
+    Iterating or indexing a catalog gives the versions in ascending order. Each version is only present once.
+    Release and pre-release versions are also kept separately, so the latest and earliest of either are found in constant time.
+
+    :param versions: The versions in the catalog
+    """
+
+    def __init__(self, versions: Iterable[Version] = ()):
+        # The first of any equal versions is kept
+        unique: dict[Version, Version] = {}
+        for version in versions:
+            unique.setdefault(version, version)
+
+        self._set_versions(sorted(unique, key=_sort_key))
+
+    def _set_versions(self, versions: list[Version]) -> None:
+        self._versions = versions
+        self.releases = [v for v in versions if not v.pre_release]
+        self.pre_releases = [v for v in versions if v.pre_release]
+        self._by_string = {str(v): v for v in versions}
+        self._regex_matches: dict[str, Version | None] = {}
+
+    @classmethod
+    def _sorted(cls, versions: list[Version]) -> VersionCatalog:
+        """A catalog of versions that are already sorted and unique."""
+
+        catalog = cls.__new__(cls)
+        catalog._set_versions(versions)
+        return catalog
+
+    @classmethod
+    def of(cls, versions: Iterable[Version]) -> VersionCatalog:
+        """The versions as a VersionCatalog, which may be versions itself."""
+
+        if isinstance(versions, VersionCatalog):
+            return versions
+
+        return cls(versions)
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+    @overload
+    def __getitem__(self, index: int) -> Version: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Sequence[Version]: ...
+
+    def __getitem__(self, index: int | slice) -> Version | Sequence[Version]:
+        return self._versions[index]
+
+    def __iter__(self) -> Iterator[Version]:
+        return iter(self._versions)
+
+    def __contains__(self, version: object) -> bool:
+        return isinstance(version, Version) and self._by_string.get(str(version)) == version
+
+    def __repr__(self) -> str:
+        return f'VersionCatalog({self._versions!r})'
+
+    def latest(self, include_pre_releases: bool = False) -> Version | None:
+        """The latest release version, or the latest version of any kind if include_pre_releases is True."""
+
+        versions = self._versions if include_pre_releases else self.releases
+        return versions[-1] if versions else None
+
+    def earliest(self, include_pre_releases: bool = False) -> Version | None:
+        """The earliest release version, or the earliest version of any kind if include_pre_releases is True."""
+
+        versions = self._versions if include_pre_releases else self.releases
+        return versions[0] if versions else None
+
+    def exact(self, version: str) -> Version | None:
+        """The version in the catalog with exactly this string representation."""
+
+        return self._by_string.get(version)
+
+    def pinned(self, version: str) -> Version | None:
+        """
+        The version for an exact version string.
+
+        This is the same as exact(), but a catalog that hasn't fetched the available versions yet may answer without doing so.
+        """
+
+        return self.exact(version)
+
+    def latest_matching(self, regex: str) -> Version | None:
+        """
+        The latest version of any kind that matches the regex.
+
+        Versions are searched from the latest, so this usually stops after a few versions.
+        The result for each regex is remembered.
+        """
+
+        if regex not in self._regex_matches:
+            pattern = re.compile(regex)
+            self._regex_matches[regex] = next((v for v in reversed(self._versions) if pattern.search(str(v))), None)
+
+        return self._regex_matches[regex]
+
+    def select(self, constraints: ConstraintSet | Iterable[Constraint]) -> VersionCatalog:
+        """A catalog of the versions allowed by the constraints."""
+
+        if not isinstance(constraints, ConstraintSet):
+            constraints = ConstraintSet(constraints)
+
+        return VersionCatalog._sorted(constraints.select(self._versions))
+
+
+def latest_non_prerelease_version(versions: Iterable[Version]) -> Version | None:
     """Return the latest non prerelease version of the given versions."""
 
-    for v in sorted(versions, reverse=True):
-        if not v.pre_release:
-            return v
+    if isinstance(versions, VersionCatalog):
+        return versions.latest()
+
+    return max((v for v in versions if not v.pre_release), key=_sort_key, default=None)
 
 def latest_version(versions: Iterable[Version]) -> Version:
     """Return the latest version of the given versions."""
 
-    return sorted(versions, reverse=True)[0]
+    if isinstance(versions, VersionCatalog) and (latest := versions.latest(include_pre_releases=True)) is not None:
+        return latest
+
+    return max(versions, key=_sort_key)
 
-def earliest_non_prerelease_version(versions: Iterable[Version]) -> Optional[Version]:
+def earliest_non_prerelease_version(versions: Iterable[Version]) -> Version | None:
     """Return the earliest non prerelease version of the given versions."""
 
-    for v in sorted(versions):
-        if not v.pre_release:
-            return v
+    if isinstance(versions, VersionCatalog):
+        return versions.earliest()
+
+    return min((v for v in versions if not v.pre_release), key=_sort_key, default=None)
 
 def earliest_version(versions: Iterable[Version]) -> Version:
     """Return the earliest version of the given versions."""
 
-    return sorted(versions)[0]
+    if isinstance(versions, VersionCatalog) and (earliest := versions.earliest(include_pre_releases=True)) is not None:
+        return earliest
+
+    return min(versions, key=_sort_key)
+
+
+def _parse_terraform_releases(content: bytes) -> list[str]:
+    version_regex = re.compile(br'/(\d+\.\d+\.\d+(-[\d\w-]+)?)')
+    return [version.group(1).decode() for version in version_regex.finditer(content)]
 
 
 def get_terraform_versions() -> Iterable[Version]:
-    """Return the currently available terraform versions."""
+    """
+    Return the currently available terraform versions.
 
-    response = session.get('https://releases.hashicorp.com/terraform/')
-    response.raise_for_status()
+    The list of releases is cached, see :mod:`terraform.release_index`.
+    """
 
-    version_regex = re.compile(br'/(\d+\.\d+\.\d+(-[\d\w-]+)?)')
+    index = ReleaseIndex('terraform', 'https://releases.hashicorp.com/terraform/', _parse_terraform_releases, release_index_dir())
 
-    for version in version_regex.finditer(response.content):
-        yield Version(version.group(1).decode())
+    for version in index.versions(session):
+        yield Version(version)
 
 
 def apply_constraints(versions: Iterable[Version], constraints: Iterable[Constraint]) -> Iterable[Version]:
@@ -228,6 +455,8 @@ def apply_constraints(versions: Iterable[Version], constraints: Iterable[Constra
     Returns the terraform versions that are allowed by all the given constraints
     """
 
+    allowed = ConstraintSet(constraints)
+
     for version in versions:
-        if all(constraint.is_allowed(version) for constraint in constraints):
+        if allowed.is_allowed(version):
             yield version
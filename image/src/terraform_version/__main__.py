@@ -11,10 +11,15 @@ from typing import Optional, cast
 from github_actions.debug import debug
 from github_actions.env import ActionsEnv, GithubEnv
 from github_actions.inputs import InitInputs
-from terraform.download import get_executable, get_arch, DownloadError
-from terraform.module import load_module, get_backend_type
-from terraform.versions import apply_constraints, get_terraform_versions, Version, Constraint, latest_non_prerelease_version
+from terraform.constraint_set import ConstraintSet
+from terraform.download import get_executable, get_arch, DownloadError, VersionNotFound
+from terraform.module import get_backend_type, TerraformModule
+from terraform.module_graph import load_module_graph, ModuleGraph
+from terraform.versions import Version, VersionCatalog, Constraint
+from terraform_version import prewarm
 from terraform_version.asdf import try_read_asdf
+from terraform_version.available_versions import LazyVersionCatalog, ReleaseDiscoveryError
+from terraform_version.decision_cache import cache_dir, cacheable, decision_key, DecisionCache, LOCAL_STATE_FILENAME, write_key
 from terraform_version.env import try_read_env
 from terraform_version.local_state import try_read_local_state
 from terraform_version.remote_state import get_backend_constraints, read_backend_config_vars, try_guess_state_version
@@ -23,81 +28,190 @@ from terraform_version.required_version import try_get_required_version
 from terraform_version.tfenv import try_read_tfenv
 from terraform_version.tfswitch import try_read_tfswitch
 from opentofu.download import get_executable as get_opentofu_executable
-from opentofu.versions import get_opentofu_versions
 
 
-def determine_version(inputs: InitInputs, cli_config_path: Path, actions_env: ActionsEnv, github_env: GithubEnv) -> Version:
-    """Determine the terraform version to use"""
+def determine_version(inputs: InitInputs, cli_config_path: Path, actions_env: ActionsEnv, github_env: GithubEnv, check_available: bool = False) -> Version:
+    """
+    Determine the terraform version to use
 
-    versions = list(get_terraform_versions())
+    The available versions are only fetched if a version source needs them, e.g. for a version constraint.
+    The decision is cached, see :mod:`terraform_version.decision_cache`.
 
-    if 'OPENTOFU' in os.environ:
-        versions = list(apply_constraints(versions, [Constraint('<1.6.0')]))
-        versions.extend(get_opentofu_versions())
+    :param check_available: Fetch the available versions first, so a pinned version is only chosen if it exists.
+        Cached decisions are not used.
+    """
+
+    versions = LazyVersionCatalog(opentofu='OPENTOFU' in os.environ)
+    trace: list[str] = []
+    cache = DecisionCache(cache_dir())
+
+    try:
+        if check_available:
+            versions.fetch()
+
+        # A key output by an earlier step means the module doesn't need to be loaded,
+        # unless a local state file may have been written since
+        key = os.environ.get('TERRAFORM_VERSION_CACHE_KEY', '')
+        if key and Path(inputs.get('INPUT_PATH', '.'), LOCAL_STATE_FILENAME).is_file():
+            key = ''
+        version = cache.get(key) if key and not check_available else None
+
+        if version is None:
+            module_graph = load_module_graph(Path(inputs.get('INPUT_PATH', '.')))
+            key = decision_key(inputs, actions_env, github_env, module_graph)
+            version = cache.get(key) if not check_available else None
+
+        if version is not None:
+            trace.append('cached decision')
+            sys.stdout.write(f'Using {version.product} version {version!r} decided by an earlier step\n')
+            write_key(key)
+            return version
+
+        version = resolve_version(inputs, cli_config_path, actions_env, github_env, module_graph, versions, trace)
+
+        # A version chosen without the available versions may not be the one that would normally be chosen
+        if version is not None and not versions.fetch_failed and cacheable(module_graph):
+            if versions.fetched:
+                # The release index snapshot may have changed
+                key = decision_key(inputs, actions_env, github_env, module_graph)
+
+            cache.put(key, version, trace[-1])
+            write_key(key)
+
+        return version
+    finally:
+        debug(f'Version sources checked: {" -> ".join(trace)}')
+        debug(f'The available versions were {"" if versions.fetched else "not "}fetched')
+
+
+def resolve_version(
+    inputs: InitInputs,
+    cli_config_path: Path,
+    actions_env: ActionsEnv,
+    github_env: GithubEnv,
+    module_graph: ModuleGraph,
+    versions: VersionCatalog,
+    trace: list[str]
+) -> Version:
+    """
+    Try each source of a version in turn
+
+    :param module_graph: The module and the local modules it calls
+    :param versions: The available versions
+    :param trace: The name of each source is appended as it is checked
+    """
 
-    module = load_module(Path(inputs.get('INPUT_PATH', '.')))
+    module = cast(TerraformModule, module_graph.root)
 
     version: Optional[Version]
 
+    trace.append('remote workspace')
     if version := try_get_remote_workspace_version(inputs, module, cli_config_path, versions):
         sys.stdout.write(f'Using remote workspace terraform version, which is set to {version!r}\n')
         return version
 
-    if version := try_get_required_version(module, versions):
+    trace.append('required_version')
+    if version := try_get_required_version(module_graph, versions):
         sys.stdout.write(f'Using latest {version.product} version that matches the required_version constraints\n')
         return version
 
+    trace.append('.tfswitchrc')
     if version := try_read_tfswitch(inputs):
         sys.stdout.write(f'Using {version.product} version specified in .tfswitchrc file\n')
         return version
 
     if 'OPENTOFU' in os.environ:
+        trace.append('.opentofu-version')
         if version := try_read_tfenv('.opentofu-version', inputs, versions):
             sys.stdout.write(f'Using {version.product} version specified in .opentofu-version file\n')
             return version
 
+    trace.append('.terraform-version')
     if version := try_read_tfenv('.terraform-version', inputs, versions):
         sys.stdout.write(f'Using {version.product} version specified in .terraform-version file\n')
         return version
 
+    trace.append('.tool-versions')
     if version := try_read_asdf(inputs, github_env.get('GITHUB_WORKSPACE', '/'), versions):
         sys.stdout.write(f'Using {version.product} version specified in .tool-versions file\n')
         return version
 
+    trace.append('environment')
     if version := try_read_env(actions_env, versions):
         env_var = 'OPENTOFU_VERSION' if 'OPENTOFU_VERSION' in os.environ else 'TERRAFORM_VERSION'
         sys.stdout.write(f'Using latest {version.product} version that matches the {env_var} constraints\n')
         return version
 
+    # Constraints on the version that can be used with the backend, applied to versions together
+    trace.append('backend')
+    allowed = ConstraintSet()
+
     if inputs.get('INPUT_BACKEND_CONFIG', '').strip():
         # key=value form of backend config was introduced in 0.9.1
-        versions = list(apply_constraints(versions, [Constraint('>=0.9.1')]))
+        allowed &= [Constraint('>=0.9.1')]
 
     try:
         backend_config = read_backend_config_vars(inputs)
-        versions = list(apply_constraints(versions, get_backend_constraints(module, backend_config)))
+        allowed &= get_backend_constraints(module, backend_config)
         backend_type = get_backend_type(module)
     except Exception as e:
         debug('Failed to get backend config')
         debug(str(e))
-        return latest_non_prerelease_version(versions)
+        return versions.select(allowed).latest()
 
     if backend_type == 'local':
+        trace.append('local state')
         if version := try_read_local_state(Path(inputs.get('INPUT_PATH', '.'))):
             sys.stdout.write(f'Using the same {version.product} version that wrote the existing local terraform.tfstate\n')
             return version
 
     if get_arch() == 'arm64':
         # arm64 support was introduced in 0.13.5
-        versions = list(apply_constraints(versions, [Constraint('>=0.13.5')]))
+        allowed &= [Constraint('>=0.13.5')]
+
+    if (latest := versions.latest()) is not None and (constraint := allowed.explain(latest)) is not None:
+        debug(f'Version {latest} is not allowed by the backend constraint {constraint}')
+
+    versions = versions.select(allowed)
 
     if backend_type not in ['remote', 'cloud', 'local']:
+        trace.append('remote state')
         if version := try_guess_state_version(inputs, module, versions):
             sys.stdout.write(f'Using the same {version.product} version that wrote the existing remote state file\n')
             return version
 
+    trace.append('latest')
     sys.stdout.write('Version not specified, using the latest release version\n')
-    return latest_non_prerelease_version(versions)
+    return versions.latest()
+
+
+def choose_version(check_available: bool) -> Version:
+    """
+    Choose the version to use in this environment, exiting if there isn't one.
+
+    :param check_available: Fetch the available versions first, see :func:`determine_version`
+    """
+
+    version = determine_version(
+        cast(InitInputs, os.environ),
+        Path('~/.terraformrc'),
+        cast(ActionsEnv, os.environ),
+        cast(GithubEnv, os.environ),
+        check_available
+    )
+
+    if version is None:
+        if 'OPENTOFU' in os.environ:
+            sys.stderr.write('No release version of OpenTofu found. Try specifying a pre-release version, e.g. OPENTOFU_VERSION=1.6.0-alpha3\n')
+        else:
+            sys.stderr.write('No eligible versions found\n')
+        sys.exit(1)
+
+    if 'OPENTOFU' in os.environ and version.product == 'Terraform':
+        sys.stdout.write('OpenTofu is preferred, but only a version of Terraform matched the version constraints.\n')
+        sys.stdout.write('Try specifying a version of OpenTofu. Pre-release versions must be explicit, e.g. OPENTOFU_VERSION=1.6.0-alpha3\n')
+
+    return version
 
 
 def switch(version: Version) -> None:
@@ -132,33 +246,27 @@ def main() -> None:
     """Entrypoint for terraform-version."""
 
     try:
-        if len(sys.argv) > 1:
+        if len(sys.argv) > 1 and sys.argv[1] == '--prewarm':
+            prewarm.main(sys.argv[2:])
+
+        elif len(sys.argv) > 1:
             switch(Version(sys.argv[1]))
 
         else:
-            version = determine_version(
-                cast(InitInputs, os.environ),
-                Path('~/.terraformrc'),
-                cast(ActionsEnv, os.environ),
-                cast(GithubEnv, os.environ)
-            )
-
-            if version is None:
-                if 'OPENTOFU' in os.environ:
-                    sys.stderr.write('No release version of OpenTofu found. Try specifying a pre-release version, e.g. OPENTOFU_VERSION=1.6.0-alpha3\n')
-                else:
-                    sys.stderr.write('No eligible versions found\n')
-                sys.exit(1)
-
-            if 'OPENTOFU' in os.environ and version.product == 'Terraform':
-                sys.stdout.write('OpenTofu is preferred, but only a version of Terraform matched the version constraints.\n')
-                sys.stdout.write('Try specifying a version of OpenTofu. Pre-release versions must be explicit, e.g. OPENTOFU_VERSION=1.6.0-alpha3\n')
-
-            switch(version)
+            try:
+                switch(choose_version(check_available=False))
+            except VersionNotFound as not_found:
+                # A pinned version is chosen without checking it exists
+                debug(str(not_found))
+                sys.stdout.write('Unable to download the chosen version, checking the available versions\n')
+                switch(choose_version(check_available=True))
 
     except DownloadError as download_error:
         sys.stderr.write(str(download_error))
         sys.exit(1)
+    except ReleaseDiscoveryError as discovery_error:
+        sys.stderr.write(f'{discovery_error}\n')
+        sys.exit(1)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -8,7 +8,8 @@ from typing import Iterable, Optional
 
 from github_actions.debug import debug
 from github_actions.inputs import InitInputs
-from terraform.versions import Version, latest_non_prerelease_version
+from terraform.versions import Version, VersionCatalog
+from terraform_version.available_versions import ReleaseDiscoveryError
 
 
 def parse_asdf(tool_versions: str, versions: Iterable[Version]) -> Version:
@@ -17,7 +18,7 @@ def parse_asdf(tool_versions: str, versions: Iterable[Version]) -> Version:
     for line in tool_versions.splitlines():
         if match := re.match(r'^\s*terraform\s+([^\s#]+)', line.strip()):
             if match.group(1) == 'latest':
-                return latest_non_prerelease_version(v for v in versions if not v.pre_release)
+                return VersionCatalog.of(versions).latest()
             return Version(match.group(1))
 
     raise Exception('No version for terraform found in .tool-versions')
@@ -35,6 +36,8 @@ def try_read_asdf(inputs: InitInputs, workspace_path: str, versions: Iterable[Ve
             try:
                 with open(asdf_path) as f:
                     return parse_asdf(f.read(), versions)
+            except ReleaseDiscoveryError:
+                raise
             except Exception as e:
                 debug(str(e))
 
@@ -0,0 +1,178 @@
+"""Find the versions of Terraform and OpenTofu that are available."""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, wait
+from typing import Any
+
+from github_actions.debug import debug
+from opentofu.versions import get_opentofu_versions
+from terraform.versions import Constraint, Version, VersionCatalog, get_terraform_versions
+
+DEFAULT_TIMEOUT = 120
+
+# The first OpenTofu version. Terraform versions from here on are not included when using OpenTofu.
+OPENTOFU_FIRST_RELEASE = (1, 6, 0)
+
+
+class ReleaseDiscoveryError(Exception):
+    """The available versions couldn't be found"""
+
+
+class ReleaseDiscoveryTimeout(ReleaseDiscoveryError):
+    """The available versions couldn't be found in time"""
+
+
+def discovery_timeout() -> float:
+    """
+    The number of seconds to wait for all the release lists.
+
+    This is set by the TERRAFORM_RELEASE_DISCOVERY_TIMEOUT environment variable.
+    """
+
+    try:
+        return float(os.environ.get('TERRAFORM_RELEASE_DISCOVERY_TIMEOUT', DEFAULT_TIMEOUT))
+    except ValueError:
+        debug('TERRAFORM_RELEASE_DISCOVERY_TIMEOUT should be a number')
+        return DEFAULT_TIMEOUT
+
+
+def _fetch_in_background(name: str, source: Callable[[], list[Version]]) -> Future[list[Version]]:
+    """
+    Run a source in a daemon thread.
+
+    A source that is still running when the deadline passes is abandoned. It runs in a daemon thread so it doesn't
+    stop the process from exiting.
+    """
+
+    future: Future[list[Version]] = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+
+        try:
+            future.set_result(source())
+        except BaseException as e:  # noqa: BLE001 - the exception is raised again by future.result()
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=f'{name} release list', daemon=True).start()
+    return future
+
+
+def get_available_versions(opentofu: bool) -> VersionCatalog:
+    """
+    The versions that can be used.
+
+    When opentofu is True, the Terraform and OpenTofu release lists are fetched concurrently, and must both be fetched
+    before a shared deadline. Only Terraform versions before 1.6.0 are included, as OpenTofu versions start there.
+
+    :param opentofu: If OpenTofu versions should be included
+    :raises ReleaseDiscoveryTimeout: If the release lists weren't fetched in time
+    """
+
+    timeout = discovery_timeout()
+
+    sources: dict[str, Callable[[], list[Version]]] = {
+        'Terraform': lambda: list(get_terraform_versions())
+    }
+
+    if opentofu:
+        sources['OpenTofu'] = lambda: list(get_opentofu_versions())
+
+    start = time.monotonic()
+
+    futures = {name: _fetch_in_background(name, source) for name, source in sources.items()}
+    _, not_done = wait(futures.values(), timeout=timeout)
+
+    if not_done:
+        pending = [name for name, future in futures.items() if future in not_done]
+        raise ReleaseDiscoveryTimeout(f'Timed out after {timeout}s waiting for the {" and ".join(pending)} release list')
+
+    debug(f'Found available versions in {time.monotonic() - start:.2f}s')
+
+    terraform_versions = VersionCatalog(futures['Terraform'].result())
+
+    if not opentofu:
+        return terraform_versions
+
+    return VersionCatalog([*terraform_versions.select([Constraint('<{}.{}.{}'.format(*OPENTOFU_FIRST_RELEASE))]), *futures['OpenTofu'].result()])
+
+
+class LazyVersionCatalog(VersionCatalog):
+    """
+    The available versions, which are only fetched when first needed.
+
+    An exact version can be found without fetching the available versions. The product is decided the same way
+    get_available_versions() would: when using OpenTofu, any version from 1.6.0 is an OpenTofu version.
+
+    If fetching fails, a ReleaseDiscoveryError is raised by that use and every later use of the catalog.
+
+    :param opentofu: If OpenTofu versions should be included
+    """
+
+    # Attributes that aren't set until the versions are fetched
+    _FETCHED_ATTRIBUTES = frozenset({'_versions', 'releases', 'pre_releases', '_by_string', '_regex_matches'})
+
+    def __init__(self, opentofu: bool):
+        self._opentofu = opentofu
+        self.fetched = False
+
+        # Why fetching failed, so it isn't attempted again by every source
+        self._error: ReleaseDiscoveryError | None = None
+
+    def __getattr__(self, name: str) -> Any:
+        if name not in self._FETCHED_ATTRIBUTES or self.fetched:
+            raise AttributeError(name)
+
+        self.fetch()
+        return getattr(self, name)
+
+    def fetch(self) -> None:
+        """
+        Fetch the available versions, if they haven't been already.
+
+        After fetching, pinned versions are only found if they are available.
+        """
+
+        if self.fetched:
+            return
+
+        if self._error is not None:
+            raise self._error
+
+        debug('Fetching the available versions')
+
+        try:
+            self._set_versions(list(VersionCatalog.of(get_available_versions(self._opentofu))))
+        except ReleaseDiscoveryError as e:
+            self._error = e
+            raise
+        except Exception as e:
+            self._error = ReleaseDiscoveryError(f'Unable to find the available versions: {e}')
+            raise self._error from e
+
+        self.fetched = True
+
+    def __repr__(self) -> str:
+        return super().__repr__() if self.fetched else 'LazyVersionCatalog(<not fetched>)'
+
+    @property
+    def fetch_failed(self) -> bool:
+        """If fetching the available versions was attempted and failed"""
+        return self._error is not None
+
+    def pinned(self, version: str) -> Version | None:
+        if self.fetched:
+            return super().pinned(version)
+
+        pinned = Version(version)
+        if self._opentofu and (pinned.major, pinned.minor, pinned.patch) >= OPENTOFU_FIRST_RELEASE:
+            pinned = Version(version, 'OpenTofu')
+
+        debug(f'Using {pinned.product} {pinned} without fetching the available versions')
+        return pinned
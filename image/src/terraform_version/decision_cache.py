@@ -0,0 +1,261 @@
+"""
+A cache of the version decided for a module
+
+Deciding which version to use can mean loading every module in the graph, fetching the available versions and
+making requests to the backend. The decision is cached, keyed by a digest of everything it depends on:
+- The absolute path of the root module, and the required_version, backend and cloud blocks of each module in the graph
+- Any local terraform.tfstate file in the root module
+- The .tfswitchrc, .opentofu-version, .terraform-version and .tool-versions files
+- The TERRAFORM_VERSION and OPENTOFU_VERSION environment variables
+- The backend_config, backend_config_file and workspace inputs
+- A snapshot of the cached terraform (and when using OpenTofu, opentofu) release index, so a decision made before a
+  new release isn't used after it
+
+The cache is kept in TERRAFORM_VERSION_CACHE_DIR, or the version-cache directory in JOB_TMP_DIR, which is shared by
+every step in a job. It can be shared with other jobs using actions/cache.
+
+The key is written to STEP_TMP_DIR so the version action can output it. If TERRAFORM_VERSION_CACHE_KEY is set to
+the key, the cached decision is used without loading the module at all, unless the module has a local state file.
+
+Decisions taken from a state file, or for a module with a remote or cloud backend, depend on more than the key, so
+they are never cached. The version set in a remote workspace can change at any time, and if it couldn't be read
+another source would have been used.
+
+Changing TERRAFORM_VERSION_CACHE_GENERATION invalidates every cached decision.
+Setting TERRAFORM_VERSION_CACHE to 'false' disables the cache.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, cast
+
+from github_actions.debug import debug
+from github_actions.env import ActionsEnv, GithubEnv
+from github_actions.inputs import InitInputs
+from terraform.download import get_arch
+from terraform.module import TerraformModule, get_backend_type
+from terraform.module_graph import ModuleGraph
+from terraform.release_index import cache_dir as release_index_dir
+from terraform.versions import Version
+
+KEY_FILENAME = 'version_cache_key'
+
+# The state file read by the local state source
+LOCAL_STATE_FILENAME = 'terraform.tfstate'
+
+# Version files read from the module directory
+VERSION_FILES = ('.tfswitchrc', '.opentofu-version', '.terraform-version')
+
+# Decisions from these sources are not cached
+UNCACHEABLE_SOURCES = frozenset({'remote workspace', 'local state', 'remote state'})
+
+# Decisions for modules using these backends are not cached, as the version may be set in the remote workspace
+UNCACHEABLE_BACKENDS = frozenset({'remote', 'cloud'})
+
+
+def enabled() -> bool:
+    """Should version decisions be cached"""
+    return os.environ.get('TERRAFORM_VERSION_CACHE', 'true').lower() != 'false'
+
+
+def cache_dir() -> Path | None:
+    """The directory to keep version decisions in, or None if the cache is not used."""
+
+    if not enabled():
+        return None
+
+    if directory := os.environ.get('TERRAFORM_VERSION_CACHE_DIR'):
+        return Path(directory)
+
+    if job_tmp_dir := os.environ.get('JOB_TMP_DIR'):
+        return Path(job_tmp_dir, 'version-cache')
+
+    return None
+
+
+def _file_digest(path: Path) -> str | None:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def catalogue_snapshot() -> str | None:
+    """
+    A digest of the cached release indexes.
+
+    The terraform release index is always included, and the opentofu index when using OpenTofu.
+    This changes when a new release is found. It doesn't make a request, so is None if no index is cached.
+    """
+
+    if (directory := release_index_dir()) is None:
+        return None
+
+    names = ['terraform', 'opentofu'] if 'OPENTOFU' in os.environ else ['terraform']
+
+    snapshot = {}
+    for name in names:
+        try:
+            snapshot[name] = json.loads(Path(directory, f'{name}.json').read_text())['versions']
+        except (OSError, ValueError, KeyError, TypeError):
+            snapshot[name] = None
+
+    if all(versions is None for versions in snapshot.values()):
+        return None
+
+    return hashlib.sha256(json.dumps(snapshot, sort_keys=True).encode()).hexdigest()
+
+
+def cacheable(module_graph: ModuleGraph) -> bool:
+    """Can the version decided for a module be cached"""
+
+    if (backend_type := get_backend_type(cast(TerraformModule, module_graph.root))) in UNCACHEABLE_BACKENDS:
+        debug(f'Not caching the version for a module using the {backend_type} backend')
+        return False
+
+    return True
+
+
+def _version_files(inputs: InitInputs, github_env: GithubEnv) -> dict[str, str | None]:
+    """The digest of each version file that could be read, by path"""
+
+    module_path = os.path.abspath(inputs.get('INPUT_PATH', '.'))
+    files = {name: _file_digest(Path(module_path, name)) for name in VERSION_FILES}
+
+    # .tool-versions is found in the module path or any parent up to the workspace, the same as try_read_asdf
+    workspace_path = github_env.get('GITHUB_WORKSPACE', '/')
+    path = module_path
+    while path != '/':
+        files[os.path.join(os.path.relpath(path, module_path), '.tool-versions')] = _file_digest(Path(path, '.tool-versions'))
+        if path == workspace_path:
+            break
+        path = os.path.dirname(path)
+
+    return files
+
+
+def decision_key(inputs: InitInputs, actions_env: ActionsEnv, github_env: GithubEnv, module_graph: ModuleGraph) -> str:
+    """
+    The cache key for the version decided for a module.
+
+    :param module_graph: The module and the local modules it calls
+    """
+
+    modules = {}
+    for path, module in module_graph.modules.items():
+        modules[os.path.relpath(path, module_graph.root_path)] = {
+            'required_version': module.required_versions,
+            'backend': module.backends,
+            'cloud': module.clouds if module.has_cloud else None,
+        }
+
+    backend_config_files = {
+        path: _file_digest(Path(path))
+        for path in inputs.get('INPUT_BACKEND_CONFIG_FILE', '').replace(',', '\n').splitlines()
+    }
+
+    key_material = {
+        'generation': os.environ.get('TERRAFORM_VERSION_CACHE_GENERATION', ''),
+        'opentofu': 'OPENTOFU' in os.environ,
+        'arch': get_arch(),
+        'root': os.path.abspath(module_graph.root_path),
+        'modules': modules,
+        'local_state': _file_digest(Path(module_graph.root_path, LOCAL_STATE_FILENAME)),
+        'version_files': _version_files(inputs, github_env),
+        'env': {
+            'TERRAFORM_VERSION': actions_env.get('TERRAFORM_VERSION'),
+            'OPENTOFU_VERSION': actions_env.get('OPENTOFU_VERSION'),
+        },
+        'backend_config': inputs.get('INPUT_BACKEND_CONFIG', ''),
+        'backend_config_file': backend_config_files,
+        'workspace': inputs.get('INPUT_WORKSPACE', 'default'),
+        'catalogue': catalogue_snapshot(),
+    }
+
+    return hashlib.sha256(json.dumps(key_material, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def write_key(key: str) -> None:
+    """Make the key available to the version action, which outputs it."""
+
+    if not (step_tmp_dir := os.environ.get('STEP_TMP_DIR')):
+        return
+
+    try:
+        Path(step_tmp_dir, KEY_FILENAME).write_text(key)
+    except OSError as e:
+        debug(f'Unable to write version cache key: {e}')
+
+
+class DecisionCache:
+    """
+    Version decisions, stored by key.
+
+    :param directory: Where decisions are stored. If None nothing is stored.
+    """
+
+    def __init__(self, directory: Path | None):
+        self.directory = directory
+
+    def _path(self, key: str) -> Path | None:
+        if self.directory is None or not key.isalnum():
+            return None
+
+        return Path(self.directory, f'{key}.json')
+
+    def get(self, key: str) -> Version | None:
+        """The version decided for a key, if there is one."""
+
+        if (path := self._path(key)) is None:
+            return None
+
+        try:
+            decision: dict[str, Any] = json.loads(path.read_text())
+            if decision.get('key') != key or decision.get('product') not in ('Terraform', 'OpenTofu'):
+                return None
+
+            version = Version(decision['version'], decision['product'])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+        debug(f'Found cached decision for {key}: {version.product} {version}, from {decision.get("source")}')
+        return version
+
+    def put(self, key: str, version: Version, source: str) -> None:
+        """
+        Store the version decided for a key.
+
+        :param source: The name of the source the version was found from
+        """
+
+        if (path := self._path(key)) is None:
+            return
+
+        if source in UNCACHEABLE_SOURCES:
+            debug(f'Not caching a version found from the {source}')
+            return
+
+        decision = {
+            'key': key,
+            'product': version.product,
+            'version': str(version),
+            'source': source,
+            'created_at': time.time(),
+        }
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+            # Other steps may be reading the decision, so replace it in one step
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{key}.')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(decision, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            debug(f'Unable to cache version decision: {e}')
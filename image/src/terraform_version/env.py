@@ -5,7 +5,9 @@ from typing import Iterable, Optional
 
 from github_actions.debug import debug
 from github_actions.env import ActionsEnv
-from terraform.versions import Version, Constraint, apply_constraints, latest_version
+from terraform.constraint_set import ConstraintSet
+from terraform.versions import Version, Constraint, VersionCatalog
+from terraform_version.available_versions import ReleaseDiscoveryError
 
 
 def try_read_env(actions_env: ActionsEnv, versions: Iterable[Version]) -> Optional[Version]:
@@ -17,12 +19,20 @@ def try_read_env(actions_env: ActionsEnv, versions: Iterable[Version]) -> Option
         return None
 
     try:
-        valid_versions = list(apply_constraints(versions, [Constraint(c) for c in constraint.split(',')]))
+        allowed = ConstraintSet(Constraint(c) for c in constraint.split(','))
+        catalog = VersionCatalog.of(versions)
+
+        if (pinned := allowed.pinned()) is not None and (version := catalog.pinned(pinned)) is not None:
+            return version
+
+        valid_versions = catalog.select(allowed)
         if not valid_versions:
             sys.stdout.write(f'The constraint {constraint} does not match any available versions\n')
             return None
-        return latest_version(valid_versions)
+        return valid_versions.latest(include_pre_releases=True)
 
+    except ReleaseDiscoveryError:
+        raise
     except Exception as exception:
         debug(str(exception))
 
@@ -1,23 +1,107 @@
+"""
+Fetch and verify the checksums of every Terraform and OpenTofu release
+
+This is used when building the image, so that checksums don't need to be fetched by the actions.
+Releases are fetched by a pool of TERRAFORM_CHECKSUM_WORKERS threads (default 8), sharing the pooled session used
+for downloads. Files that are already in TERRAFORM_BIN_CHECKSUM_DIR are not downloaded again, and signatures that
+are already in the signature ledger are not verified again.
+"""
+
+from __future__ import annotations
+
 import os
 import sys
+import time
+from concurrent.futures import as_completed, ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable
 
+from github_actions.debug import debug
 from opentofu.versions import get_opentofu_versions
 from opentofu.download import get_checksums as get_opentofu_checksums
 from terraform.download import get_checksums
-from terraform.versions import get_terraform_versions
+from terraform.versions import get_terraform_versions, Version
+
+DEFAULT_WORKERS = 8
+
+
+def checksum_workers() -> int:
+    """
+    The number of releases to fetch checksums for at once.
+
+    This is set by the TERRAFORM_CHECKSUM_WORKERS environment variable.
+    """
+
+    try:
+        return max(1, int(os.environ.get('TERRAFORM_CHECKSUM_WORKERS', DEFAULT_WORKERS)))
+    except ValueError:
+        debug('TERRAFORM_CHECKSUM_WORKERS should be a number')
+        return DEFAULT_WORKERS
+
+
+def _dir_sizes(path: Path) -> dict[str, int]:
+    try:
+        return {entry.name: entry.stat().st_size for entry in os.scandir(path) if entry.is_file()}
+    except OSError:
+        return {}
+
+
+def prefetch(releases: list[tuple[Version, Callable[[Version, Path], Path]]], checksum_dir: Path, workers: int) -> list[tuple[Version, Exception]]:
+    """
+    Get the verified checksums for each release.
+
+    :param releases: Each version, with the function that gets its checksums
+    :param checksum_dir: The directory to keep checksums in
+    :param workers: The number of releases to fetch at once
+    :return: The releases that failed, with the reason
+    """
+
+    existing = _dir_sizes(checksum_dir)
+    failures: list[tuple[Version, Exception]] = []
+    start = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(get, version, checksum_dir): version for version, get in releases}
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            version = futures[future]
+
+            try:
+                future.result()
+                sys.stdout.write(f'[{done}/{len(futures)}] Got checksums for {version.product} {version}\n')
+            except Exception as e:
+                failures.append((version, e))
+                sys.stdout.write(f'[{done}/{len(futures)}] Failed to get checksums for {version.product} {version}: {e}\n')
+
+    seconds = time.monotonic() - start
+
+    downloaded = {name: size for name, size in _dir_sizes(checksum_dir).items() if name not in existing}
+    size = sum(downloaded.values())
+
+    sys.stdout.write(
+        f'Verified checksums for {len(releases) - len(failures)} of {len(releases)} releases in {seconds:.1f}s using {workers} workers\n'
+        f'Downloaded {len(downloaded)} files ({size / 1024:.0f} KiB, {size / 1024 / max(seconds, 0.001):.0f} KiB/s), '
+        f'{len(existing)} files were already present\n'
+    )
+
+    return failures
 
 
 def main() -> None:
 
     checksum_dir = Path(os.environ.get('TERRAFORM_BIN_CHECKSUM_DIR', '.terraform-bin-dir'))
 
+    releases: list[tuple[Version, Callable[[Version, Path], Path]]] = []
+
     for version in get_terraform_versions():
         if version.pre_release:
             continue
-        sys.stdout.write(f'Getting checksums for Terraform {version}\n')
-        get_checksums(version, checksum_dir)
+        releases.append((version, get_checksums))
 
     for version in get_opentofu_versions():
-        sys.stdout.write(f'Getting checksums for OpenTofu {version}\n')
-        get_opentofu_checksums(version, checksum_dir)
+        releases.append((version, get_opentofu_checksums))
+
+    if failures := prefetch(releases, checksum_dir, checksum_workers()):
+        for version, error in failures:
+            sys.stderr.write(f'Could not get checksums for {version.product} {version}: {error}\n')
+        sys.exit(1)
@@ -0,0 +1,136 @@
+"""
+Fill the bin cache with a set of versions
+
+This is used by `terraform-version --prewarm`, so an image can be built with the versions it is expected to use.
+Each argument is a version or a comma separated list of version constraints, optionally prefixed with the product,
+e.g. `1.5.7`, `~>1.6.0`, `opentofu:>=1.7.0,<1.8.0`.
+
+The executable for each matching version is downloaded, verified and extracted into the last directory in
+TERRAFORM_BIN_CACHE_DIR, using a pool of TERRAFORM_PREWARM_WORKERS threads (default 4). Extracted executables are
+listed in the manifest of the cache dir, see :mod:`terraform.executable_cache`.
+
+The archives are kept in the cache dir too. An executable is only used directly if its stamp was made with the same
+signature ledger key, otherwise it is extracted again from the verified archive, which still avoids downloading it.
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import time
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from zipfile import BadZipFile
+
+from github_actions.debug import debug
+from opentofu.download import get_executable as get_opentofu_executable
+from opentofu.versions import get_opentofu_versions
+from terraform.download import DownloadError, get_executable
+from terraform.versions import Version, get_terraform_versions, parse_version_spec
+
+DEFAULT_WORKERS = 4
+
+# Errors that fail a single version without stopping the others
+DOWNLOAD_ERRORS = (DownloadError, OSError, RuntimeError, ValueError, subprocess.SubprocessError, BadZipFile)
+
+
+def prewarm_workers() -> int:
+    """
+    The number of versions to get at once.
+
+    This is set by the TERRAFORM_PREWARM_WORKERS environment variable.
+    """
+
+    try:
+        return max(1, int(os.environ.get('TERRAFORM_PREWARM_WORKERS', DEFAULT_WORKERS)))
+    except ValueError:
+        debug('TERRAFORM_PREWARM_WORKERS should be a number')
+        return DEFAULT_WORKERS
+
+
+def resolve_versions(specs: Iterable[str]) -> list[Version]:
+    """
+    The versions allowed by any of the specs.
+
+    Available versions are only fetched if a spec isn't a single version.
+    """
+
+    available: dict[str, list[Version]] = {}
+
+    def available_versions(product: str) -> list[Version]:
+        if product not in available:
+            available[product] = list(get_opentofu_versions() if product == 'OpenTofu' else get_terraform_versions())
+        return available[product]
+
+    # Versions of different products compare equal, so keep them by product
+    versions: dict[tuple[str, str], Version] = {}
+
+    for spec in specs:
+        product, constraints = parse_version_spec(spec)
+
+        if (pinned := constraints.pinned()) is not None:
+            versions[(product, pinned)] = Version(pinned, product)
+            continue
+
+        matched = [version for version in constraints.apply(available_versions(product)) if version.product == product]
+        if not matched:
+            raise ValueError(f'No {product} versions match {spec}')
+        versions.update(((product, str(version)), version) for version in matched)
+
+    return sorted(versions.values(), key=lambda version: (version.product, version))
+
+
+def prewarm(versions: list[Version], workers: int) -> list[tuple[Version, Exception]]:
+    """
+    Get the executable for each version into the bin cache.
+
+    :param versions: The versions to get
+    :param workers: The number of versions to get at once
+    :return: The versions that failed, with the reason
+    """
+
+    failures: list[tuple[Version, Exception]] = []
+    start = time.monotonic()
+
+    def get(version: Version) -> None:
+        if version.product == 'OpenTofu':
+            get_opentofu_executable(version)
+        else:
+            get_executable(version)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(get, version): version for version in versions}
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            version = futures[future]
+
+            try:
+                future.result()
+                sys.stdout.write(f'[{done}/{len(futures)}] Cached {version.product} {version}\n')
+            except DOWNLOAD_ERRORS as e:
+                failures.append((version, e))
+                sys.stdout.write(f'[{done}/{len(futures)}] Failed to cache {version.product} {version}: {e}\n')
+
+    sys.stdout.write(f'Cached {len(versions) - len(failures)} of {len(versions)} versions in {time.monotonic() - start:.1f}s using {workers} workers\n')
+
+    return failures
+
+
+def main(specs: list[str]) -> None:
+    """Entrypoint for terraform-version --prewarm."""
+
+    if not specs:
+        sys.stderr.write('Usage: terraform-version --prewarm VERSIONS...\n')
+        sys.exit(1)
+
+    try:
+        versions = resolve_versions(specs)
+    except ValueError as e:
+        sys.stderr.write(f'{e}\n')
+        sys.exit(1)
+
+    if failures := prewarm(versions, prewarm_workers()):
+        for version, error in failures:
+            sys.stderr.write(f'Could not cache {version.product} {version}: {error}\n')
+        sys.exit(1)
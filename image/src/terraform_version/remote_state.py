@@ -15,8 +15,8 @@ from github_actions.debug import debug
 from github_actions.inputs import InitInputs
 from terraform.download import get_executable
 from terraform.exec import init_args
-from terraform.module import load_backend_config_file, TerraformModule
-from terraform.versions import apply_constraints, Constraint, Version, earliest_version, earliest_non_prerelease_version
+from terraform.module import load_backend_config_file, ModuleIndex, TerraformModule
+from terraform.versions import Constraint, Version, VersionCatalog
 
 
 def read_backend_config_vars(init_inputs: InitInputs) -> dict[str, str]:
@@ -41,12 +41,7 @@ def read_backend_config_vars(init_inputs: InitInputs) -> dict[str, str]:
 def backend_config(module: TerraformModule) -> Tuple[str, dict[str, Any]]:
     """Return the backend config specified in the terraform module."""
 
-    for terraform in module.get('terraform', []):
-        for backend in terraform.get('backend', []):
-            for backend_type, config in backend.items():
-                return backend_type, config
-
-    return 'local', {}
+    return ModuleIndex.of(module).backend
 
 
 def get_backend_constraints(module: TerraformModule, backend_config_vars: dict[str, str]) -> list[Constraint]:
@@ -202,18 +197,18 @@ def guess_state_version(inputs: InitInputs, module: TerraformModule, versions: I
     args = init_args(inputs)
     backend_tf = dump_backend_hcl(module)
 
-    candidate_versions = list(versions)
+    candidate_versions = VersionCatalog.of(versions)
 
     while candidate_versions:
-        result = try_init(earliest_non_prerelease_version(candidate_versions), args, inputs.get('INPUT_WORKSPACE', 'default'), backend_tf)
+        result = try_init(candidate_versions.earliest(), args, inputs.get('INPUT_WORKSPACE', 'default'), backend_tf)
         if isinstance(result, Version):
             return result
         elif isinstance(result, Constraint):
-            candidate_versions = list(apply_constraints(candidate_versions, [result]))
+            candidate_versions = candidate_versions.select([result])
         elif result is None:
             return None
         else:
-            candidate_versions = list(apply_constraints(candidate_versions, [Constraint(f'!={earliest_version(candidate_versions)}')]))
+            candidate_versions = candidate_versions.select([Constraint(f'!={candidate_versions.earliest(include_pre_releases=True)}')])
 
     return None
 
@@ -5,7 +5,8 @@ from github_actions.debug import debug
 from github_actions.inputs import InitInputs
 from terraform.cloud import get_workspace
 from terraform.module import TerraformModule, get_remote_backend_config, get_cloud_config
-from terraform.versions import Version, latest_non_prerelease_version
+from terraform.versions import Version, VersionCatalog
+from terraform_version.available_versions import ReleaseDiscoveryError
 
 
 def get_remote_workspace_version(inputs: InitInputs, module: TerraformModule, cli_config_path: Path, versions: Iterable[Version]) -> Optional[Version]:
@@ -30,7 +31,7 @@ def get_remote_workspace_version(inputs: InitInputs, module: TerraformModule, cl
     if workspace_info := get_workspace(backend_config, inputs['INPUT_WORKSPACE']):
         version = str(workspace_info['attributes']['terraform-version'])
         if version == 'latest':
-            return latest_non_prerelease_version(versions)
+            return VersionCatalog.of(versions).latest()
         else:
             return Version(version)
 
@@ -40,6 +41,8 @@ def get_remote_workspace_version(inputs: InitInputs, module: TerraformModule, cl
 def try_get_remote_workspace_version(inputs: InitInputs, module: TerraformModule, cli_config_path: Path, versions: Iterable[Version]) -> Optional[Version]:
     try:
         return get_remote_workspace_version(inputs, module, cli_config_path, versions)
+    except ReleaseDiscoveryError:
+        raise
     except Exception as exception:
         debug('Failed to get terraform version from remote workspace')
         debug(str(exception))
@@ -1,25 +1,51 @@
+from __future__ import annotations
+
 from typing import Optional, Iterable
 
 from github_actions.debug import debug
+from terraform.constraint_set import ConstraintSet
 from terraform.module import get_version_constraints, TerraformModule
-from terraform.versions import Version, apply_constraints, latest_non_prerelease_version
+from terraform.module_graph import ModuleGraph
+from terraform.versions import Version, VersionCatalog
+from terraform_version.available_versions import ReleaseDiscoveryError
+
+
+def get_required_version(module: TerraformModule | ModuleGraph, versions: Iterable[Version]) -> Optional[Version]:
+    """
+    Get the latest version allowed by the required_version constraints.
 
+    :param module: The module, or graph of modules which must all allow the version
+    :param versions: The available versions
+    """
 
-def get_required_version(module: TerraformModule, versions: Iterable[Version]) -> Optional[Version]:
-    constraints = get_version_constraints(module)
+    if isinstance(module, ModuleGraph):
+        constraints = module.version_constraints
+    else:
+        constraints = get_version_constraints(module)
     if constraints is None:
         return None
 
-    valid_versions = list(apply_constraints(versions, constraints))
+    allowed = ConstraintSet(constraints)
+    catalog = VersionCatalog.of(versions)
+
+    # Only release versions are chosen from required_version constraints
+    if (pinned := allowed.pinned()) is not None and '-' not in pinned and (version := catalog.pinned(pinned)) is not None:
+        return version
+
+    valid_versions = catalog.select(allowed)
     if not valid_versions:
+        if (latest := catalog.latest()) is not None:
+            debug(f'The latest version {latest} is not allowed by the required_version constraint {allowed.explain(latest)}')
         raise RuntimeError(f'No versions of terraform match the required_version constraints {constraints}\n')
 
-    return latest_non_prerelease_version(valid_versions)
+    return valid_versions.latest()
 
 
-def try_get_required_version(module: TerraformModule, versions: Iterable[Version]) -> Optional[Version]:
+def try_get_required_version(module: TerraformModule | ModuleGraph, versions: Iterable[Version]) -> Optional[Version]:
     try:
         return get_required_version(module, versions)
+    except ReleaseDiscoveryError:
+        raise
     except Exception:
         debug('Failed to get terraform version from required_version constraint')
 
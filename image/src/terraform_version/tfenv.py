@@ -3,12 +3,12 @@
 from __future__ import annotations
 
 import os
-import re
 from typing import Iterable, Optional
 
 from github_actions.debug import debug
 from github_actions.inputs import InitInputs
-from terraform.versions import latest_version, Version, latest_non_prerelease_version
+from terraform.versions import Version, VersionCatalog
+from terraform_version.available_versions import ReleaseDiscoveryError
 
 
 def parse_tfenv(terraform_version_file: str, versions: Iterable[Version]) -> Version:
@@ -21,25 +21,20 @@ def parse_tfenv(terraform_version_file: str, versions: Iterable[Version]) -> Ver
     """
 
     version = terraform_version_file.strip()
+    catalog = VersionCatalog.of(versions)
 
     if version == 'latest':
-        return latest_non_prerelease_version(v for v in versions if not v.pre_release)
+        return catalog.latest()
 
     if version.startswith('latest:'):
         version_regex = version.split(':', maxsplit=1)[1]
 
-        matched = [v for v in versions if re.search(version_regex, str(v))]
-
-        if not matched:
+        if (matched := catalog.latest_matching(version_regex)) is None:
             raise Exception(f'No terraform versions match regex {version_regex}')
 
-        return latest_version(matched)
-
-    for v in sorted(versions, reverse=True):
-        if str(v) == version:
-            return v
+        return matched
 
-    return Version(version)
+    return catalog.pinned(version) or Version(version)
 
 
 def try_read_tfenv(filename: str, inputs: InitInputs, versions: Iterable[Version]) -> Optional[Version]:
@@ -60,6 +55,8 @@ def try_read_tfenv(filename: str, inputs: InitInputs, versions: Iterable[Version
     try:
         with open(tfenv_path) as f:
             return parse_tfenv(f.read(), versions)
+    except ReleaseDiscoveryError:
+        raise
     except Exception as e:
         debug(str(e))
 
@@ -0,0 +1,270 @@
+"""
+Benchmark module loading and backend detection
+
+Usage:
+    PYTHONPATH=image/src python3 tests/benchmarks/module_load.py [--scenario NAME] [--save] [--tolerance RATIO] [--report-only]
+
+Synthetic modules are generated for each scenario, and the time taken by load_module, get_backend_type,
+get_sensitive_variables and get_remote_backend_config is measured. No network access is needed.
+
+Results are compared with tests/benchmarks/baseline.json. If any operation is more than RATIO times slower than
+the baseline (default 2) the script exits with a non-zero status. Use --save to replace the baseline with
+the current results.
+
+The baseline is only meaningful on the machine it was recorded on. With --report-only regressions are reported
+as warnings and the exit status is always zero, which is how the benchmark is run on shared CI runners.
+
+When GITHUB_STEP_SUMMARY is set the results are also written there as a markdown table.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from parallel_load import generate_module
+from terraform.hcl import PARSE_TIMEOUT
+from terraform.module import get_backend_type, get_remote_backend_config, get_sensitive_variables, load_module
+
+BASELINE_PATH = Path(__file__).parent / 'baseline.json'
+
+# Operations that take less than this are too noisy to compare
+MIN_SECONDS = 0.05
+
+BACKEND = '''
+terraform {
+  required_version = ">= 1.0.0"
+
+  backend "remote" {
+    organization = "benchmark"
+
+    workspaces {
+      prefix = "benchmark-"
+    }
+  }
+}
+'''
+
+CLI_CONFIG = '''
+credentials "app.terraform.io" {
+  token = "benchmark"
+}
+'''
+
+
+def generate_many_files(path: Path) -> None:
+    """Many small files"""
+
+    generate_module(path, 500)
+    Path(path, 'terraform.tf').write_text(BACKEND)
+
+
+def generate_huge_file(path: Path) -> None:
+    """One very large file"""
+
+    with open(Path(path, 'main.tf'), 'w') as f:
+        f.write(BACKEND)
+
+        for i in range(5000):
+            f.write(f'''
+variable "input_{i}" {{
+  type      = string
+  sensitive = {'true' if i % 2 else 'false'}
+}}
+
+resource "aws_s3_bucket" "bucket_{i}" {{
+  bucket = "bucket-${{var.input_{i}}}"
+
+  tags = {{
+    Name  = "bucket {i}"
+    Index = {i}
+  }}
+}}
+''')
+
+
+def generate_deep_heredocs(path: Path) -> None:
+    """Files full of long heredocs containing braces, interpolations and things that look like blocks"""
+
+    Path(path, 'terraform.tf').write_text(BACKEND)
+
+    body = ''.join(f'''
+    variable "not_a_variable_{line}" {{
+      sensitive = true
+    }}
+    echo "${{var.input}} {{{{ }}}}" # }}
+    EOT
+''' for line in range(200))
+
+    for i in range(50):
+        Path(path, f'heredoc_{i:02}.tf').write_text(f'''
+variable "script_{i}" {{
+  sensitive = true
+  default   = <<-EOF
+{body}
+  EOF
+}}
+
+resource "null_resource" "script_{i}" {{
+  provisioner "local-exec" {{
+    command = <<EOT
+{body.replace('EOT', 'EOF')}
+EOT
+  }}
+}}
+''')
+
+
+def generate_pathological(path: Path) -> None:
+    """Files that hcl2 can't parse, or can't parse in time, so the fallback parser is used"""
+
+    Path(path, 'terraform.tf').write_text(BACKEND)
+
+    # hcl2 takes longer than PARSE_TIMEOUT to parse a variable with a very large default
+    with open(Path(path, 'huge_default.tf'), 'w') as f:
+        f.write('variable "huge" {\n  sensitive = true\n  default = {\n')
+        for i in range(60000):
+            f.write(f'    key_{i} = "value_{i}"\n')
+        f.write('  }\n}\n')
+
+    # An unterminated string means the selective block extraction and hcl2 both fail
+    Path(path, 'unterminated.tf').write_text('''
+variable "broken" {
+  sensitive = true
+}
+
+resource "x" "y" {
+  name = "unterminated
+}
+''')
+
+    # Unbalanced braces
+    Path(path, 'unbalanced.tf').write_text('variable "unbalanced" {\n  sensitive = true\n}\n}\n' * 1000)
+
+
+SCENARIOS: dict[str, Callable[[Path], None]] = {
+    'many_files': generate_many_files,
+    'huge_file': generate_huge_file,
+    'deep_heredocs': generate_deep_heredocs,
+    'pathological': generate_pathological,
+}
+
+
+def measure(func: Callable[[], object], repeat: int) -> float:
+    """The fastest of repeat runs of func, in seconds"""
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_scenario(name: str, repeat: int) -> dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        module_path = Path(tmpdir, 'module')
+        module_path.mkdir()
+        SCENARIOS[name](module_path)
+
+        cli_config_path = Path(tmpdir, 'cli.tfrc')
+        cli_config_path.write_text(CLI_CONFIG)
+
+        # Pathological files wait for the parse timeout every time, so don't repeat them
+        load_repeat = 1 if name == 'pathological' else repeat
+
+        module = load_module(module_path)
+
+        results = {
+            'load_module': measure(lambda: load_module(module_path), load_repeat),
+            'get_backend_type': measure(lambda: get_backend_type(module), repeat),
+            'get_sensitive_variables': measure(lambda: get_sensitive_variables(module), repeat),
+            'get_remote_backend_config': measure(lambda: get_remote_backend_config(module, '', '', cli_config_path), repeat),
+        }
+
+        assert get_backend_type(module) == 'remote', name
+        assert get_sensitive_variables(module), name
+
+        return results
+
+
+def compare(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], tolerance: float) -> tuple[str, list[str]]:
+    """
+    Compare results with the baseline
+
+    :return: A markdown table of the results, and a description of each regression
+    """
+
+    lines = [
+        '| Scenario | Operation | Baseline | Current | Ratio |',
+        '|----------|-----------|----------|---------|-------|',
+    ]
+    regressions = []
+
+    for scenario, operations in results.items():
+        for operation, seconds in operations.items():
+            expected = baseline.get(scenario, {}).get(operation)
+
+            if expected is None:
+                lines.append(f'| {scenario} | {operation} | - | {seconds:.4f}s | - |')
+                continue
+
+            if not expected:
+                lines.append(f'| {scenario} | {operation} | {expected:.4f}s | {seconds:.4f}s | - |')
+                continue
+
+            ratio = seconds / expected
+            lines.append(f'| {scenario} | {operation} | {expected:.4f}s | {seconds:.4f}s | {ratio:.2f}x |')
+
+            if seconds > MIN_SECONDS and ratio > tolerance:
+                regressions.append(f'{scenario} {operation} took {seconds:.4f}s, {ratio:.2f}x the baseline of {expected:.4f}s')
+
+    return '\n'.join(lines) + '\n', regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark module loading and backend detection')
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), help='Only run this scenario. May be given more than once.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of times to run each operation. The fastest is used.')
+    parser.add_argument('--tolerance', type=float, default=2.0, help='How many times slower than the baseline an operation can be')
+    parser.add_argument('--save', action='store_true', help='Save the results as the new baseline')
+    parser.add_argument('--report-only', action='store_true', help='Report regressions as warnings without failing')
+    args = parser.parse_args()
+
+    # Don't let the module cache hide the parse time
+    os.environ.pop('JOB_TMP_DIR', None)
+    os.environ.pop('STEP_TMP_DIR', None)
+
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        sys.stderr.write(f'Running {name}\n')
+        results[name] = run_scenario(name, args.repeat)
+
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+
+    if args.save:
+        baseline.update({name: {operation: round(seconds, 6) for operation, seconds in operations.items()} for name, operations in results.items()})
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2) + '\n')
+
+    table, regressions = compare(results, baseline, args.tolerance)
+    sys.stdout.write(table)
+
+    if summary_path := os.environ.get('GITHUB_STEP_SUMMARY'):
+        with open(summary_path, 'a') as f:
+            f.write(f'### Module loading benchmark\n\nThe parse timeout is {PARSE_TIMEOUT}s\n\n{table}')
+
+    for regression in regressions:
+        if args.report_only:
+            sys.stdout.write(f'::warning::Possible regression: {regression}\n')
+        else:
+            sys.stdout.write(f'Regression: {regression}\n')
+
+    return 1 if regressions and not args.report_only else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Compare serial and parallel module loading
+
+Usage:
+    PYTHONPATH=image/src python3 tests/benchmarks/parallel_load.py [WORKERS]
+
+Synthetic modules of 50, 200 and 1000 files are generated and loaded with load_module,
+first one file at a time and then with WORKERS parse workers (default: the number of CPUs).
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from terraform.module import load_module
+
+FILE_COUNTS = [50, 200, 1000]
+
+
+def generate_module(path: Path, files: int) -> None:
+    """Write a module made up of the given number of generated .tf files."""
+
+    for i in range(files):
+        Path(path, f'generated_{i:04}.tf').write_text(f'''
+variable "input_{i}" {{
+  type      = string
+  sensitive = {'true' if i % 2 else 'false'}
+}}
+
+resource "aws_s3_bucket" "bucket_{i}" {{
+  bucket = "bucket-${{var.input_{i}}}"
+
+  tags = {{
+    Name  = "bucket {i}"
+    Index = {i}
+  }}
+}}
+
+output "bucket_{i}" {{
+  value = aws_s3_bucket.bucket_{i}.arn
+}}
+''')
+
+    Path(path, 'terraform.tf').write_text('''
+terraform {
+  required_version = ">= 1.0.0"
+
+  backend "s3" {
+    bucket = "terraform-state"
+    key    = "benchmark"
+  }
+}
+''')
+
+
+def time_load(path: Path, workers: int) -> float:
+    start = time.perf_counter()
+    load_module(path, workers=workers)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1
+
+    # Don't let the module cache hide the parse time
+    os.environ.pop('JOB_TMP_DIR', None)
+
+    sys.stdout.write(f'{"files":>6} {"serial":>10} {f"{workers} workers":>12} {"speedup":>8}\n')
+
+    for files in FILE_COUNTS:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            generate_module(Path(tmpdir), files)
+
+            serial = time_load(Path(tmpdir), workers=1)
+            parallel = time_load(Path(tmpdir), workers=workers)
+
+            assert load_module(Path(tmpdir), workers=1) == load_module(Path(tmpdir), workers=workers)
+
+            sys.stdout.write(f'{files:>6} {serial:>9.2f}s {parallel:>11.2f}s {serial / parallel:>7.2f}x\n')
+
+
+if __name__ == '__main__':
+    main()
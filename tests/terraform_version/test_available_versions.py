@@ -0,0 +1,215 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+import terraform_version.__main__
+import terraform_version.available_versions
+from terraform.download import VersionNotFound
+from terraform.versions import Version
+from terraform_version.__main__ import determine_version
+from terraform_version.available_versions import get_available_versions, LazyVersionCatalog, ReleaseDiscoveryError, ReleaseDiscoveryTimeout
+
+
+def slow(versions, seconds):
+    def get_versions(**kwargs):
+        time.sleep(seconds)
+        return versions
+
+    return get_versions
+
+
+def test_concurrent(monkeypatch):
+    monkeypatch.setattr(terraform_version.available_versions, 'get_terraform_versions', slow([Version('1.5.7'), Version('1.6.0')], 0.5))
+    monkeypatch.setattr(terraform_version.available_versions, 'get_opentofu_versions', slow([Version('1.6.0', 'OpenTofu')], 0.5))
+
+    start = time.monotonic()
+    versions = get_available_versions(opentofu=True)
+    assert time.monotonic() - start < 0.9
+
+    assert list(versions) == [Version('1.5.7'), Version('1.6.0')]
+    assert [v.product for v in versions] == ['Terraform', 'OpenTofu']
+
+    assert list(get_available_versions(opentofu=False)) == [Version('1.5.7'), Version('1.6.0')]
+
+
+def test_deadline(monkeypatch):
+    monkeypatch.setenv('TERRAFORM_RELEASE_DISCOVERY_TIMEOUT', '0.2')
+    monkeypatch.setattr(terraform_version.available_versions, 'get_terraform_versions', slow([Version('1.5.7')], 0))
+    monkeypatch.setattr(terraform_version.available_versions, 'get_opentofu_versions', slow([], 2))
+
+    start = time.monotonic()
+    with pytest.raises(ReleaseDiscoveryTimeout, match='OpenTofu'):
+        get_available_versions(opentofu=True)
+    assert time.monotonic() - start < 1
+
+
+def test_deadline_exits(tmp_path):
+    # A source that never finishes doesn't stop the process from exiting after the timeout
+    script = Path(tmp_path, 'deadline.py')
+    script.write_text('''
+import time
+import terraform_version.available_versions as available_versions
+
+available_versions.get_terraform_versions = lambda: time.sleep(60) or []
+
+try:
+    available_versions.get_available_versions(opentofu=False)
+except available_versions.ReleaseDiscoveryTimeout:
+    print('timed out')
+''')
+
+    start = time.monotonic()
+    result = subprocess.run(
+        [sys.executable, str(script)],
+        env=os.environ | {'TERRAFORM_RELEASE_DISCOVERY_TIMEOUT': '0.2'},
+        capture_output=True,
+        text=True,
+        timeout=30
+    )
+
+    assert result.stdout.strip() == 'timed out'
+    assert time.monotonic() - start < 10
+
+
+def no_fetch(*args, **kwargs):
+    raise AssertionError('The available versions should not be fetched')
+
+
+def test_lazy_catalog_pinned(monkeypatch):
+    monkeypatch.setattr(terraform_version.available_versions, 'get_available_versions', no_fetch)
+
+    versions = LazyVersionCatalog(opentofu=True)
+    assert versions.pinned('1.5.7').product == 'Terraform'
+    assert versions.pinned('1.6.0-alpha3').product == 'OpenTofu'
+    assert versions.pinned('1.8.0').product == 'OpenTofu'
+    assert LazyVersionCatalog(opentofu=False).pinned('1.8.0').product == 'Terraform'
+    assert not versions.fetched
+
+
+def test_lazy_catalog_fetch(monkeypatch):
+    calls = []
+
+    def get_available_versions(opentofu):
+        calls.append(opentofu)
+        return [Version('1.5.7'), Version('1.4.0')]
+
+    monkeypatch.setattr(terraform_version.available_versions, 'get_available_versions', get_available_versions)
+
+    versions = LazyVersionCatalog(opentofu=False)
+    assert versions.latest() == Version('1.5.7')
+    assert versions.fetched
+    assert versions.pinned('1.4.0') == Version('1.4.0')
+    assert versions.pinned('1.4.1') is None
+    assert list(versions) == [Version('1.4.0'), Version('1.5.7')]
+    assert calls == [False]
+
+
+def test_lazy_catalog_fetch_error(monkeypatch):
+    calls = []
+
+    def get_available_versions(opentofu):
+        calls.append(opentofu)
+        raise ReleaseDiscoveryTimeout('too slow')
+
+    monkeypatch.setattr(terraform_version.available_versions, 'get_available_versions', get_available_versions)
+
+    versions = LazyVersionCatalog(opentofu=False)
+    for _ in range(2):
+        with pytest.raises(ReleaseDiscoveryTimeout):
+            versions.latest()
+
+    assert calls == [False]
+
+
+def test_lazy_catalog_network_error(monkeypatch):
+    def get_available_versions(opentofu):
+        raise ConnectionError('Name or service not known')
+
+    monkeypatch.setattr(terraform_version.available_versions, 'get_available_versions', get_available_versions)
+
+    versions = LazyVersionCatalog(opentofu=False)
+    with pytest.raises(ReleaseDiscoveryError, match='Name or service not known'):
+        versions.latest()
+
+
+@pytest.mark.parametrize('files, env', [
+    ({'main.tf': 'terraform {\n  required_version = ">= 1.0.0"\n}\n', '.terraform-version': '0.12.31\n'}, {}),
+    ({'.terraform-version': 'latest\n', '.tool-versions': 'terraform 0.12.31\n'}, {}),
+    ({'.tool-versions': 'terraform latest\n'}, {'TERRAFORM_VERSION': '0.12.31'}),
+    ({}, {'TERRAFORM_VERSION': '>=1.0.0'}),
+])
+def test_fetch_error_is_not_ignored(tmp_path, monkeypatch, files, env):
+    def get_available_versions(opentofu):
+        raise ReleaseDiscoveryTimeout('too slow')
+
+    monkeypatch.setattr(terraform_version.available_versions, 'get_available_versions', get_available_versions)
+    monkeypatch.setenv('TERRAFORM_VERSION_CACHE', 'false')
+
+    for name, content in files.items():
+        Path(tmp_path, name).write_text(content)
+
+    inputs = {'INPUT_PATH': str(tmp_path), 'INPUT_WORKSPACE': 'default'}
+    with pytest.raises(ReleaseDiscoveryTimeout):
+        determine_version(inputs, Path(tmp_path, 'cli.tfrc'), env, {'GITHUB_WORKSPACE': str(tmp_path)})
+
+
+@pytest.mark.parametrize('files, env, expected', [
+    ({'.terraform-version': '1.5.7\n'}, {}, Version('1.5.7')),
+    ({'.tfswitchrc': '1.4.2'}, {}, Version('1.4.2')),
+    ({'main.tf': 'terraform {\n  required_version = "1.3.9"\n}\n'}, {}, Version('1.3.9')),
+    ({}, {'TERRAFORM_VERSION': '1.2.3'}, Version('1.2.3')),
+])
+def test_pinned_version_skips_fetch(tmp_path, monkeypatch, files, env, expected):
+    monkeypatch.setattr(terraform_version.available_versions, 'get_available_versions', no_fetch)
+    monkeypatch.setenv('TERRAFORM_VERSION_CACHE', 'false')
+
+    for name, content in files.items():
+        Path(tmp_path, name).write_text(content)
+
+    inputs = {'INPUT_PATH': str(tmp_path), 'INPUT_WORKSPACE': 'default'}
+    assert determine_version(inputs, Path(tmp_path, 'cli.tfrc'), env, {'GITHUB_WORKSPACE': str(tmp_path)}) == expected
+
+
+@pytest.mark.parametrize('files, env', [
+    ({'main.tf': 'terraform {\n  required_version = "1.99.0"\n}\n'}, {}),
+    ({}, {'TERRAFORM_VERSION': '1.99.0'}),
+])
+def test_check_available_pinned_version(tmp_path, monkeypatch, capsys, files, env):
+    monkeypatch.setattr(terraform_version.available_versions, 'get_available_versions', lambda opentofu: [Version('1.5.7')])
+    monkeypatch.setenv('TERRAFORM_VERSION_CACHE', 'false')
+
+    for name, content in files.items():
+        Path(tmp_path, name).write_text(content)
+
+    inputs = {'INPUT_PATH': str(tmp_path), 'INPUT_WORKSPACE': 'default'}
+    assert determine_version(inputs, Path(tmp_path, 'cli.tfrc'), env, {'GITHUB_WORKSPACE': str(tmp_path)}) == Version('1.99.0')
+    assert determine_version(inputs, Path(tmp_path, 'cli.tfrc'), env, {'GITHUB_WORKSPACE': str(tmp_path)}, check_available=True) == Version('1.5.7')
+
+    if env:
+        assert 'The constraint 1.99.0 does not match any available versions' in capsys.readouterr().out
+
+
+def test_main_version_not_found(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(terraform_version.available_versions, 'get_available_versions', lambda opentofu: [Version('1.5.7')])
+    monkeypatch.setenv('TERRAFORM_VERSION_CACHE', 'false')
+    monkeypatch.setenv('INPUT_PATH', str(tmp_path))
+    monkeypatch.setenv('TERRAFORM_VERSION', '1.99.0')
+    monkeypatch.setattr(sys, 'argv', ['terraform-version'])
+    Path(tmp_path, 'main.tf').write_text('terraform {\n  required_version = "1.99.0"\n}\n')
+
+    switched = []
+
+    def switch(version):
+        if version == Version('1.99.0'):
+            raise VersionNotFound(f'Could not download signature file for {version} - does this version exist?')
+        switched.append(version)
+
+    monkeypatch.setattr(terraform_version.__main__, 'switch', switch)
+    terraform_version.__main__.main()
+
+    assert switched == [Version('1.5.7')]
+    assert 'The constraint 1.99.0 does not match any available versions' in capsys.readouterr().out
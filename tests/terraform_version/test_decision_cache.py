@@ -0,0 +1,222 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import terraform_version.__main__
+import terraform_version.available_versions
+from terraform.module_graph import load_module_graph
+from terraform.versions import Version
+from terraform_version.__main__ import determine_version
+from terraform_version.available_versions import ReleaseDiscoveryTimeout
+from terraform_version.decision_cache import decision_key, DecisionCache, KEY_FILENAME
+
+
+def no_fetch(opentofu):
+    raise AssertionError('The available versions should not be fetched')
+
+
+@pytest.fixture
+def module(tmp_path, monkeypatch):
+    module_path = Path(tmp_path, 'module')
+    module_path.mkdir()
+    Path(module_path, 'main.tf').write_text('terraform {\n  required_version = "1.3.9"\n}\n')
+
+    monkeypatch.setenv('TERRAFORM_VERSION_CACHE_DIR', str(Path(tmp_path, 'cache')))
+    monkeypatch.setenv('STEP_TMP_DIR', str(tmp_path))
+    monkeypatch.delenv('TERRAFORM_VERSION_CACHE_KEY', raising=False)
+    monkeypatch.delenv('TERRAFORM_VERSION_CACHE_GENERATION', raising=False)
+    monkeypatch.delenv('TERRAFORM_BIN_CACHE_DIR', raising=False)
+    monkeypatch.delenv('OPENTOFU', raising=False)
+
+    return module_path
+
+
+def key(module_path, **inputs):
+    inputs = {'INPUT_PATH': str(module_path), 'INPUT_WORKSPACE': 'default'} | inputs
+    return decision_key(inputs, {}, {'GITHUB_WORKSPACE': str(module_path.parent)}, load_module_graph(module_path))
+
+
+def test_put_get(tmp_path):
+    cache = DecisionCache(tmp_path)
+
+    cache.put('abc123', Version('1.6.2', 'OpenTofu'), 'required_version')
+    version = cache.get('abc123')
+    assert version == Version('1.6.2')
+    assert version.product == 'OpenTofu'
+
+    assert cache.get('def456') is None
+
+
+def test_uncacheable_source(tmp_path):
+    cache = DecisionCache(tmp_path)
+
+    cache.put('abc123', Version('1.5.7'), 'remote state')
+    assert cache.get('abc123') is None
+
+
+def test_unsafe_key(tmp_path):
+    cache = DecisionCache(Path(tmp_path, 'cache'))
+
+    cache.put('../abc123', Version('1.5.7'), 'required_version')
+    assert cache.get('../abc123') is None
+    assert not Path(tmp_path, 'abc123.json').exists()
+
+
+def test_no_directory():
+    cache = DecisionCache(None)
+
+    cache.put('abc123', Version('1.5.7'), 'required_version')
+    assert cache.get('abc123') is None
+
+
+def test_key_changes(module, monkeypatch):
+    original = key(module)
+    assert key(module) == original
+
+    assert key(module, INPUT_WORKSPACE='prod') != original
+    assert key(module, INPUT_BACKEND_CONFIG='bucket=test') != original
+
+    Path(module, '.terraform-version').write_text('1.5.7\n')
+    assert key(module) != original
+    Path(module, '.terraform-version').unlink()
+
+    Path(module.parent, '.tool-versions').write_text('terraform 1.5.7\n')
+    assert key(module) != original
+    Path(module.parent, '.tool-versions').unlink()
+
+    Path(module, 'versions.tf').write_text('terraform {\n  required_version = "~> 1.3"\n}\n')
+    assert key(module) != original
+    Path(module, 'versions.tf').unlink()
+
+    # Blocks that don't affect the version
+    Path(module, 'resources.tf').write_text('resource "null_resource" "test" {}\n')
+    assert key(module) == original
+
+    monkeypatch.setenv('TERRAFORM_VERSION_CACHE_GENERATION', '2')
+    assert key(module) != original
+
+
+def test_determine_version_cached(module, tmp_path, monkeypatch):
+    inputs = {'INPUT_PATH': str(module), 'INPUT_WORKSPACE': 'default'}
+    github_env = {'GITHUB_WORKSPACE': str(tmp_path)}
+
+    monkeypatch.setattr(terraform_version.available_versions, 'get_available_versions', no_fetch)
+    assert determine_version(inputs, Path(tmp_path, 'cli.tfrc'), {}, github_env) == Version('1.3.9')
+
+    cache_key = Path(tmp_path, KEY_FILENAME).read_text()
+    assert DecisionCache(Path(tmp_path, 'cache')).get(cache_key) == Version('1.3.9')
+
+    def resolve_version(*args):
+        raise AssertionError('The version should not be resolved again')
+
+    monkeypatch.setattr(terraform_version.__main__, 'resolve_version', resolve_version)
+    assert determine_version(inputs, Path(tmp_path, 'cli.tfrc'), {}, github_env) == Version('1.3.9')
+
+    # The key from an earlier step means the module isn't loaded
+    def load_module_graph(path):
+        raise AssertionError('The module should not be loaded')
+
+    monkeypatch.setattr(terraform_version.__main__, 'load_module_graph', load_module_graph)
+    monkeypatch.setenv('TERRAFORM_VERSION_CACHE_KEY', cache_key)
+    assert determine_version(inputs, Path(tmp_path, 'cli.tfrc'), {}, github_env) == Version('1.3.9')
+
+
+def test_determine_version_cache_disabled(module, tmp_path, monkeypatch):
+    inputs = {'INPUT_PATH': str(module), 'INPUT_WORKSPACE': 'default'}
+
+    monkeypatch.setattr(terraform_version.available_versions, 'get_available_versions', no_fetch)
+    monkeypatch.setenv('TERRAFORM_VERSION_CACHE', 'false')
+    assert determine_version(inputs, Path(tmp_path, 'cli.tfrc'), {}, {'GITHUB_WORKSPACE': str(tmp_path)}) == Version('1.3.9')
+
+    assert not Path(tmp_path, 'cache').exists()
+
+
+def test_fetch_failure_not_cached(module, tmp_path, monkeypatch):
+    inputs = {'INPUT_PATH': str(module), 'INPUT_WORKSPACE': 'default'}
+
+    def get_available_versions(opentofu):
+        raise ReleaseDiscoveryTimeout('too slow')
+
+    def resolve_version(inputs, cli_config_path, actions_env, github_env, module_graph, versions, trace):
+        trace.append('required_version')
+        with pytest.raises(ReleaseDiscoveryTimeout):
+            versions.latest()
+        return Version('1.3.9')
+
+    monkeypatch.setattr(terraform_version.available_versions, 'get_available_versions', get_available_versions)
+    monkeypatch.setattr(terraform_version.__main__, 'resolve_version', resolve_version)
+    assert determine_version(inputs, Path(tmp_path, 'cli.tfrc'), {}, {'GITHUB_WORKSPACE': str(tmp_path)}) == Version('1.3.9')
+
+    assert not Path(tmp_path, 'cache').exists()
+    assert not Path(tmp_path, KEY_FILENAME).exists()
+
+
+def test_key_changes_with_release_index(module, tmp_path, monkeypatch):
+    monkeypatch.setenv('TERRAFORM_BIN_CACHE_DIR', str(tmp_path))
+    index_dir = Path(tmp_path, 'release-index')
+    index_dir.mkdir()
+
+    Path(index_dir, 'terraform.json').write_text(json.dumps({'versions': ['1.5.7']}))
+    Path(index_dir, 'opentofu.json').write_text(json.dumps({'versions': ['1.6.0']}))
+    original = key(module)
+
+    Path(index_dir, 'terraform.json').write_text(json.dumps({'versions': ['1.5.7', '1.6.0']}))
+    assert key(module) != original
+    original = key(module)
+
+    # The opentofu index only matters when using OpenTofu
+    Path(index_dir, 'opentofu.json').write_text(json.dumps({'versions': ['1.6.0', '1.6.1']}))
+    assert key(module) == original
+
+    monkeypatch.setenv('OPENTOFU', 'true')
+    original = key(module)
+    Path(index_dir, 'opentofu.json').write_text(json.dumps({'versions': ['1.6.0', '1.6.1', '1.6.2']}))
+    assert key(module) != original
+
+
+@pytest.mark.parametrize('backend', [
+    'backend "remote" {\n    organization = "test"\n    workspaces {\n      name = "test"\n    }\n  }',
+    'cloud {\n    organization = "test"\n    workspaces {\n      name = "test"\n    }\n  }',
+])
+def test_remote_workspace_not_cached(module, tmp_path, monkeypatch, backend):
+    Path(module, 'main.tf').write_text(f'terraform {{\n  required_version = "1.3.9"\n  {backend}\n}}\n')
+    inputs = {'INPUT_PATH': str(module), 'INPUT_WORKSPACE': 'default'}
+
+    # The remote workspace couldn't be read, so another source was used
+    monkeypatch.setattr(terraform_version.__main__, 'try_get_remote_workspace_version', lambda *args: None)
+    monkeypatch.setattr(terraform_version.available_versions, 'get_available_versions', no_fetch)
+    assert determine_version(inputs, Path(tmp_path, 'cli.tfrc'), {}, {'GITHUB_WORKSPACE': str(tmp_path)}) == Version('1.3.9')
+
+    assert not Path(tmp_path, 'cache').exists()
+
+
+def test_modules_with_same_config(tmp_path, monkeypatch):
+    monkeypatch.setenv('TERRAFORM_VERSION_CACHE_DIR', str(Path(tmp_path, 'cache')))
+    monkeypatch.delenv('TERRAFORM_VERSION_CACHE_KEY', raising=False)
+    monkeypatch.delenv('TERRAFORM_BIN_CACHE_DIR', raising=False)
+    monkeypatch.delenv('OPENTOFU', raising=False)
+    monkeypatch.setattr(terraform_version.available_versions, 'get_available_versions', lambda opentofu: [Version('0.14.11'), Version('1.9.0')])
+
+    module_a = Path(tmp_path, 'a')
+    module_b = Path(tmp_path, 'b')
+    for module_path in [module_a, module_b]:
+        module_path.mkdir()
+        Path(module_path, 'main.tf').write_text('terraform {}\n')
+
+    assert key(module_a) != key(module_b)
+
+    original = key(module_a)
+    Path(module_a, 'terraform.tfstate').write_text(json.dumps({'version': 4, 'terraform_version': '0.14.11', 'serial': 1}))
+    assert key(module_a) != original
+
+    # Module b decides on the latest version first
+    inputs = {'INPUT_PATH': str(module_b), 'INPUT_WORKSPACE': 'default'}
+    assert determine_version(inputs, Path(tmp_path, 'cli.tfrc'), {}, {'GITHUB_WORKSPACE': str(tmp_path)}) == Version('1.9.0')
+
+    inputs = {'INPUT_PATH': str(module_a), 'INPUT_WORKSPACE': 'default'}
+    assert determine_version(inputs, Path(tmp_path, 'cli.tfrc'), {}, {'GITHUB_WORKSPACE': str(tmp_path)}) == Version('0.14.11')
+
+    # A key from an earlier step isn't used when there is a local state file
+    monkeypatch.setenv('TERRAFORM_VERSION_CACHE_KEY', key(module_b))
+    assert determine_version(inputs, Path(tmp_path, 'cli.tfrc'), {}, {'GITHUB_WORKSPACE': str(tmp_path)}) == Version('0.14.11')
@@ -0,0 +1,93 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import terraform_version.get_checksums
+from terraform.versions import Version
+from terraform_version.get_checksums import checksum_workers, prefetch
+
+
+def test_checksum_workers(monkeypatch):
+    monkeypatch.delenv('TERRAFORM_CHECKSUM_WORKERS', raising=False)
+    assert checksum_workers() == 8
+
+    monkeypatch.setenv('TERRAFORM_CHECKSUM_WORKERS', '3')
+    assert checksum_workers() == 3
+
+    monkeypatch.setenv('TERRAFORM_CHECKSUM_WORKERS', '0')
+    assert checksum_workers() == 1
+
+    monkeypatch.setenv('TERRAFORM_CHECKSUM_WORKERS', 'lots')
+    assert checksum_workers() == 8
+
+
+def test_prefetch(tmp_path, capsys):
+    running = 0
+    most_running = 0
+    lock = threading.Lock()
+
+    def get_checksums(version: Version, checksum_dir: Path) -> Path:
+        nonlocal running, most_running
+
+        with lock:
+            running += 1
+            most_running = max(most_running, running)
+
+        time.sleep(0.05)
+        path = Path(checksum_dir, f'{version.product.lower()}_{version}_SHA256SUMS')
+        path.write_text('checksums')
+
+        with lock:
+            running -= 1
+
+        return path
+
+    Path(tmp_path, 'terraform_1.0.0_SHA256SUMS').write_text('checksums')
+
+    releases = [(Version(f'1.{minor}.0', 'Terraform'), get_checksums) for minor in range(8)]
+    releases += [(Version('1.6.0', 'OpenTofu'), get_checksums)]
+
+    assert prefetch(releases, tmp_path, 3) == []
+    assert most_running == 3
+
+    output = capsys.readouterr().out
+    assert '[9/9]' in output
+    assert 'Got checksums for OpenTofu 1.6.0' in output
+    assert 'Verified checksums for 9 of 9 releases' in output
+    assert 'Downloaded 8 files (0 KiB' in output
+    assert '1 files were already present' in output
+
+
+def test_prefetch_failure(tmp_path, capsys):
+    def get_checksums(version: Version, checksum_dir: Path) -> Path:
+        if version.minor == 1:
+            raise RuntimeError('Could not verify checksums signature')
+        return Path(checksum_dir, 'SHA256SUMS')
+
+    releases = [(Version(f'1.{minor}.0', 'Terraform'), get_checksums) for minor in range(3)]
+
+    failures = prefetch(releases, tmp_path, 2)
+    assert [(str(version), str(error)) for version, error in failures] == [('1.1.0', 'Could not verify checksums signature')]
+    assert 'Verified checksums for 2 of 3 releases' in capsys.readouterr().out
+
+
+def test_main_failure(tmp_path, monkeypatch):
+    monkeypatch.setenv('TERRAFORM_BIN_CHECKSUM_DIR', str(tmp_path))
+    monkeypatch.setattr(terraform_version.get_checksums, 'get_terraform_versions', lambda: iter([Version('1.5.7', 'Terraform'), Version('1.6.0-beta1', 'Terraform')]))
+    monkeypatch.setattr(terraform_version.get_checksums, 'get_opentofu_versions', lambda: iter([Version('1.6.0', 'OpenTofu')]))
+
+    fetched = []
+
+    def get_checksums(version, checksum_dir):
+        fetched.append(f'{version.product} {version}')
+        raise RuntimeError('not found')
+
+    monkeypatch.setattr(terraform_version.get_checksums, 'get_checksums', get_checksums)
+    monkeypatch.setattr(terraform_version.get_checksums, 'get_opentofu_checksums', get_checksums)
+
+    with pytest.raises(SystemExit):
+        terraform_version.get_checksums.main()
+
+    assert sorted(fetched) == ['OpenTofu 1.6.0', 'Terraform 1.5.7']
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from terraform.versions import Version, earliest_version, latest_version, earliest_non_prerelease_version, latest_non_prerelease_version
+from terraform.versions import Constraint, Version, VersionCatalog, earliest_version, latest_version, earliest_non_prerelease_version, latest_non_prerelease_version
 
 
 def test_latest():
@@ -18,3 +18,45 @@ def test_latest():
     assert latest_version(versions) == Version('1.2.0-alpha20225555')
     assert earliest_non_prerelease_version(versions) == Version('0.13.6')
     assert latest_non_prerelease_version(versions) == Version('1.1.9')
+
+    catalog = VersionCatalog(versions)
+    assert list(catalog) == sorted(versions)
+    assert earliest_version(catalog) == Version('0.13.6-alpha-23')
+    assert latest_version(catalog) == Version('1.2.0-alpha20225555')
+    assert earliest_non_prerelease_version(catalog) == Version('0.13.6')
+    assert latest_non_prerelease_version(catalog) == Version('1.1.9')
+
+
+def test_version_catalog():
+    catalog = VersionCatalog([
+        Version('1.1.9'),
+        Version('1.6.0-beta1', 'OpenTofu'),
+        Version('1.1.9'),
+        Version('0.12.31'),
+        Version('1.6.0', 'OpenTofu'),
+        Version('1.5.7'),
+    ])
+
+    assert list(catalog) == [Version('0.12.31'), Version('1.1.9'), Version('1.5.7'), Version('1.6.0-beta1'), Version('1.6.0')]
+    assert catalog.releases == [Version('0.12.31'), Version('1.1.9'), Version('1.5.7'), Version('1.6.0')]
+    assert catalog.pre_releases == [Version('1.6.0-beta1')]
+    assert catalog[0] == Version('0.12.31')
+    assert len(catalog) == 5
+    assert Version('1.5.7') in catalog
+    assert Version('1.5.6') not in catalog
+
+    assert catalog.latest().product == 'OpenTofu'
+    assert catalog.earliest() == Version('0.12.31')
+    assert catalog.exact('1.6.0-beta1').product == 'OpenTofu'
+    assert catalog.exact('1.6.1') is None
+
+    assert catalog.latest_matching(r'^1\.[15]\.') == Version('1.5.7')
+    assert catalog.latest_matching('beta') == Version('1.6.0-beta1')
+    assert catalog.latest_matching('^2') is None
+
+    selected = catalog.select([Constraint('>=1.0.0'), Constraint('<1.6.0')])
+    assert list(selected) == [Version('1.1.9'), Version('1.5.7')]
+    assert selected.latest() == Version('1.5.7')
+
+    assert VersionCatalog.of(catalog) is catalog
+    assert VersionCatalog().latest() is None
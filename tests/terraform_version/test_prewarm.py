@@ -0,0 +1,73 @@
+import pytest
+
+import terraform_version.prewarm
+from terraform.versions import parse_version_spec, Version
+from terraform_version.prewarm import prewarm, resolve_versions
+
+
+def test_parse_version_spec():
+    product, constraints = parse_version_spec('1.5.7')
+    assert product == 'Terraform'
+    assert constraints.pinned() == '1.5.7'
+
+    product, constraints = parse_version_spec('opentofu:>=1.7.0,<1.8.0')
+    assert product == 'OpenTofu'
+    assert constraints.is_allowed(Version('1.7.3', 'OpenTofu'))
+    assert not constraints.is_allowed(Version('1.8.0', 'OpenTofu'))
+
+    assert parse_version_spec('tofu:1.6.0')[0] == 'OpenTofu'
+
+    with pytest.raises(ValueError):
+        parse_version_spec('terragrunt:0.50.0')
+
+    with pytest.raises(ValueError):
+        parse_version_spec('latest')
+
+
+def test_resolve_versions(monkeypatch):
+    monkeypatch.setattr(terraform_version.prewarm, 'get_terraform_versions', lambda: iter([
+        Version('1.5.6'), Version('1.5.7'), Version('1.6.0-beta1'), Version('1.6.0')
+    ]))
+    monkeypatch.setattr(terraform_version.prewarm, 'get_opentofu_versions', lambda: iter([
+        Version('1.6.0', 'OpenTofu'), Version('1.7.0', 'OpenTofu')
+    ]))
+
+    versions = resolve_versions(['~>1.5.0', '1.6.0', 'tofu:1.6.0', '0.12.0'])
+    assert [(version.product, str(version)) for version in versions] == [
+        ('OpenTofu', '1.6.0'),
+        ('Terraform', '0.12.0'),
+        ('Terraform', '1.5.6'),
+        ('Terraform', '1.5.7'),
+        ('Terraform', '1.6.0'),
+    ]
+
+    with pytest.raises(ValueError):
+        resolve_versions(['opentofu:>=2.0.0'])
+
+
+def test_resolve_pinned_versions(monkeypatch):
+    def no_versions():
+        raise AssertionError('Available versions should not be fetched')
+
+    monkeypatch.setattr(terraform_version.prewarm, 'get_terraform_versions', no_versions)
+    monkeypatch.setattr(terraform_version.prewarm, 'get_opentofu_versions', no_versions)
+
+    assert [str(version) for version in resolve_versions(['0.9.0', '0.12.0', '0.9.0'])] == ['0.9.0', '0.12.0']
+
+
+def test_prewarm(monkeypatch, capsys):
+    cached = []
+
+    def get_executable(version):
+        if version == Version('0.1.0'):
+            raise RuntimeError('Could not download')
+        cached.append(f'{version.product} {version}')
+
+    monkeypatch.setattr(terraform_version.prewarm, 'get_executable', get_executable)
+    monkeypatch.setattr(terraform_version.prewarm, 'get_opentofu_executable', get_executable)
+
+    failures = prewarm([Version('0.1.0'), Version('1.5.7'), Version('1.6.0', 'OpenTofu')], 2)
+
+    assert sorted(cached) == ['OpenTofu 1.6.0', 'Terraform 1.5.7']
+    assert [str(version) for version, _ in failures] == ['0.1.0']
+    assert 'Cached 2 of 3 versions' in capsys.readouterr().out
@@ -1,3 +1,8 @@
+import copy
+import pickle
+
+import pytest
+
 from terraform.versions import Version, Constraint
 from terraform.exec import init_args
 
@@ -201,3 +206,46 @@ def test_constraint():
         Constraint('0.13.0'),
     ]
     assert test_ordering == sorted(test_ordering)
+
+def test_version_interning():
+    assert Version('1.5.0') is Version('1.5.0')
+    assert Version('1.5.0', 'OpenTofu') is not Version('1.5.0')
+    assert Version('1.5.0', 'OpenTofu').product == 'OpenTofu'
+    assert Version('1.5.0').product == 'Terraform'
+
+    # Versions of different products are still equal
+    assert Version('1.5.0', 'OpenTofu') == Version('1.5.0')
+    assert hash(Version('1.5.0', 'OpenTofu')) == hash(Version('1.5.0'))
+
+    assert Constraint('>=1.0.0') is Constraint('>=1.0.0')
+    assert Constraint('>= 1.0.0') == Constraint('>=1.0.0')
+
+    with pytest.raises(AttributeError):
+        Version('1.5.0').extra = 1
+
+    assert pickle.loads(pickle.dumps(Version('1.6.0-rc1', 'OpenTofu'))) is Version('1.6.0-rc1', 'OpenTofu')
+    assert pickle.loads(pickle.dumps(Constraint('~>1.2'))) is Constraint('~>1.2')
+    assert copy.copy(Version('1.6.0')) == Version('1.6.0')
+
+def test_version_ordering():
+    ordered = [
+        Version('0.9.0'),
+        Version('0.15.0-alpha20210107'),
+        Version('0.15.0-beta1'),
+        Version('0.15.0-rc2'),
+        Version('0.15.0'),
+        Version('1.0.0'),
+        Version('1.0.11'),
+        Version('1.10.0-alpha1'),
+        Version('1.10.0'),
+    ]
+
+    assert sorted(reversed(ordered)) == ordered
+
+    for i, a in enumerate(ordered):
+        for j, b in enumerate(ordered):
+            assert (a < b) == (i < j)
+            assert (a <= b) == (i <= j)
+            assert (a > b) == (i > j)
+            assert (a >= b) == (i >= j)
+            assert (a == b) == (i == j)
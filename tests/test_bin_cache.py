@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from zipfile import ZipFile
+
+from terraform.bin_cache import BinCache, max_size, read_pins, record_use
+from terraform.executable_cache import CachedExecutable, Manifest
+from terraform.versions import Version
+
+MiB = 1024 * 1024
+
+
+def add_release(cache_dir: Path, checksum_dir: Path, version: Version, size: int, age: float) -> Path:
+    """Put an archive, extracted executable and checksums for a version in the cache, last modified age seconds ago."""
+
+    name = 'tofu' if version.product == 'OpenTofu' else 'terraform'
+
+    archive_path = Path(cache_dir, f'{name}_{version}_linux_amd64.zip')
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with ZipFile(archive_path, 'w') as f:
+        f.writestr(name, os.urandom(size))
+    archive_sha256 = hashlib.sha256(archive_path.read_bytes()).hexdigest()
+
+    executable = CachedExecutable(cache_dir, name, version, 'linux_amd64', archive_sha256)
+    executable.extract(archive_path)
+
+    checksum_dir.mkdir(parents=True, exist_ok=True)
+    checksums_path = Path(checksum_dir, f'{name}_{version}_SHA256SUMS')
+    checksums_path.write_text(f'{archive_sha256}  {archive_path.name}\n')
+
+    mtime = time.time() - age
+    for path in [archive_path, executable.dir, checksums_path]:
+        os.utime(path, (mtime, mtime))
+
+    return executable.dir
+
+
+def test_max_size(monkeypatch):
+    monkeypatch.delenv('TERRAFORM_BIN_CACHE_MAX_SIZE', raising=False)
+    assert max_size() is None
+
+    for value, expected in [('1000', 1000), ('512M', 512 * MiB), ('2GiB', 2 * 1024 * MiB), ('4 kb', 4096), ('lots', None)]:
+        monkeypatch.setenv('TERRAFORM_BIN_CACHE_MAX_SIZE', value)
+        assert max_size() == expected
+
+
+def test_read_pins(tmp_path):
+    pin_path = Path(tmp_path, 'pinned-versions')
+    pin_path.write_text('# Versions used by our modules\n1.5.7\nopentofu:~>1.6.0  # tofu modules\n\nnot a version\n')
+
+    pins = read_pins(pin_path)
+    assert [product for product, _ in pins] == ['Terraform', 'OpenTofu']
+    assert pins[1][1].is_allowed(Version('1.6.2', 'OpenTofu'))
+
+    assert read_pins(Path(tmp_path, 'missing')) == []
+
+
+def test_evict_least_recently_used(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv('TERRAFORM_BIN_CACHE_MIN_AGE', '60')
+    cache_dir = Path(tmp_path, 'cache')
+    checksum_dir = Path(tmp_path, 'checksums')
+
+    oldest = add_release(cache_dir, checksum_dir, Version('1.3.0'), MiB, 3000)
+    pinned = add_release(cache_dir, checksum_dir, Version('1.4.0'), MiB, 2000)
+    used = add_release(cache_dir, checksum_dir, Version('1.5.0'), MiB, 4000)
+    recent = add_release(cache_dir, checksum_dir, Version('1.6.0'), MiB, 10)
+
+    Path(cache_dir, 'pinned-versions').write_text('~>1.4.0\n')
+
+    # Each release is a compressed and uncompressed copy of the executable, so there is room for four
+    cache = BinCache(cache_dir, 9 * MiB)
+
+    # 1.5.0 was added first, but has been used more recently
+    cache.record(Version('1.3.0'), hit=True)
+    index = json.loads(Path(cache_dir, 'cache-index.json').read_text())
+    index['releases']['Terraform 1.3.0'] = time.time() - 3000
+    index['releases']['Terraform 1.5.0'] = time.time() - 100
+    Path(cache_dir, 'cache-index.json').write_text(json.dumps(index))
+
+    new = add_release(cache_dir, checksum_dir, Version('1.7.0'), MiB, 0)
+    cache.record(Version('1.7.0'), hit=False)
+
+    assert not oldest.exists()
+    assert not Path(cache_dir, 'terraform_1.3.0_linux_amd64.zip').exists()
+    assert oldest.name not in Manifest(cache_dir).entries()
+
+    # The checksum dir isn't managed by the bin cache
+    assert Path(checksum_dir, 'terraform_1.3.0_SHA256SUMS').exists()
+
+    assert pinned.exists() and used.exists() and recent.exists() and new.exists()
+
+    index = json.loads(Path(cache_dir, 'cache-index.json').read_text())
+    assert 'Terraform 1.3.0' not in index['releases']
+    assert index['stats']['hits'] == 1
+    assert index['stats']['misses'] == 1
+    assert index['stats']['evictions'] == 1
+    assert index['stats']['evicted_bytes'] > MiB
+
+    assert 'Evicted Terraform 1.3.0 from the bin cache' in capsys.readouterr().out
+
+
+def test_evict_until_under_limit(tmp_path, monkeypatch):
+    monkeypatch.setenv('TERRAFORM_BIN_CACHE_MIN_AGE', '60')
+    cache_dir = Path(tmp_path, 'cache')
+
+    releases = [add_release(cache_dir, cache_dir, Version(f'1.{minor}.0', 'OpenTofu'), MiB, 1000 - minor) for minor in range(5)]
+    add_release(cache_dir, cache_dir, Version('1.9.0', 'OpenTofu'), MiB, 0)
+
+    BinCache(cache_dir, 5 * MiB).record(Version('1.9.0', 'OpenTofu'), hit=False)
+
+    assert [release.exists() for release in releases] == [False, False, False, False, True]
+
+
+def test_only_last_cache_dir_evicted(tmp_path, monkeypatch):
+    monkeypatch.setenv('TERRAFORM_BIN_CACHE_MIN_AGE', '0')
+    baked_dir = Path(tmp_path, 'baked')
+    cache_dir = Path(tmp_path, 'cache')
+
+    # Releases baked into the image, with their checksums
+    baked = [add_release(baked_dir, baked_dir, Version(f'1.{minor}.0'), MiB, 1000) for minor in range(3)]
+    cached = add_release(cache_dir, baked_dir, Version('1.3.0'), MiB, 1000)
+    add_release(cache_dir, baked_dir, Version('1.4.0'), MiB, 0)
+
+    BinCache(cache_dir, 3 * MiB).record(Version('1.4.0'), hit=False)
+
+    assert not cached.exists()
+    assert all(release.exists() for release in baked)
+    assert len(list(baked_dir.glob('terraform_*.zip'))) == 3
+    assert len(list(baked_dir.glob('terraform_*_SHA256SUMS'))) == 5
+
+
+def test_hit_does_not_evict(tmp_path, monkeypatch):
+    monkeypatch.setenv('TERRAFORM_BIN_CACHE_MIN_AGE', '0')
+    cache_dir = Path(tmp_path, 'cache')
+
+    old = add_release(cache_dir, cache_dir, Version('1.3.0'), MiB, 1000)
+    BinCache(cache_dir, MiB).record(Version('1.5.0'), hit=True)
+
+    assert old.exists()
+
+
+def test_record_use_without_limit(tmp_path, monkeypatch):
+    monkeypatch.delenv('TERRAFORM_BIN_CACHE_MAX_SIZE', raising=False)
+
+    record_use(Version('1.5.7'), Path(tmp_path, 'cache'), hit=False)
+
+    assert not Path(tmp_path, 'cache').exists()
@@ -0,0 +1,69 @@
+import itertools
+
+import pytest
+
+from terraform.constraint_set import ConstraintSet
+from terraform.versions import Constraint, Version
+
+VERSIONS = sorted(
+    Version(f'{major}.{minor}.{patch}{pre_release}')
+    for major in range(3)
+    for minor in range(4)
+    for patch in range(4)
+    for pre_release in ['', '-alpha1', '-beta2', '-rc1']
+)
+
+CONSTRAINTS = [
+    Constraint(f'{operator}{version}')
+    for operator in ['', '=', '!=', '>', '>=', '<', '<=', '~>']
+    for version in ['1', '1.2', '1.2.0', '1.2.3', '1.2.3-beta2', '0.0.0', '2.3.3', '0.1-alpha1']
+]
+
+
+@pytest.mark.parametrize('constraint', CONSTRAINTS, ids=str)
+def test_matches_is_allowed(constraint):
+    allowed = ConstraintSet([constraint])
+    expected = [version for version in VERSIONS if constraint.is_allowed(version)]
+
+    assert [version for version in VERSIONS if allowed.is_allowed(version)] == expected
+    assert allowed.select(VERSIONS) == expected
+
+
+def test_intersection_matches_is_allowed():
+    for a, b in itertools.combinations(CONSTRAINTS[::3], 2):
+        expected = [version for version in VERSIONS if a.is_allowed(version) and b.is_allowed(version)]
+
+        assert (ConstraintSet([a]) & ConstraintSet([b])).select(VERSIONS) == expected, (a, b)
+        assert ConstraintSet([a, b]).apply(reversed(VERSIONS)) == list(reversed(expected)), (a, b)
+
+
+def test_no_constraints():
+    assert ConstraintSet().select(VERSIONS) == VERSIONS
+    assert ConstraintSet().is_allowed(Version('1.0.0-alpha1'))
+
+
+def test_pessimistic():
+    allowed = ConstraintSet([Constraint('~>1.2')])
+    assert allowed.releases == [((1, 2, 0), (2, 0, 0))]
+
+    allowed = ConstraintSet([Constraint('~>1.2.3')])
+    assert allowed.releases == [((1, 2, 3), (1, 3, 0))]
+
+
+def test_empty():
+    allowed = ConstraintSet([Constraint('>=1.5.0'), Constraint('<1.0.0')])
+    assert not allowed
+    assert allowed.select(VERSIONS) == []
+
+    assert ConstraintSet([Constraint('1.0.0')])
+    assert not ConstraintSet([Constraint('1.0.0-beta1'), Constraint('1.0.0-beta2')])
+
+
+def test_explain():
+    allowed = ConstraintSet([Constraint('>=0.12.0'), Constraint('<1.6.0'), Constraint('!=1.5.2')])
+
+    assert allowed.explain(Version('1.5.1')) is None
+    assert allowed.explain(Version('0.11.0')) == Constraint('>=0.12.0')
+    assert allowed.explain(Version('1.6.0')) == Constraint('<1.6.0')
+    assert allowed.explain(Version('1.5.2')) == Constraint('!=1.5.2')
+    assert allowed.explain(Version('1.5.1-rc1')) == Constraint('>=0.12.0')
@@ -0,0 +1,320 @@
+import hashlib
+import re
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+import requests
+
+import terraform.download
+from terraform.download import download_archive, download_file, DownloadError, file_sha256, get_arch, get_platform, mirror_urls, read_checksum
+from terraform.versions import Version
+
+ARCHIVE = bytes(range(256)) * 8192
+ARCHIVE_SHA256 = hashlib.sha256(ARCHIVE).hexdigest()
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Serves files from a dict, with support for Range requests.
+
+    Responses can be cut short by adding the path to interrupt, with the number of bytes to send.
+    """
+
+    files: dict[str, bytes] = {}
+    interrupt: dict[str, list[int]] = {}
+    ranges = True
+    requests: list[tuple[str, str, str]] = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def _headers(self) -> tuple[int, bytes]:
+        self.requests.append((self.command, self.path, self.headers.get('Range', '')))
+
+        if self.path not in self.files:
+            self.send_error(404)
+            return 404, b''
+
+        body = self.files[self.path]
+        status = 200
+        headers = {}
+
+        if self.ranges:
+            headers['Accept-Ranges'] = 'bytes'
+
+            if match := re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', '')):
+                start = int(match.group(1))
+                end = int(match.group(2)) + 1 if match.group(2) else len(body)
+
+                if start >= len(body):
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{len(body)}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return 416, b''
+
+                headers['Content-Range'] = f'bytes {start}-{end - 1}/{len(body)}'
+                body = body[start:end]
+                status = 206
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        return status, body
+
+    def do_HEAD(self):
+        self._headers()
+
+    def do_GET(self):
+        status, body = self._headers()
+
+        if self.interrupt.get(self.path):
+            # Promise the whole body, but close the connection early
+            self.wfile.write(body[:self.interrupt[self.path].pop(0)])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def unreachable():
+    """A url that nothing is listening on"""
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+
+    return f'http://127.0.0.1:{port}'
+
+
+@pytest.fixture
+def server(monkeypatch):
+    Handler.files = {'/terraform.zip': ARCHIVE}
+    Handler.interrupt = {}
+    Handler.ranges = True
+    Handler.requests = []
+
+    monkeypatch.setattr(terraform.download, '_backoff', lambda attempt: None)
+    monkeypatch.delenv('TERRAFORM_DOWNLOAD_CONNECTIONS', raising=False)
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download_file(server, tmp_path):
+    path = Path(tmp_path, 'cache', 'terraform.zip')
+
+    assert download_file(f'{server}/terraform.zip', path, ARCHIVE_SHA256) == ARCHIVE_SHA256
+    assert path.read_bytes() == ARCHIVE
+    assert file_sha256(path) == ARCHIVE_SHA256
+    assert list(path.parent.iterdir()) == [path]
+
+
+def test_download_file_mismatch(server, tmp_path):
+    path = Path(tmp_path, 'terraform.zip')
+
+    with pytest.raises(DownloadError):
+        download_file(f'{server}/terraform.zip', path, '0' * 64)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_file_not_found(server, tmp_path):
+    with pytest.raises(requests.HTTPError) as excinfo:
+        download_file(f'{server}/missing.zip', Path(tmp_path, 'missing.zip'))
+
+    assert excinfo.value.response.status_code == 404
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_file_resumed(server, tmp_path):
+    Handler.interrupt['/terraform.zip'] = [100000, 50000]
+    path = Path(tmp_path, 'terraform.zip')
+
+    assert download_file(f'{server}/terraform.zip', path, ARCHIVE_SHA256) == ARCHIVE_SHA256
+    assert path.read_bytes() == ARCHIVE
+
+    # Each request resumes from what was received
+    assert [r[2] for r in Handler.requests] == ['', 'bytes=65536-', 'bytes=65536-']
+
+
+def test_download_file_resumed_later(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(terraform.download, 'RETRIES', 0)
+    Handler.interrupt['/terraform.zip'] = [100000]
+    path = Path(tmp_path, 'terraform.zip')
+
+    with pytest.raises(requests.RequestException):
+        download_file(f'{server}/terraform.zip', path, ARCHIVE_SHA256)
+
+    # Only the part file is left
+    assert not path.exists()
+    assert Path(tmp_path, '.terraform.zip.part').read_bytes() == ARCHIVE[:65536]
+
+    assert download_file(f'{server}/terraform.zip', path, ARCHIVE_SHA256) == ARCHIVE_SHA256
+    assert path.read_bytes() == ARCHIVE
+    assert list(tmp_path.iterdir()) == [path]
+    assert Handler.requests[-1][2] == 'bytes=65536-'
+
+
+def test_download_file_complete_part(server, tmp_path):
+    Path(tmp_path, '.terraform.zip.part').write_bytes(ARCHIVE)
+    path = Path(tmp_path, 'terraform.zip')
+
+    assert download_file(f'{server}/terraform.zip', path, ARCHIVE_SHA256) == ARCHIVE_SHA256
+    assert path.read_bytes() == ARCHIVE
+
+
+def test_download_file_no_ranges(server, tmp_path):
+    Handler.ranges = False
+    Handler.interrupt['/terraform.zip'] = [100000]
+    path = Path(tmp_path, 'terraform.zip')
+
+    assert download_file(f'{server}/terraform.zip', path, ARCHIVE_SHA256) == ARCHIVE_SHA256
+    assert path.read_bytes() == ARCHIVE
+
+
+def test_download_file_bad_part(server, tmp_path):
+    # A part file that doesn't match the file being downloaded is caught by the checksum
+    Path(tmp_path, '.terraform.zip.part').write_bytes(b'x' * 1000)
+    path = Path(tmp_path, 'terraform.zip')
+
+    with pytest.raises(DownloadError):
+        download_file(f'{server}/terraform.zip', path, ARCHIVE_SHA256)
+
+    assert list(tmp_path.iterdir()) == []
+
+    assert download_file(f'{server}/terraform.zip', path, ARCHIVE_SHA256) == ARCHIVE_SHA256
+
+
+def test_download_file_parallel(server, tmp_path, monkeypatch):
+    monkeypatch.setenv('TERRAFORM_DOWNLOAD_CONNECTIONS', '4')
+    monkeypatch.setenv('TERRAFORM_DOWNLOAD_PARALLEL_THRESHOLD', '1')
+    path = Path(tmp_path, 'terraform.zip')
+
+    assert download_file(f'{server}/terraform.zip', path, ARCHIVE_SHA256) == ARCHIVE_SHA256
+    assert path.read_bytes() == ARCHIVE
+
+    ranges = sorted(r[2] for r in Handler.requests if r[0] == 'GET')
+    assert ranges == ['bytes=0-524287', 'bytes=1048576-1572863', 'bytes=1572864-2097151', 'bytes=524288-1048575']
+
+
+def test_download_file_parallel_interrupted(server, tmp_path, monkeypatch):
+    monkeypatch.setenv('TERRAFORM_DOWNLOAD_CONNECTIONS', '2')
+    monkeypatch.setenv('TERRAFORM_DOWNLOAD_PARALLEL_THRESHOLD', '1')
+    Handler.interrupt['/terraform.zip'] = [1000, 2000]
+    path = Path(tmp_path, 'terraform.zip')
+
+    assert download_file(f'{server}/terraform.zip', path, ARCHIVE_SHA256) == ARCHIVE_SHA256
+    assert path.read_bytes() == ARCHIVE
+
+
+def test_download_file_parallel_unsupported(server, tmp_path, monkeypatch):
+    monkeypatch.setenv('TERRAFORM_DOWNLOAD_CONNECTIONS', '4')
+    monkeypatch.setenv('TERRAFORM_DOWNLOAD_PARALLEL_THRESHOLD', '1')
+    Handler.ranges = False
+    path = Path(tmp_path, 'terraform.zip')
+
+    assert download_file(f'{server}/terraform.zip', path, ARCHIVE_SHA256) == ARCHIVE_SHA256
+    assert [r[2] for r in Handler.requests if r[0] == 'GET'] == ['']
+
+
+def test_mirror_urls(monkeypatch):
+    monkeypatch.delenv('TERRAFORM_DOWNLOAD_MIRRORS', raising=False)
+    monkeypatch.delenv('TERRAFORM_DOWNLOAD_MIRROR_FALLBACK', raising=False)
+
+    assert mirror_urls('TERRAFORM_DOWNLOAD_MIRRORS', 'https://releases.hashicorp.com/terraform', '1.5.7/terraform_1.5.7_SHA256SUMS') == [
+        'https://releases.hashicorp.com/terraform/1.5.7/terraform_1.5.7_SHA256SUMS'
+    ]
+
+    monkeypatch.setenv('TERRAFORM_DOWNLOAD_MIRRORS', 'http://mirror-a/terraform/, http://mirror-b/terraform')
+    assert mirror_urls('TERRAFORM_DOWNLOAD_MIRRORS', 'https://releases.hashicorp.com/terraform', '1.5.7/terraform_1.5.7_SHA256SUMS') == [
+        'http://mirror-a/terraform/1.5.7/terraform_1.5.7_SHA256SUMS',
+        'http://mirror-b/terraform/1.5.7/terraform_1.5.7_SHA256SUMS',
+        'https://releases.hashicorp.com/terraform/1.5.7/terraform_1.5.7_SHA256SUMS',
+    ]
+
+    monkeypatch.setenv('TERRAFORM_DOWNLOAD_MIRROR_FALLBACK', 'false')
+    assert mirror_urls('TERRAFORM_DOWNLOAD_MIRRORS', 'https://releases.hashicorp.com/terraform', '1.5.7/terraform_1.5.7_SHA256SUMS') == [
+        'http://mirror-a/terraform/1.5.7/terraform_1.5.7_SHA256SUMS',
+        'http://mirror-b/terraform/1.5.7/terraform_1.5.7_SHA256SUMS',
+    ]
+
+
+def test_download_file_mirrors(server, unreachable, tmp_path):
+    Handler.files['/bad/terraform.zip'] = b'not the archive'
+    path = Path(tmp_path, 'terraform.zip')
+
+    urls = [f'{unreachable}/terraform.zip', f'{server}/missing/terraform.zip', f'{server}/bad/terraform.zip', f'{server}/terraform.zip']
+    assert download_file(urls, path, ARCHIVE_SHA256) == ARCHIVE_SHA256
+    assert path.read_bytes() == ARCHIVE
+    assert list(tmp_path.iterdir()) == [path]
+
+    assert [r[1] for r in Handler.requests] == ['/missing/terraform.zip', '/bad/terraform.zip', '/terraform.zip']
+
+
+def test_download_file_mirror_interrupted(server, tmp_path):
+    Handler.files['/mirror/terraform.zip'] = ARCHIVE
+    Handler.interrupt['/mirror/terraform.zip'] = [100000]
+    path = Path(tmp_path, 'terraform.zip')
+
+    assert download_file([f'{server}/mirror/terraform.zip', f'{server}/terraform.zip'], path, ARCHIVE_SHA256) == ARCHIVE_SHA256
+    assert path.read_bytes() == ARCHIVE
+
+    # The mirror isn't retried, and the next url starts from the beginning
+    assert Handler.requests == [('GET', '/mirror/terraform.zip', ''), ('GET', '/terraform.zip', '')]
+
+
+def test_download_file_all_mirrors_fail(server, unreachable, tmp_path):
+    with pytest.raises(requests.HTTPError):
+        download_file([f'{unreachable}/terraform.zip', f'{server}/missing/terraform.zip'], Path(tmp_path, 'terraform.zip'), ARCHIVE_SHA256)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_file_unreachable(unreachable, tmp_path, monkeypatch):
+    monkeypatch.setattr(terraform.download, '_backoff', lambda attempt: None)
+
+    with pytest.raises(requests.ConnectionError):
+        download_file(f'{unreachable}/terraform.zip', Path(tmp_path, 'terraform.zip'), ARCHIVE_SHA256)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_archive_from_mirror(server, unreachable, tmp_path, monkeypatch):
+    archive_name = f'terraform_1.5.7_{get_platform()}_{get_arch()}.zip'
+    Handler.files[f'/terraform/1.5.7/{archive_name}'] = ARCHIVE
+
+    monkeypatch.setenv('TERRAFORM_DOWNLOAD_MIRRORS', f'{unreachable}/terraform {server}/terraform')
+    monkeypatch.setenv('TERRAFORM_DOWNLOAD_MIRROR_FALLBACK', 'false')
+
+    assert download_archive(Version('1.5.7'), tmp_path, ARCHIVE_SHA256) == (tmp_path, archive_name)
+    assert Path(tmp_path, archive_name).read_bytes() == ARCHIVE
+
+    with pytest.raises(DownloadError):
+        download_archive(Version('1.5.8'), tmp_path, ARCHIVE_SHA256)
+
+
+def test_read_checksum(tmp_path):
+    checksums_path = Path(tmp_path, 'terraform_1.5.7_SHA256SUMS')
+    checksums_path.write_text(
+        'aaaa  terraform_1.5.7_linux_amd64.zip\n'
+        'BBBB *terraform_1.5.7_linux_arm64.zip\n'
+        'cccc  terraform_1.5.7_linux_amd64.zip.sig\n'
+    )
+
+    assert read_checksum(checksums_path, 'terraform_1.5.7_linux_amd64.zip') == 'aaaa'
+    assert read_checksum(checksums_path, 'terraform_1.5.7_linux_arm64.zip') == 'bbbb'
+
+    with pytest.raises(RuntimeError):
+        read_checksum(checksums_path, 'terraform_1.5.7_darwin_amd64.zip')
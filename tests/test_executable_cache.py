@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from zipfile import ZipFile
+
+import pytest
+
+import terraform.download
+from terraform.download import get_arch, get_executable, get_platform
+from terraform.executable_cache import CachedExecutable, find_executable, Manifest
+from terraform.versions import Version
+
+EXECUTABLE = b'#!/bin/sh\necho "Terraform v1.5.7"\n'
+
+
+def make_archive(path: Path) -> str:
+    with ZipFile(path, 'w') as f:
+        f.writestr('terraform', EXECUTABLE)
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def test_extract(tmp_path):
+    archive_sha256 = make_archive(Path(tmp_path, 'terraform.zip'))
+    executable = CachedExecutable(Path(tmp_path, 'cache'), 'terraform', Version('1.5.7'), 'linux_amd64', archive_sha256)
+
+    assert not executable.is_valid()
+
+    path = executable.extract(Path(tmp_path, 'terraform.zip'))
+    assert path == executable.path
+    assert path.read_bytes() == EXECUTABLE
+    assert os.access(path, os.X_OK)
+    assert executable.is_valid()
+
+    # Only the entry and the manifest are left in the cache
+    assert sorted(p.name for p in Path(tmp_path, 'cache', 'bin').iterdir()) == ['.manifest.json.lock', 'manifest.json', executable.dir.name]
+    assert Manifest(Path(tmp_path, 'cache')).entries() == {
+        executable.dir.name: {'product': 'Terraform', 'version': '1.5.7', 'platform': 'linux_amd64', 'archive_sha256': archive_sha256}
+    }
+
+    # Another archive digest is a different entry
+    assert not CachedExecutable(Path(tmp_path, 'cache'), 'terraform', Version('1.5.7'), 'linux_amd64', '0' * 64).is_valid()
+
+
+def test_modified(tmp_path):
+    archive_sha256 = make_archive(Path(tmp_path, 'terraform.zip'))
+    executable = CachedExecutable(Path(tmp_path, 'cache'), 'terraform', Version('1.5.7'), 'linux_amd64', archive_sha256)
+    executable.extract(Path(tmp_path, 'terraform.zip'))
+
+    executable.path.write_bytes(b'#!/bin/sh\necho "Terraform v9.9.9"\n')
+    assert not executable.is_valid()
+
+    # It is replaced by extracting again
+    executable.extract(Path(tmp_path, 'terraform.zip'))
+    assert executable.path.read_bytes() == EXECUTABLE
+    assert executable.is_valid()
+
+
+def test_restamp(tmp_path):
+    archive_sha256 = make_archive(Path(tmp_path, 'terraform.zip'))
+    executable = CachedExecutable(Path(tmp_path, 'cache'), 'terraform', Version('1.5.7'), 'linux_amd64', archive_sha256)
+    executable.extract(Path(tmp_path, 'terraform.zip'))
+
+    stamp = json.loads(executable.stamp_path.read_text())
+
+    # e.g. chown changes the ctime, but not the content
+    os.utime(executable.path, ns=(0, 0))
+    assert executable.is_valid()
+
+    restamped = json.loads(executable.stamp_path.read_text())
+    assert restamped['mtime_ns'] == 0
+    assert restamped['sha256'] == stamp['sha256']
+    assert executable.is_valid()
+
+
+def test_bad_stamp(tmp_path):
+    archive_sha256 = make_archive(Path(tmp_path, 'terraform.zip'))
+    executable = CachedExecutable(Path(tmp_path, 'cache'), 'terraform', Version('1.5.7'), 'linux_amd64', archive_sha256)
+    executable.extract(Path(tmp_path, 'terraform.zip'))
+
+    executable.stamp_path.write_text('not json')
+    assert not executable.is_valid()
+
+    executable.stamp_path.unlink()
+    assert not executable.is_valid()
+
+
+def test_planted_executable(tmp_path):
+    archive_sha256 = make_archive(Path(tmp_path, 'terraform.zip'))
+    executable = CachedExecutable(Path(tmp_path, 'cache'), 'terraform', Version('1.5.7'), 'linux_amd64', archive_sha256)
+    executable.extract(Path(tmp_path, 'terraform.zip'))
+
+    # Someone with write access to the cache dir replaces the executable and makes a matching stamp
+    executable.path.write_bytes(b'#!/bin/sh\necho "Not terraform"\n')
+    stamp = json.loads(executable.stamp_path.read_text())
+    stamp |= {
+        'sha256': hashlib.sha256(executable.path.read_bytes()).hexdigest(),
+        'ino': executable.path.stat().st_ino,
+        'size': executable.path.stat().st_size,
+        'mtime_ns': executable.path.stat().st_mtime_ns,
+        'ctime_ns': executable.path.stat().st_ctime_ns,
+    }
+    executable.stamp_path.write_text(json.dumps(stamp))
+
+    assert not executable.is_valid()
+
+    del stamp['mac']
+    executable.stamp_path.write_text(json.dumps(stamp))
+    assert not executable.is_valid()
+
+
+def test_stamp_from_another_key(tmp_path, monkeypatch):
+    archive_sha256 = make_archive(Path(tmp_path, 'terraform.zip'))
+    executable = CachedExecutable(Path(tmp_path, 'cache'), 'terraform', Version('1.5.7'), 'linux_amd64', archive_sha256)
+
+    monkeypatch.setenv('TERRAFORM_SIGNATURE_LEDGER_DIR', str(Path(tmp_path, 'job1')))
+    executable.extract(Path(tmp_path, 'terraform.zip'))
+    assert executable.is_valid()
+
+    monkeypatch.setenv('TERRAFORM_SIGNATURE_LEDGER_DIR', str(Path(tmp_path, 'job2')))
+    assert not executable.is_valid()
+
+    # It is extracted again from the archive
+    executable.extract(Path(tmp_path, 'terraform.zip'))
+    assert executable.is_valid()
+
+
+@pytest.fixture
+def bin_dirs(tmp_path, monkeypatch):
+    cache_dir = Path(tmp_path, 'cache')
+    cache_dir.mkdir()
+    archive_name = f'terraform_1.5.7_{get_platform()}_{get_arch()}.zip'
+    archive_sha256 = make_archive(Path(cache_dir, archive_name))
+
+    checksums_path = Path(tmp_path, 'terraform_1.5.7_SHA256SUMS')
+    checksums_path.write_text(f'{archive_sha256}  {archive_name}\n')
+
+    monkeypatch.setattr(terraform.download, 'get_checksums', lambda version, checksum_dir: checksums_path)
+    monkeypatch.setenv('TERRAFORM_BIN_CACHE_DIR', str(cache_dir))
+    monkeypatch.setenv('TERRAFORM_BIN_CHECKSUM_DIR', str(tmp_path))
+
+    return cache_dir, archive_name
+
+
+def test_get_executable(bin_dirs):
+    cache_dir, archive_name = bin_dirs
+
+    path = get_executable(Version('1.5.7'))
+    assert path.read_bytes() == EXECUTABLE
+
+    # The cached executable is used without the archive
+    Path(cache_dir, archive_name).unlink()
+    assert get_executable(Version('1.5.7')) == path
+
+
+def test_get_executable_modified(bin_dirs):
+    path = get_executable(Version('1.5.7'))
+    path.write_bytes(b'#!/bin/sh\necho "Terraform v9.9.9"\n')
+
+    assert get_executable(Version('1.5.7')).read_bytes() == EXECUTABLE
+
+
+def test_find_executable(tmp_path):
+    archive_sha256 = make_archive(Path(tmp_path, 'terraform.zip'))
+    cache_dirs = [Path(tmp_path, 'image'), Path(tmp_path, 'job')]
+
+    assert find_executable(cache_dirs, 'terraform', Version('1.5.7'), 'linux_amd64', archive_sha256) is None
+
+    path = CachedExecutable(cache_dirs[1], 'terraform', Version('1.5.7'), 'linux_amd64', archive_sha256).extract(Path(tmp_path, 'terraform.zip'))
+    assert find_executable(cache_dirs, 'terraform', Version('1.5.7'), 'linux_amd64', archive_sha256) == path
+
+    # An executable that isn't in the manifest of its cache dir isn't looked for
+    Manifest(cache_dirs[1]).path.write_text('{}')
+    assert find_executable(cache_dirs, 'terraform', Version('1.5.7'), 'linux_amd64', archive_sha256) is None
+
+    # Without a manifest the cache dir is probed
+    Manifest(cache_dirs[1]).path.unlink()
+    assert find_executable(cache_dirs, 'terraform', Version('1.5.7'), 'linux_amd64', archive_sha256) == path
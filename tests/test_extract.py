@@ -0,0 +1,87 @@
+from pathlib import Path
+
+import hcl2
+import pytest
+
+from terraform.extract import extract_blocks
+
+BLOCK_TYPES = {'terraform', 'variable', 'module'}
+
+
+def test_extract_blocks():
+    tf = '''
+# A comment with a { brace
+terraform {
+  required_version = "~> 1.0"
+  backend "s3" {
+    bucket = "my-bucket"
+  }
+}
+
+/* a comment
+resource "x" "y" {
+*/
+
+resource "aws_instance" "web" {
+  user_data = <<-EOF
+    #!/bin/bash
+    echo "}}} ${var.name}"
+  EOF
+
+  tags = {
+    "Name" = "web-${join("}", [for s in var.list : "${s}{"])}"
+    Escaped = "\\"}"
+    Literal = "$${not_an_interpolation"
+  }
+}
+
+// line comment }
+variable "secret" {
+  type      = string
+  sensitive = true
+}
+
+locals {
+  x = { a = "}" }
+}
+
+module "child" { source = "./child" }
+'''
+
+    assert hcl2.loads(extract_blocks(tf, BLOCK_TYPES)) == {
+        'terraform': [{'required_version': '~> 1.0', 'backend': [{'s3': {'bucket': 'my-bucket'}}]}],
+        'variable': [{'secret': {'type': 'string', 'sensitive': True}}],
+        'module': [{'child': {'source': './child'}}]
+    }
+
+
+def test_extract_nothing():
+    assert hcl2.loads(extract_blocks('resource "a" "b" {\n}\n', BLOCK_TYPES)) == {}
+
+
+@pytest.mark.parametrize('tf', [
+    'variable "x" {',
+    'variable "x" { default = "}',
+    'variable "x" {}\n}',
+    'x = 1',
+    'variable "x" {\n  default = <<EOF\nunterminated\n}\n',
+])
+def test_extract_invalid(tf):
+    with pytest.raises(ValueError):
+        extract_blocks(tf, BLOCK_TYPES)
+
+
+def test_extract_matches_full_parse():
+    checked = 0
+
+    for path in Path(__file__).parent.rglob('*.tf'):
+        try:
+            full = hcl2.loads(path.read_text())
+        except Exception:
+            continue
+
+        expected = {k: v for k, v in full.items() if k in BLOCK_TYPES}
+        assert hcl2.loads(extract_blocks(path.read_text(), BLOCK_TYPES)) == expected, path
+        checked += 1
+
+    assert checked > 0
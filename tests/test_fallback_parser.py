@@ -0,0 +1,92 @@
+from terraform.fallback_parser import scan
+
+
+def test_scan():
+    tf = '''
+terraform {
+  required_version = ">= 1.0, < 2"
+  backend "remote" {
+    hostname     = "app.terraform.io" # comment {
+    organization = "org"
+    workspaces { prefix = "ws-" }
+  }
+}
+
+variable "secret" {
+  type      = string
+  sensitive = true
+}
+
+variable not_secret {
+  default = "}"
+}
+
+output "o" {
+  sensitive = true
+  value     = <<EOF
+}}}
+EOF
+}
+
+variable "also_secret" { sensitive = "TRUE" }
+
+resource "x" "y" {
+  tags = {
+    sensitive = true
+  }
+}
+'''
+
+    assert scan(tf) == {
+        'terraform': [
+            {'required_version': '>= 1.0, < 2'},
+            {'backend': [{'remote': {'hostname': 'app.terraform.io', 'organization': 'org', 'workspaces': [{'prefix': 'ws-'}]}}]}
+        ],
+        'variable': [
+            {'secret': {'sensitive': True}},
+            {'also_secret': {'sensitive': True}}
+        ]
+    }
+
+
+def test_scan_cloud():
+    tf = '''
+terraform {
+  cloud {
+    organization = "org"
+    hostname = var.hostname
+
+    workspaces {
+      tags = ["a", "b"]
+    }
+  }
+}
+'''
+
+    assert scan(tf) == {
+        'terraform': [
+            {'cloud': [{'organization': 'org', 'hostname': '${var.hostname}', 'workspaces': [{'tags': ['a', 'b']}]}]}
+        ]
+    }
+
+
+def test_scan_backend_type():
+    assert scan('terraform {\n  backend s3 {}\n}\n') == {'terraform': [{'backend': [{'s3': {}}]}]}
+    assert scan('resource "a" "b" {\n  x = 1\n}\n') == {}
+
+
+def test_scan_nested_blocks_on_one_line():
+    assert scan('terraform { backend "s3" {} }\n') == {'terraform': [{'backend': [{'s3': {}}]}]}
+    assert scan('terraform { backend "s3" { bucket = "b" } }\n') == {'terraform': [{'backend': [{'s3': {'bucket': 'b'}}]}]}
+    assert scan('terraform { cloud { workspaces { name = "ws" } } }\n') == {'terraform': [{'cloud': [{'workspaces': [{'name': 'ws'}]}]}]}
+
+
+def test_scan_values():
+    def backend_config(body):
+        return scan(f'terraform {{\n  backend "s3" {{\n{body}\n  }}\n}}\n')['terraform'][0]['backend'][0]['s3']
+
+    assert backend_config('tags = ["a, b", "c"]\nsizes = [1, 2.5, true,]\nempty = []') == {'tags': ['a, b', 'c'], 'sizes': [1, 2.5, True], 'empty': []}
+    assert backend_config('bucket = var.bucket\nkey = format("%s", local.key)') == {'bucket': '${var.bucket}', 'key': '${format("%s", local.key)}'}
+
+    # Values that can't be represented are left out
+    assert backend_config('tags = [\n  "a",\n]\nrefs = [var.a]\nkey = format(\n  "%s", local.key\n)') == {}
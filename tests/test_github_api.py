@@ -73,3 +73,58 @@ def test_client_error_with_rate_limit_remaining(capsys):
     response = github.get('/repos/opentofu/opentofu/releases')
 
     assert response.status_code == 404
+
+
+def paged_response(url, items, links):
+    response = fake_response(status=200, url=url)
+    response._content = json.dumps(items).encode()
+    response.headers['Link'] = ', '.join(f'<{link}>; rel="{rel}"' for rel, link in links.items())
+    return response
+
+
+def test_parallel_paged_get(monkeypatch):
+    pages = {
+        page: paged_response(f'{RELEASES_URL}?per_page=2&page={page}', [{'id': page * 2}, {'id': page * 2 + 1}], {
+            'next': f'{RELEASES_URL}?per_page=2&page={page + 1}',
+            'last': f'{RELEASES_URL}?per_page=2&page=4'
+        }) for page in range(1, 5)
+    }
+
+    requested = []
+    sessions = {}
+
+    def request(session, method, url, **kwargs):
+        requested.append(url)
+        sessions[url] = session
+        assert session.headers['authorization'] == 'token token'
+
+        if url == RELEASES_URL:
+            assert kwargs['params'] == {'per_page': 2}
+            return pages[1]
+
+        assert 'params' not in kwargs
+        return pages[int(url.rsplit('page=', 1)[1])]
+
+    monkeypatch.setattr(requests.Session, 'request', request)
+    github = GithubApi('https://api.github.com', 'token')
+
+    items = github.parallel_paged_get('/repos/opentofu/opentofu/releases', params={'per_page': 2})
+
+    assert [item['id'] for item in items] == [2, 3, 4, 5, 6, 7, 8, 9]
+    assert sorted(requested[1:]) == [f'{RELEASES_URL}?per_page=2&page={page}' for page in range(2, 5)]
+
+    # The worker threads don't share the client's session
+    assert sessions[RELEASES_URL] is github._session
+    assert all(session is not github._session for url, session in sessions.items() if url != RELEASES_URL)
+
+
+def test_parallel_paged_get_without_last():
+    responses = {
+        RELEASES_URL: paged_response(RELEASES_URL, [{'id': 1}], {'next': f'{RELEASES_URL}?after=abc'}),
+        f'{RELEASES_URL}?after=abc': paged_response(f'{RELEASES_URL}?after=abc', [{'id': 2}], {}),
+    }
+
+    github = GithubApi('https://api.github.com', 'token')
+    github._session.request = lambda method, url, **kwargs: responses[url]
+
+    assert github.parallel_paged_get('/repos/opentofu/opentofu/releases') == [{'id': 1}, {'id': 2}]
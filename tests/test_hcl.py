@@ -0,0 +1,172 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import terraform.hcl
+from terraform.hcl import ParseWorker, ParseTimeout, load, load_all, load_file, loads
+
+
+def test_load(tmp_path):
+    path = Path(tmp_path, 'main.tf')
+    path.write_text('''
+terraform {
+  required_version = ">=1.0.0"
+}
+''')
+
+    assert load(path) == {'terraform': [{'required_version': '>=1.0.0'}]}
+
+
+def test_worker_is_reused(tmp_path):
+    worker = ParseWorker()
+
+    try:
+        for i in range(3):
+            path = Path(tmp_path, f'{i}.tf')
+            path.write_text(f'variable "v{i}" {{}}')
+            assert worker.parse(path) == ({'variable': [{f'v{i}': {}}]}, 'hcl2')
+
+        pid = worker._process.pid
+
+        assert worker.parse(Path(tmp_path, '0.tf')) == ({'variable': [{'v0': {}}]}, 'hcl2')
+        assert worker._process.pid == pid
+    finally:
+        worker.stop()
+
+
+def test_worker_timeout(tmp_path, monkeypatch):
+    def hang(path, block_types=None):
+        time.sleep(60)
+
+    monkeypatch.setattr(terraform.hcl, '_try_load', hang)
+
+    path = Path(tmp_path, 'main.tf')
+    path.write_text('')
+
+    worker = ParseWorker()
+    try:
+        with pytest.raises(ParseTimeout):
+            worker.parse(path, timeout=0.5)
+
+        assert worker._process is None
+    finally:
+        worker.stop()
+
+
+def test_load_all(tmp_path):
+    paths = []
+    for i in range(10):
+        path = Path(tmp_path, f'{i}.tf')
+        path.write_text(f'variable "v{i}" {{}}')
+        paths.append(path)
+
+    results = load_all(paths, workers=3)
+    assert [result.module for result in results] == [{'variable': [{f'v{i}': {}}]} for i in range(10)]
+    assert [result.path for result in results] == paths
+    assert all(result.parser == 'hcl2' for result in results)
+
+
+def test_load_all_timeout(tmp_path, monkeypatch):
+    try_load = terraform.hcl._try_load
+
+    def hang(path, block_types=None):
+        if path.name == 'hang.tf':
+            time.sleep(60)
+        return try_load(path, block_types)
+
+    monkeypatch.setattr(terraform.hcl, '_try_load', hang)
+    monkeypatch.setattr(terraform.hcl, 'PARSE_TIMEOUT', 0.5)
+
+    Path(tmp_path, 'hang.tf').write_text('')
+    Path(tmp_path, 'ok.tf').write_text('variable "ok" {}')
+
+    results = load_all([Path(tmp_path, 'hang.tf'), Path(tmp_path, 'ok.tf'), Path(tmp_path, 'ok.tf')], workers=2)
+
+    assert results[0].module is None
+    assert results[0].timed_out
+    assert isinstance(results[0].error, ValueError)
+    assert [result.module for result in results[1:]] == [{'variable': [{'ok': {}}]}] * 2
+    assert not any(result.timed_out for result in results[1:])
+
+
+def test_load_file(tmp_path):
+    path = Path(tmp_path, 'main.tf')
+    path.write_text('variable "hello" {}')
+
+    result = load_file(path)
+    assert result.module == {'variable': [{'hello': {}}]}
+    assert result.parser == 'hcl2'
+    assert not result.timed_out
+    assert result.error is None
+
+    path.write_text('''
+variable "hello" {
+  sensitive = true
+}
+
+resource "x" "y" {
+''')
+
+    result = load_file(path)
+    assert result.module == {'variable': [{'hello': {'sensitive': True}}]}
+    assert result.parser == 'fallback'
+
+
+def test_loads():
+    assert loads('variable "hello" {}') == {'variable': [{'hello': {}}]}
+
+    with pytest.raises(ValueError):
+        loads('variable "hello" {')
+
+
+def test_parse_text_timeout(monkeypatch):
+    def hang(hcl):
+        time.sleep(60)
+
+    monkeypatch.setattr(terraform.hcl, 'try_loads', hang)
+
+    worker = ParseWorker()
+    try:
+        with pytest.raises(ParseTimeout):
+            worker.parse_text('variable "hello" {}', timeout=0.5)
+    finally:
+        worker.stop()
+
+
+def test_worker_died(tmp_path, monkeypatch):
+    def die(path, block_types=None):
+        os._exit(1)
+
+    monkeypatch.setattr(terraform.hcl, '_try_load', die)
+    monkeypatch.setattr(terraform.hcl, '_worker', ParseWorker())
+
+    path = Path(tmp_path, 'main.tf')
+    path.write_text('variable "hello" {\n  sensitive = true\n}\n')
+
+    try:
+        result = load_file(path)
+        assert result.module == {'variable': [{'hello': {'sensitive': True}}]}
+        assert result.parser == 'fallback'
+    finally:
+        terraform.hcl._worker.stop()
+
+
+def test_worker_with_threads(tmp_path):
+    path = Path(tmp_path, 'main.tf')
+    path.write_text('variable "hello" {}')
+
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait, daemon=True)
+    thread.start()
+
+    worker = ParseWorker()
+    try:
+        assert worker._context().get_start_method() != 'fork'
+        assert worker.parse(path) == ({'variable': [{'hello': {}}]}, 'hcl2')
+    finally:
+        worker.stop()
+        stop.set()
+        thread.join()
@@ -0,0 +1,65 @@
+import json
+from pathlib import Path
+
+from terraform.hcl import ParseResult
+from terraform.load_report import LoadReport
+from terraform.module import load_module
+
+
+def test_load_report(tmp_path, monkeypatch):
+    monkeypatch.setenv('STEP_TMP_DIR', str(tmp_path))
+    monkeypatch.setenv('GITHUB_STEP_SUMMARY', str(Path(tmp_path, 'summary.md')))
+    monkeypatch.delenv('JOB_TMP_DIR', raising=False)
+
+    module_dir = Path(tmp_path, 'module')
+    module_dir.mkdir()
+    Path(module_dir, 'main.tf').write_text('variable "hello" {}\n')
+    Path(module_dir, 'broken.tf').write_text('variable "broken" {\n  sensitive = true\n}\nresource "x" "y" {\n')
+
+    load_module(module_dir)
+
+    report = json.loads(Path(tmp_path, 'module_load_report.json').read_text())
+    assert len(report['modules']) == 1
+
+    module = report['modules'][0]
+    assert module['path'] == str(module_dir)
+    assert module['cached'] is False
+
+    files = {Path(file['path']).name: file for file in module['files']}
+    assert files['main.tf']['parser'] == 'hcl2'
+    assert files['main.tf']['size'] == len('variable "hello" {}\n')
+    assert files['broken.tf']['parser'] == 'fallback'
+    assert not any(file['timed_out'] for file in files.values())
+
+    # Loading was quick, so nothing in the step summary
+    assert not Path(tmp_path, 'summary.md').exists()
+
+    load_module(module_dir)
+    report = json.loads(Path(tmp_path, 'module_load_report.json').read_text())
+    assert len(report['modules']) == 2
+
+
+def test_load_report_summary(tmp_path, monkeypatch):
+    monkeypatch.setenv('GITHUB_STEP_SUMMARY', str(Path(tmp_path, 'summary.md')))
+    monkeypatch.delenv('STEP_TMP_DIR', raising=False)
+
+    report = LoadReport(tmp_path)
+    report.add(ParseResult(Path(tmp_path, 'fast.tf'), {}, 'hcl2', 0.01))
+    report.add(ParseResult(Path(tmp_path, 'slow.tf'), None, None, 10.0, timed_out=True, error=ValueError('Unable to load')))
+    report.write()
+
+    summary = Path(tmp_path, 'summary.md').read_text()
+    assert '| `slow.tf` | - | 10.00s | failed | yes |' in summary
+    assert summary.index('slow.tf') < summary.index('fast.tf')
+
+
+def test_load_report_threshold(tmp_path, monkeypatch):
+    monkeypatch.setenv('GITHUB_STEP_SUMMARY', str(Path(tmp_path, 'summary.md')))
+    monkeypatch.setenv('TERRAFORM_PARSE_REPORT_THRESHOLD', '0')
+    monkeypatch.delenv('STEP_TMP_DIR', raising=False)
+    monkeypatch.delenv('JOB_TMP_DIR', raising=False)
+
+    Path(tmp_path, 'main.tf').write_text('variable "hello" {}\n')
+    load_module(tmp_path)
+
+    assert '| `main.tf` |' in Path(tmp_path, 'summary.md').read_text()
@@ -1,7 +1,9 @@
 from pathlib import Path
 
+import terraform.hcl
 from terraform.hcl import loads
-from terraform.module import get_sensitive_variables, files_in_module
+from terraform.module import get_backend_type, get_sensitive_variables, get_version_constraints, files_in_module, load_module, ModuleIndex
+from terraform.versions import Constraint
 
 
 def test_get_sensitive_variables():
@@ -42,3 +44,70 @@ def test_load_tofu_module(monkeypatch):
         'hello.tofu',
         'tofu-only.tofu'
     }
+
+def test_module_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('JOB_TMP_DIR', str(Path(tmp_path, 'job')))
+    module_dir = Path(tmp_path, 'module')
+    module_dir.mkdir()
+    Path(module_dir, 'main.tf').write_text('terraform {\n  required_version = "1.0.0"\n}\n')
+
+    expected = {'terraform': [{'required_version': '1.0.0'}]}
+    assert load_module(module_dir) == expected
+
+    def fail(path, block_types=None):
+        raise AssertionError(f'{path} should not be loaded')
+
+    monkeypatch.setattr(terraform.hcl, 'load_file', fail)
+    assert load_module(module_dir) == expected
+
+    monkeypatch.undo()
+    monkeypatch.setenv('JOB_TMP_DIR', str(Path(tmp_path, 'job')))
+    Path(module_dir, 'main.tf').write_text('terraform {\n  required_version = "2.0.0"\n}\n')
+    assert load_module(module_dir) == {'terraform': [{'required_version': '2.0.0'}]}
+
+    Path(module_dir, 'variables.tf').write_text('variable "hello" {}\n')
+    assert load_module(module_dir) == {'terraform': [{'required_version': '2.0.0'}], 'variable': [{'hello': {}}]}
+
+    monkeypatch.setenv('OPENTOFU', 'true')
+    Path(module_dir, 'main.tofu').write_text('terraform {\n  required_version = "3.0.0"\n}\n')
+    assert load_module(module_dir) == {'terraform': [{'required_version': '3.0.0'}], 'variable': [{'hello': {}}]}
+
+
+def test_module_index():
+    index = ModuleIndex()
+    index.add(loads('''
+terraform {
+  required_version = "not a constraint"
+}
+
+variable "secret" {
+  sensitive = true
+}
+'''))
+
+    assert get_backend_type(index) == 'local'
+    assert get_version_constraints(index) is None
+
+    index.add(loads('''
+terraform {
+  required_version = ">=1.0.0, <2.0.0"
+  backend "s3" {
+    bucket = "state"
+  }
+}
+
+terraform {
+  cloud {}
+}
+
+variable "not_secret" {}
+'''))
+
+    assert index['variable'] == [{'secret': {'sensitive': True}}, {'not_secret': {}}]
+    assert get_backend_type(index) == 's3'
+    assert index.backend == ('s3', {'bucket': 'state'})
+    assert get_version_constraints(index) == [Constraint('>=1.0.0'), Constraint('<2.0.0')]
+    assert get_sensitive_variables(index) == ['secret']
+
+    assert ModuleIndex.of(index) is index
+    assert get_backend_type(dict(index)) == 's3'
@@ -0,0 +1,85 @@
+from pathlib import Path
+
+from terraform.module_graph import load_module_graph
+from terraform.versions import Constraint, Version
+from terraform_version.required_version import get_required_version
+
+
+def write_module(path: Path, tf: str) -> None:
+    path.mkdir(parents=True, exist_ok=True)
+    Path(path, 'main.tf').write_text(tf)
+
+
+def test_module_graph(tmp_path):
+    write_module(Path(tmp_path, 'root'), '''
+module "a" {
+  source = "../modules/a"
+}
+
+module "b" {
+  source = "../modules/b"
+}
+
+module "registry" {
+  source = "terraform-aws-modules/vpc/aws"
+}
+
+module "missing" {
+  source = "./missing"
+}
+''')
+
+    write_module(Path(tmp_path, 'modules/a'), '''
+terraform {
+  required_version = ">=1.0.0"
+}
+
+module "shared" {
+  source = "../shared"
+}
+''')
+
+    write_module(Path(tmp_path, 'modules/b'), '''
+module "shared" {
+  source = "../shared"
+}
+
+module "shared_again" {
+  source = "./../shared/"
+}
+''')
+
+    write_module(Path(tmp_path, 'modules/shared'), '''
+terraform {
+  required_version = "<1.5.0"
+}
+
+module "cycle" {
+  source = "../a"
+}
+''')
+
+    graph = load_module_graph(Path(tmp_path, 'root'))
+
+    modules = Path(tmp_path, 'modules').resolve()
+    assert set(graph.modules) == {Path(tmp_path, 'root').resolve(), modules / 'a', modules / 'b', modules / 'shared'}
+    assert graph.loads == 4
+    assert graph.loads_saved == 3
+    assert graph.children(Path(tmp_path, 'root')) == [modules / 'a', modules / 'b']
+    assert graph.children(modules / 'b') == [modules / 'shared', modules / 'shared']
+
+    assert graph.root.version_constraints is None
+    assert sorted(graph.version_constraints) == [Constraint('>=1.0.0'), Constraint('<1.5.0')]
+
+    versions = [Version('0.15.0'), Version('1.4.6'), Version('1.5.0')]
+    assert get_required_version(graph, versions) == Version('1.4.6')
+
+
+def test_module_graph_no_constraints(tmp_path):
+    write_module(Path(tmp_path), 'variable "hello" {}')
+
+    graph = load_module_graph(Path(tmp_path))
+
+    assert graph.loads == 1
+    assert graph.version_constraints is None
+    assert get_required_version(graph, [Version('1.0.0')]) is None
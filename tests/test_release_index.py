@@ -0,0 +1,146 @@
+import json
+import time
+from pathlib import Path
+
+import pytest
+import requests
+
+import opentofu.versions
+import terraform.versions
+from opentofu.versions import get_opentofu_versions
+from terraform.release_index import ReleaseIndex, ReleaseIndexUnavailable
+from terraform.versions import get_terraform_versions, Version
+
+RELEASES_URL = 'https://releases.hashicorp.com/terraform/'
+
+RELEASES_PAGE = b'''
+<a href="/terraform/1.5.0/">terraform_1.5.0</a>
+<a href="/terraform/1.6.0-beta1/">terraform_1.6.0-beta1</a>
+'''
+
+
+class FakeSession:
+    def __init__(self, status=200, content=RELEASES_PAGE, headers=None, error=None):
+        self.status = status
+        self.content = content
+        self.headers = headers or {}
+        self.error = error
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append(headers or {})
+
+        if self.error is not None:
+            raise self.error
+
+        response = requests.Response()
+        response.status_code = self.status
+        response._content = self.content
+        response.headers.update(self.headers)
+        response.url = url
+        return response
+
+
+def parse(content):
+    return terraform.versions._parse_terraform_releases(content)
+
+
+def index(tmp_path):
+    return ReleaseIndex('terraform', RELEASES_URL, parse, tmp_path)
+
+
+def test_fetch_and_cache(tmp_path):
+    session = FakeSession(headers={'ETag': '"abc"', 'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+
+    assert index(tmp_path).versions(session) == ['1.5.0', '1.6.0-beta1']
+    assert len(session.requests) == 1
+
+    cached = json.loads(Path(tmp_path, 'terraform.json').read_text())
+    assert cached['etag'] == '"abc"'
+    assert cached['versions'] == ['1.5.0', '1.6.0-beta1']
+
+    # Fresh enough to use without a request
+    assert index(tmp_path).versions(session) == ['1.5.0', '1.6.0-beta1']
+    assert len(session.requests) == 1
+
+
+def test_revalidate(tmp_path, monkeypatch):
+    index(tmp_path).versions(FakeSession(headers={'ETag': '"abc"', 'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'}))
+
+    monkeypatch.setenv('TERRAFORM_RELEASE_INDEX_TTL', '0')
+    session = FakeSession(status=304, content=b'')
+
+    assert index(tmp_path).versions(session) == ['1.5.0', '1.6.0-beta1']
+    assert session.requests == [{'If-None-Match': '"abc"', 'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'}]
+
+    cached = json.loads(Path(tmp_path, 'terraform.json').read_text())
+    assert time.time() - cached['fetched_at'] < 60
+
+    session = FakeSession(content=b'/terraform/1.7.0/', headers={'ETag': '"def"'})
+    assert index(tmp_path).versions(session) == ['1.7.0']
+    assert json.loads(Path(tmp_path, 'terraform.json').read_text())['etag'] == '"def"'
+
+
+def test_failover_to_cache(tmp_path, monkeypatch):
+    index(tmp_path).versions(FakeSession())
+
+    monkeypatch.setenv('TERRAFORM_RELEASE_INDEX_TTL', '0')
+
+    assert index(tmp_path).versions(FakeSession(error=requests.Timeout('slow'))) == ['1.5.0', '1.6.0-beta1']
+    assert index(tmp_path).versions(FakeSession(status=503)) == ['1.5.0', '1.6.0-beta1']
+
+    with pytest.raises(ReleaseIndexUnavailable):
+        index(Path(tmp_path, 'empty')).versions(FakeSession(error=requests.Timeout('slow')))
+
+
+def test_offline(tmp_path, monkeypatch):
+    monkeypatch.setenv('TERRAFORM_RELEASE_INDEX_OFFLINE', 'true')
+    session = FakeSession()
+
+    with pytest.raises(ReleaseIndexUnavailable):
+        index(tmp_path).versions(session)
+
+    Path(tmp_path, 'terraform.json').write_text(json.dumps({'url': RELEASES_URL, 'fetched_at': 0, 'versions': ['1.0.0']}))
+    assert index(tmp_path).versions(session) == ['1.0.0']
+    assert session.requests == []
+
+
+def test_get_terraform_versions(tmp_path, monkeypatch):
+    monkeypatch.setenv('TERRAFORM_BIN_CACHE_DIR', f'/nonexistent:{tmp_path}')
+    monkeypatch.setattr(terraform.versions, 'session', FakeSession())
+
+    assert list(get_terraform_versions()) == [Version('1.5.0'), Version('1.6.0-beta1')]
+    assert Path(tmp_path, 'release-index', 'terraform.json').exists()
+
+
+def test_get_opentofu_versions(tmp_path, monkeypatch):
+    monkeypatch.setenv('TERRAFORM_BIN_CACHE_DIR', str(tmp_path))
+    monkeypatch.setenv('TERRAFORM_RELEASE_INDEX_TTL', '0')
+
+    first_page = json.dumps([{'tag_name': 'v1.7.0-beta1'}, {'tag_name': 'v1.6.0'}]).encode()
+    session = FakeSession(content=first_page, headers={'ETag': '"abc"'})
+    monkeypatch.setattr(opentofu.versions, 'github', session)
+
+    assert list(get_opentofu_versions()) == [Version('1.7.0-beta1', 'OpenTofu'), Version('1.6.0', 'OpenTofu')]
+
+    cached = json.loads(Path(tmp_path, 'release-index', 'opentofu.json').read_text())
+    assert cached['versions'] == ['1.7.0-beta1', '1.6.0']
+
+    # The first page is revalidated
+    session.status = 304
+    assert len(list(get_opentofu_versions())) == 2
+    assert session.requests[-1] == {'If-None-Match': '"abc"'}
+
+    # The releases site is unavailable
+    session.error = requests.ConnectionError('offline')
+    assert len(list(get_opentofu_versions())) == 2
+
+
+def test_get_opentofu_versions_pages(tmp_path, monkeypatch):
+    monkeypatch.setenv('TERRAFORM_BIN_CACHE_DIR', str(tmp_path))
+
+    session = FakeSession(content=b'[{"tag_name": "v1.8.0"}]', headers={'Link': '<https://api.github.com/repositories/1/releases?page=2>; rel="next"'})
+    session.parallel_paged_get = lambda url, timeout: [{'tag_name': 'v1.8.0'}, {'tag_name': 'v1.7.0'}]
+    monkeypatch.setattr(opentofu.versions, 'github', session)
+
+    assert list(get_opentofu_versions()) == [Version('1.8.0', 'OpenTofu'), Version('1.7.0', 'OpenTofu')]
@@ -0,0 +1,132 @@
+import hashlib
+import hmac
+import os
+import stat
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from terraform.signature_ledger import KEY_FILENAME, LEDGER_FILENAME, SignatureLedger, verify_signature
+
+SIGNER = 'C874011F0AB405110D02105534365D9472D7468F'
+
+
+@pytest.fixture
+def gpg(monkeypatch):
+    """Replaces gpg, recording each verification. A signature file containing 'bad' fails to verify."""
+
+    calls = []
+
+    def run(args, **kwargs):
+        calls.append(args)
+        if Path(args[-2]).read_text() == 'bad':
+            raise subprocess.CalledProcessError(2, args)
+
+    monkeypatch.setattr(subprocess, 'run', run)
+    return calls
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    monkeypatch.setenv('TERRAFORM_SIGNATURE_LEDGER_DIR', str(Path(tmp_path, 'ledger')))
+    monkeypatch.delenv('TERRAFORM_SIGNATURE_LEDGER_KEY', raising=False)
+
+    signature_path = Path(tmp_path, 'terraform_1.5.7_SHA256SUMS.72D7468F.sig')
+    signature_path.write_text('signature')
+    checksums_path = Path(tmp_path, 'terraform_1.5.7_SHA256SUMS')
+    checksums_path.write_text('aaaa  terraform_1.5.7_linux_amd64.zip\n')
+
+    return signature_path, checksums_path
+
+
+def test_verified_once(gpg, files, tmp_path):
+    ledger = SignatureLedger.from_env()
+
+    verify_signature(*files, SIGNER, ledger)
+    verify_signature(*files, SIGNER, ledger)
+    assert len(gpg) == 1
+
+    # A new process uses the same ledger
+    verify_signature(*files, SIGNER, SignatureLedger.from_env())
+    assert len(gpg) == 1
+
+    key_mode = Path(tmp_path, 'ledger', KEY_FILENAME).stat().st_mode
+    assert stat.S_IMODE(key_mode) == 0o600
+
+
+def test_changed_files(gpg, files):
+    ledger = SignatureLedger.from_env()
+    signature_path, checksums_path = files
+
+    verify_signature(*files, SIGNER, ledger)
+
+    checksums_path.write_text('bbbb  terraform_1.5.7_linux_amd64.zip\n')
+    verify_signature(*files, SIGNER, ledger)
+    assert len(gpg) == 2
+
+    signature_path.write_text('another signature')
+    verify_signature(*files, SIGNER, ledger)
+    assert len(gpg) == 3
+
+    verify_signature(*files, 'E3E6E43D84CB852EADB0051D0C0AF313E5FD9F80', ledger)
+    assert len(gpg) == 4
+
+
+def test_not_verified(gpg, files):
+    ledger = SignatureLedger.from_env()
+    signature_path, _ = files
+    signature_path.write_text('bad')
+
+    for _ in range(2):
+        with pytest.raises(subprocess.CalledProcessError):
+            verify_signature(*files, SIGNER, ledger)
+
+    assert len(gpg) == 2
+    assert not ledger.entries
+
+
+def test_forged_entry(gpg, files, tmp_path):
+    signature_path, checksums_path = files
+
+    # An entry made without the key
+    signature_sha256 = hashlib.sha256(signature_path.read_bytes()).hexdigest()
+    checksums_sha256 = hashlib.sha256(checksums_path.read_bytes()).hexdigest()
+    forged = hmac.new(b'x' * 32, f'{signature_sha256}:{checksums_sha256}:{SIGNER}'.encode(), hashlib.sha256).hexdigest()
+
+    Path(tmp_path, 'ledger').mkdir()
+    Path(tmp_path, 'ledger', LEDGER_FILENAME).write_text(forged + '\n')
+
+    verify_signature(*files, SIGNER, SignatureLedger.from_env())
+    assert len(gpg) == 1
+
+
+def test_replaced_key(gpg, files, tmp_path):
+    verify_signature(*files, SIGNER, SignatureLedger.from_env())
+
+    Path(tmp_path, 'ledger', KEY_FILENAME).write_bytes(os.urandom(32))
+    verify_signature(*files, SIGNER, SignatureLedger.from_env())
+    assert len(gpg) == 2
+
+
+def test_key_path(gpg, files, tmp_path, monkeypatch):
+    monkeypatch.setenv('TERRAFORM_SIGNATURE_LEDGER_KEY', str(Path(tmp_path, 'secret', 'ledger.key')))
+
+    verify_signature(*files, SIGNER, SignatureLedger.from_env())
+    verify_signature(*files, SIGNER, SignatureLedger.from_env())
+    assert len(gpg) == 1
+
+    assert Path(tmp_path, 'secret', 'ledger.key').exists()
+    assert not Path(tmp_path, 'ledger', KEY_FILENAME).exists()
+
+
+def test_memory_only(gpg, files, monkeypatch):
+    monkeypatch.delenv('TERRAFORM_SIGNATURE_LEDGER_DIR')
+    monkeypatch.delenv('JOB_TMP_DIR', raising=False)
+
+    ledger = SignatureLedger.from_env()
+    assert ledger.path is None
+
+    verify_signature(*files, SIGNER, ledger)
+    verify_signature(*files, SIGNER, ledger)
+    assert len(gpg) == 1